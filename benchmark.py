@@ -0,0 +1,291 @@
+"""
+Description:
+    The benchmark file compares the query processors against each other and against the equivalent sql queries.
+    It generates a synthetic Sales table at a configurable scale, loads it into an in-memory SQLite database (or into a local
+    PostgreSQL database with --dbname), and for every esql_ query of queries.py with a sql_ equivalent it runs:
+        old_QueryProcessor.py, queryProcessorMF.py and queryProcessorEMF.py with each of their engines, and the sql_ query.
+    Every run is checked against the result of the first processor, and the sql result against the rows of the mf_table that
+    have every aggregate (the sql queries join the grouping variables, so groups missing one of them are dropped).
+    Wall time, rows per second and peak memory are reported for every phase: fetch, scan 1, scan 2 and output.
+
+    Usage: python benchmark.py --rows 10000 --custs 20 --prods 10 --states NY NJ CT PA
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib
+import io
+import json
+import random
+import sqlite3
+import time
+import tracemalloc
+import psycopg2
+import psycopg2.extras
+from tabulate import tabulate
+import queries
+from profiling import RunStats
+
+benchmark_queries = [("esql_a", "sql_a"), ("esql_b", "sql_b"), ("esql_c", "sql_c")] #esql query and its sql equivalent
+processor_engines = {
+    "old_QueryProcessor": [None],
+    "queryProcessorMF": ["compiled", "interpreted", "numpy"],
+    "queryProcessorEMF": ["compiled", "interpreted", "numpy"]
+}
+
+# ************************* Generate Sales **************************
+def generate_sales(rows, custs, prods, states, seed=0):
+    """
+        This function generates a synthetic Sales table.
+        Parameters:
+            number of rows, of distinct customers and of distinct products
+            list of states
+            seed of the random generator
+        Output:
+            The rows of the table as a list of tuples with the columns of the Sales table
+    """
+    generator = random.Random(seed)
+    first_day = datetime.date(2020, 1, 1)
+    sales_rows = []
+    for row in range(rows):
+        date = first_day + datetime.timedelta(days=generator.randrange(1461))
+        sales_rows.append((f"Cust{generator.randrange(custs)}", f"Prod{generator.randrange(prods)}", date.day, date.month, date.year,
+                           generator.choice(states), generator.randint(1, 1000), date))
+    return sales_rows
+
+# ************************* Load Database **************************
+def sqlite_database(sales_rows):
+    """
+        This function loads the Sales table into an in-memory SQLite database, the stand-in for PostgreSQL.
+        Parameters:
+            rows of the Sales table
+        Output:
+            The connection to the database
+    """
+    connection = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    connection.execute("create table sales (cust varchar(20), prod varchar(20), day int, month int, year int, state char(2), quant int, date date)")
+    connection.executemany("insert into sales values (?, ?, ?, ?, ?, ?, ?, ?)", sales_rows)
+    connection.commit()
+    return connection
+
+def postgres_database(connection_params, sales_rows, replace):
+    """
+        This function loads the Sales table into a PostgreSQL database. An existing sales table is only replaced when asked to.
+        Parameters:
+            connection parameters of the database
+            rows of the Sales table
+            True to replace an existing sales table
+        Output:
+            The connection to the database
+    """
+    connection = psycopg2.connect(**connection_params)
+    cursor = connection.cursor()
+    cursor.execute("select to_regclass('sales') is not null;")
+    if cursor.fetchone()[0]:
+        if not replace:
+            raise SystemExit(f"Database {connection_params['dbname']} already has a sales table, use --replace to overwrite it")
+        cursor.execute("drop table sales;")
+    cursor.execute("create table sales (cust varchar(20), prod varchar(20), day int, month int, year int, state char(2), quant int, date date);")
+    psycopg2.extras.execute_values(cursor, "insert into sales values %s", sales_rows, page_size=10000)
+    cursor.execute("analyze sales;")
+    connection.commit()
+    cursor.close()
+    return connection
+
+# ************************* Measure Phase **************************
+def measure(results, query_name, runner, phase, rows, function, memory):
+    """
+        This function runs one phase of a benchmark run and records its wall time, rows per second and peak memory.
+        Parameters:
+            list of results the measurement is appended to
+            name of the query, name of the runner and name of the phase
+            number of rows processed by the phase
+            function running the phase
+            True to trace the peak memory of the phase
+        Output:
+            The value returned by the function
+    """
+    if memory:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    value = function()
+    wall = time.perf_counter() - start
+    results.append({
+        "query": query_name,
+        "runner": runner,
+        "phase": phase,
+        "rows": rows,
+        "wall_s": round(wall, 4),
+        "rows_per_s": round(rows / wall) if wall > 0 else None,
+        "peak_mib": round((tracemalloc.get_traced_memory()[1] - start_memory) / 2 ** 20, 2) if memory else None
+    })
+    return value
+
+# ************************* Fetch Rows **************************
+def fetch_rows(connection, statement="select * from sales;"):
+    """
+        This function retrieves the rows of a select statement.
+        Parameters:
+            connection to the database and select statement
+        Output:
+            The column names and the rows as a list of tuples
+    """
+    cursor = connection.cursor()
+    cursor.execute(statement)
+    rows = cursor.fetchall()
+    names = [column[0].lower() for column in cursor.description]
+    cursor.close()
+    return names, rows
+
+# ************************* Run Processors **************************
+def reset_processor(module, rows, query):
+    """
+        This function clears the state old_QueryProcessor.py keeps between runs and feeds it the fetched rows and the query.
+    """
+    module.table_rows = rows
+    module.esqlQuery = lambda: query
+    module.mf_table.clear()
+    module.mf_struct_header.clear()
+
+def result_rows(module):
+    """
+        This function reads the mf_table of a processor module the way print_table_rows does.
+    """
+    return [[row[header] if header in row else "NULL" for header in module.mf_struct_header] for row in module.mf_table]
+
+def run_processor(results, query_name, runner, module, engine, query, rows, memory):
+    """
+        This function runs a query on the QueryProcessor of the MF or EMF processor, whose statistics measure its table scans and
+        its output separately.
+        Parameters:
+            list of results, name of the query and name of the runner
+            processor module and its engine
+            Phi Arguments of the query
+            rows of the Sales table
+            True to trace peak memory
+        Output:
+            The result rows of the query
+    """
+    # queryProcessorEMF.py runs the EMFQueryProcessor, queryProcessorMF.py the QueryProcessor
+    processor_class = getattr(module, "EMFQueryProcessor", None) or module.QueryProcessor
+    processor = processor_class(query, rows, engine=engine, stats=RunStats(trace_memory=memory))
+    processor.run_table()
+    for phase in processor.stats.phases:
+        if phase["phase"] == "fetch":
+            continue
+        phase_rows = phase["rows"] if phase["phase"] != "output" else phase["groups"]
+        results.append({
+            "query": query_name,
+            "runner": runner,
+            "phase": phase["phase"],
+            "rows": phase_rows,
+            "wall_s": round(phase["wall_s"], 4),
+            "rows_per_s": round(phase_rows / phase["wall_s"]) if phase["wall_s"] > 0 else None,
+            "peak_mib": round(phase["peak_traced_bytes"] / 2 ** 20, 2) if memory else None
+        })
+    return processor.result_rows()
+
+def run_old(results, query_name, runner, module, query, rows, memory):
+    """
+        This function runs a query on old_QueryProcessor.py, whose main function runs both table scans and the output at once.
+    """
+    reset_processor(module, rows, query)
+
+    def old_main():
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.main()
+
+    measure(results, query_name, runner, "scan 1+2+output", len(rows), old_main, memory)
+    return result_rows(module)
+
+# ************************* Compare Results **************************
+def normalize_row(row):
+    return tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+
+def compare_sql(mf_rows, sql_rows):
+    """
+        This function compares the result of a sql query with the rows of the mf_table that have every aggregate.
+        Output:
+            "equal" or a description of the difference
+    """
+    expected = set(normalize_row(row) for row in mf_rows if "NULL" not in row)
+    actual = set(normalize_row(row) for row in sql_rows)
+    if expected == actual:
+        return "equal"
+    return f"differs ({len(actual - expected)} extra, {len(expected - actual)} missing)"
+
+# ************************* Main Function **************************
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the query processors against the equivalent sql queries")
+    parser.add_argument("--rows", type=int, default=10000, help="number of rows of the synthetic Sales table")
+    parser.add_argument("--custs", type=int, default=20, help="number of distinct customers")
+    parser.add_argument("--prods", type=int, default=10, help="number of distinct products")
+    parser.add_argument("--states", nargs="+", default=["NY", "NJ", "CT", "PA"], help="states of the sales")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the data generator")
+    parser.add_argument("--queries", nargs="+", default=[esql for esql, sql in benchmark_queries], help="esql queries to run")
+    parser.add_argument("--processors", nargs="+", default=list(processor_engines), help="processors to run")
+    parser.add_argument("--dbname", help="load the data into this PostgreSQL database instead of an in-memory SQLite database")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="5432")
+    parser.add_argument("--replace", action="store_true", help="replace an existing sales table of the PostgreSQL database")
+    parser.add_argument("--no-memory", action="store_true", help="do not trace peak memory, which slows down every phase")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    memory = not args.no_memory
+    sales_rows = generate_sales(args.rows, args.custs, args.prods, args.states, args.seed)
+    if args.dbname:
+        connection = postgres_database({"dbname": args.dbname, "host": args.host, "port": args.port}, sales_rows, args.replace)
+    else:
+        connection = sqlite_database(sales_rows)
+    del sales_rows
+
+    # old_QueryProcessor.py retrieves the Sales table when it is imported; the benchmark feeds it the rows it fetched instead
+    with contextlib.redirect_stdout(io.StringIO()):
+        modules = {name: importlib.import_module(name) for name in args.processors}
+
+    if memory:
+        tracemalloc.start()
+    results = []
+    checks = []
+    rows = measure(results, "-", "database", "fetch", args.rows, lambda: fetch_rows(connection)[1], memory)
+
+    sql_names = dict(benchmark_queries)
+    for query_name in args.queries:
+        query = getattr(queries, query_name)
+        reference = None
+        for name, module in modules.items():
+            for engine in processor_engines[name]:
+                runner = name if engine is None else f"{name} ({engine})"
+                if engine is None:
+                    mf_rows = run_old(results, query_name, runner, module, query, rows, memory)
+                else:
+                    mf_rows = run_processor(results, query_name, runner, module, engine, query, rows, memory)
+                if reference is None:
+                    reference = mf_rows
+                checks.append({"query": query_name, "runner": runner, "result": "equal" if mf_rows == reference else "differs"})
+
+        if query_name in sql_names:
+            sql_name = sql_names[query_name]
+            try:
+                names, sql_rows = measure(results, query_name, sql_name, "sql", args.rows, lambda: fetch_rows(connection, getattr(queries, sql_name)), memory)
+                checks.append({"query": query_name, "runner": sql_name, "result": compare_sql(reference, sql_rows)})
+            except Exception as e:
+                connection.rollback()
+                checks.append({"query": query_name, "runner": sql_name, "result": f"error: {e}"})
+
+    if memory:
+        tracemalloc.stop()
+    connection.close()
+
+    if args.json:
+        print(json.dumps({"phases": results, "checks": checks}, indent=2))
+    else:
+        print(tabulate(results, headers="keys", tablefmt="grid"))
+        print(tabulate(checks, headers="keys", tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Description:
+    The cache file keeps the results of queries so that repeated queries over an unchanged Sales table are answered without
+    scanning it. Results are keyed on the canonical form of the query together with a version of the Sales table, so any
+    insert, update or delete of the table makes the cached results stale.
+    The cache has two tiers: a size bounded in-memory tier evicting the least recently used results, and an on-disk tier that
+    keeps the cache warm across restarts.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import psycopg2
+
+# ************************* Canonical Query **************************
+def canonical_query(phi):
+    """
+        This function writes the Phi Arguments that determine the result of a query in a canonical form, so the same query
+        written with its dictionaries in a different order gets the same key.
+        Parameters:
+            Phi Arguments of the query
+        Output:
+            The canonical form as a string
+    """
+    arguments = {argument: phi[argument] for argument in ["S", "V", "F-VECT", "PRED-LIST"] if argument in phi}
+    return json.dumps(arguments, sort_keys=True, default=str)
+
+# ************************* Table Version **************************
+def table_version(connection_params):
+    """
+        This function computes a fingerprint of the current version of the Sales table: its row count, its latest date and the
+        newest transaction id (xmin) that wrote any of its rows, which changes with every insert and update.
+        Parameters:
+            connection parameters of the database
+        Output:
+            The fingerprint as a string
+    """
+    connection = psycopg2.connect(**connection_params)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("select count(*), max(date), max(xmin::text::bigint) from sales;")
+        version = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+    return json.dumps(version, default=str)
+
+# ************************* Result Key **************************
+def result_key(text, version):
+    """
+        This function computes the key of a cached result.
+        Parameters:
+            canonical query (see canonical_query) or sql statement
+            version of the Sales table (see table_version)
+        Output:
+            The key as a hexadecimal string
+    """
+    return hashlib.sha256(f"{text}\n{version}".encode()).hexdigest()
+
+# ************************* Result Cache **************************
+class ResultCache:
+    """
+        Two tier cache of query results. The in-memory tier keeps at most max_entries results and evicts the least recently used
+        one; the on-disk tier stores every result as a pickle file in cache_dir and keeps at most max_disk_entries of them,
+        evicting the least recently written ones. A result found on disk is promoted to the in-memory tier.
+        Both tiers hold the pickled result, so every lookup returns a copy that the caller can change, and both are guarded by
+        locks, since the cache is shared by the processors of every thread.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=".mf_cache", max_disk_entries=256):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict() #key -> pickled result, least recently used first
+        self.lock = threading.Lock() #Guards the in-memory tier
+        self.disk_lock = threading.Lock() #Serializes the writes of the on-disk tier
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pickle")
+
+    def get(self, key):
+        """
+            This function looks up a result.
+            Parameters:
+                key of the result (see result_key)
+            Output:
+                A copy of the cached result, or None if the result is not cached
+        """
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+        if data is None:
+            if self.cache_dir is None or not os.path.exists(self.path(key)):
+                return None
+            with open(self.path(key), "rb") as file:
+                data = file.read()
+            self.remember(key, data)
+        return pickle.loads(data)
+
+    def put(self, key, result):
+        """
+            This function stores a result in both tiers.
+            Parameters:
+                key of the result (see result_key)
+                result of the query
+        """
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        self.remember(key, data)
+        if self.cache_dir is None:
+            return
+        with self.disk_lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(f"{self.path(key)}.tmp", "wb") as file:
+                file.write(data)
+            os.replace(f"{self.path(key)}.tmp", self.path(key))
+
+            files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".pickle")]
+            if len(files) > self.max_disk_entries:
+                files.sort(key=os.path.getmtime)
+                for file in files[:len(files) - self.max_disk_entries]:
+                    os.remove(file)
+
+    def remember(self, key, data):
+        with self.lock:
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+result_cache = ResultCache() #Shared by the processors and sql.py
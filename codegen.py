@@ -0,0 +1,161 @@
+"""
+Description:
+    The codegen file turns the Phi Arguments of a query into a Python function specialized for that query. Column indeces,
+    such that conditions and aggregate updates are written into the generated source as constants, so the aggregate scan no
+    longer re-reads the query dictionary for every row of the Sales table.
+    The generated source of a query can be inspected with generate_source, and the compiled functions of the compiled_cache_size
+    most recently used queries are cached by query hash, so a long-running process compiling every query it is sent (see
+    service.py) keeps a bounded number of them.
+"""
+
+import hashlib
+import json
+import linecache
+import threading
+from collections import OrderedDict
+from planner import grouping_variables, aggregated_attribute
+from mf_record import mf_fields, record_type, _UNSET
+from sketches import is_sketch, new_sketch
+
+compiled_cache = OrderedDict() #query hash -> compiled scan function, least recently used first
+compiled_cache_size = 256 #Number of compiled scan functions kept in the compiled_cache
+compiled_cache_lock = threading.Lock() #Guards the compiled_cache and the linecache entries of its functions
+
+# ************************* Query Hash **************************
+def query_hash(phi, columns):
+    """
+        This function computes a hash of the Phi Arguments that identifies the generated function of the query.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+        Output:
+            The hash as a hexadecimal string
+    """
+    text = json.dumps([phi, columns], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+# ************************* Aggregate Update Source **************************
+def aggregate_source(slots, agg, value, indent):
+    """
+        This function writes the statements that update one aggregate of the current MF row. The columns of the MF row are read and
+        written directly through the slots of its record type (see mf_record), where a column that was never set holds UNSET.
+        Sketch aggregates only add the value to the sketch of the group, and their value is set once the scan is finished.
+        Parameters:
+            slots of the MF record type
+            aggregate of the F-VECT (sum, max, min, count, avg or a sketch aggregate)
+            expression of the aggregated value
+            indentation of the statements
+        Output:
+            The list of source lines
+    """
+    agg_name = agg["name"]
+    agg_type = agg["agg"]
+    if agg_type not in ["sum", "max", "min", "count", "avg"] and not is_sketch(agg_type):
+        raise ValueError(f"Aggregate {agg_type} of {agg_name} cannot be compiled")
+    column = f"mf_row.{slots[agg_name]}"
+    if is_sketch(agg_type):
+        sketch_column = f"mf_row.{slots[f'{agg_name}_sketch']}"
+        lines = [f"sketch = {sketch_column}",
+                 "if sketch is UNSET:",
+                 f"    sketch = {sketch_column} = new_sketch({agg!r})",
+                 f"sketch.add({value})"]
+    elif agg_type == "sum":
+        lines = [f"current_value = {column}",
+                 f"{column} = {value} if current_value is UNSET else current_value + {value}"]
+    elif agg_type == "max":
+        lines = [f"current_value = {column}",
+                 f"{column} = {value} if current_value is UNSET else max(current_value, {value})"]
+    elif agg_type == "min":
+        lines = [f"current_value = {column}",
+                 f"{column} = {value} if current_value is UNSET else min(current_value, {value})"]
+    elif agg_type == "count":
+        lines = [f"current_value = {column}",
+                 f"{column} = 1 if current_value is UNSET else current_value + 1"]
+    elif agg_type == "avg":
+        sum_column = f"mf_row.{slots[f'{agg_name}_sum']}"
+        count_column = f"mf_row.{slots[f'{agg_name}_count']}"
+        lines = [f"current_value = {sum_column}",
+                 f"{sum_column} = {value} if current_value is UNSET else current_value + {value}",
+                 f"current_value = {count_column}",
+                 f"{count_column} = 1 if current_value is UNSET else current_value + 1",
+                 f"{column} = {sum_column} / {count_column}"]
+    return [" " * indent + line for line in lines]
+
+# ************************* Generate Source **************************
+def generate_source(phi, columns):
+    """
+        This function generates the source of the scan function of a query. The generated function has the signature
+        phi_scan(table_rows, mf_table, mf_index, add_groups): it looks up the group of every row in the mf_index, adds the group to
+        the mf_table on first sight when add_groups is True (and skips the row otherwise), and updates the aggregates of the group.
+        The such that condition of every grouping variable is tested once, guarding the updates of all of its aggregates.
+        New groups are created as MFRow records (see mf_record), whose type is bound when the source is compiled together with
+        new_sketch (see sketches.py) and the UNSET marker of the columns that were never set.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+        Output:
+            The generated source as a string
+    """
+    slots = record_type(mf_fields(phi)).slots
+    group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+    key = ", ".join(f"row[{columns.index(attribute)}]" for attribute in group_attributes)
+    quant_index = columns.index("quant")
+
+    lines = [
+        "def phi_scan(table_rows, mf_table, mf_index, add_groups):",
+        "    for row in table_rows:",
+        f"        key = ({key},)",
+        "        pos = mf_index.get(key)",
+        "        if pos is None:",
+        "            if not add_groups:",
+        "                continue",
+        "            mf_row = MFRow()",
+    ]
+    for attribute in group_attributes:
+        lines.append(f"            mf_row.{slots[attribute]} = row[{columns.index(attribute)}]")
+    lines.extend([
+        "            mf_table.append(mf_row)",
+        "            mf_index[key] = len(mf_table) - 1",
+        "        else:",
+        "            mf_row = mf_table[pos]",
+        f"        quant = row[{quant_index}]",
+    ])
+    for variable in grouping_variables(phi):
+        attr_index = columns.index(variable["attribute"])
+        lines.append(f"        if row[{attr_index}] == {variable['value']!r}:")
+        for agg in variable["aggregates"]:
+            value = "quant" if aggregated_attribute(agg) == "quant" else f"row[{columns.index(aggregated_attribute(agg))}]"
+            lines.extend(aggregate_source(slots, agg, value, 12))
+    return "\n".join(lines) + "\n"
+
+# ************************* Compile Phi **************************
+def compile_phi(phi, columns):
+    """
+        This function compiles the scan function of a query, reusing the cached function when the same query was compiled before.
+        The generated source is registered with linecache so that tracebacks show the generated lines, and is kept in the source
+        attribute of the returned function. The linecache entry of a function is removed when it is evicted from the cache.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+        Output:
+            The compiled phi_scan function
+    """
+    key = query_hash(phi, columns)
+    with compiled_cache_lock:
+        if key in compiled_cache:
+            compiled_cache.move_to_end(key)
+            return compiled_cache[key]
+
+    source = generate_source(phi, columns)
+    filename = f"<phi_scan {key[:12]}>"
+    namespace = {"MFRow": record_type(mf_fields(phi)), "new_sketch": new_sketch, "UNSET": _UNSET}
+    exec(compile(source, filename, "exec"), namespace)
+    phi_scan = namespace["phi_scan"]
+    phi_scan.source = source
+    with compiled_cache_lock:
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        compiled_cache[key] = phi_scan
+        while len(compiled_cache) > compiled_cache_size:
+            evicted_key = compiled_cache.popitem(last=False)[0]
+            linecache.cache.pop(f"<phi_scan {evicted_key[:12]}>", None)
+    return phi_scan
@@ -0,0 +1,166 @@
+"""
+Description:
+    The columnar file is an alternative execution engine for the aggregate scan of the MF algorithm. Instead of updating the
+    mf_table one row and one aggregate at a time, the columns of the Sales table used by the query are loaded into NumPy arrays,
+    the grouping attributes are factorized into integer group ids, the such that condition of every grouping variable is evaluated
+    once as a boolean mask shared by all of its aggregates, and the aggregates are computed with grouped reductions.
+    The resulting mf_table has the same rows, in the same order, as the one built by the row by row scans.
+"""
+
+import numpy as np
+from planner import grouping_variables, aggregated_attribute
+from mf_record import mf_fields, record_type
+from sketches import is_sketch, new_sketch
+
+# ************************* Load Columns **************************
+def load_columns(table_rows, columns, needed):
+    """
+        This function loads the needed columns of the Sales table into NumPy arrays.
+        Parameters:
+            rows of the Sales table (a list of tuples or a SalesStream)
+            columns of the Sales table
+            names of the columns used by the query
+        Output:
+            Dictionary of column name -> NumPy array
+    """
+    indeces = [columns.index(column) for column in needed]
+    values = [[] for column in needed]
+    for row in table_rows:
+        for position, index in enumerate(indeces):
+            values[position].append(row[index])
+    return {column: np.array(values[position]) for position, column in enumerate(needed)}
+
+# ************************* Factorize Grouping Attributes **************************
+def factorize(arrays):
+    """
+        This function assigns an integer group id to every row according to the values of its grouping attributes. Group ids are
+        numbered in order of first appearance, which is the order in which the row by row scans add groups to the mf_table.
+        NULL values form a group of their own, like in the row by row scans.
+        Parameters:
+            list of the NumPy arrays of the grouping attributes
+        Output:
+            The group id of every row, and the position of the first row of every group
+    """
+    combined = np.zeros(len(arrays[0]), dtype=np.int64)
+    for array in arrays:
+        if array.dtype.kind == "O":
+            # Columns with NULL values are object arrays mixing None with text or numbers, which np.unique cannot sort
+            values = {}
+            codes = np.fromiter((values.setdefault(value, len(values)) for value in array.tolist()), dtype=np.int64, count=len(array))
+            value_count = len(values)
+        else:
+            uniques, codes = np.unique(array, return_inverse=True)
+            value_count = len(uniques)
+        combined = combined * value_count + codes.reshape(-1)
+    uniques, first_rows, group_ids = np.unique(combined, return_index=True, return_inverse=True)
+
+    order = np.argsort(first_rows, kind="stable")
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[group_ids.reshape(-1)], first_rows[order]
+
+# ************************* Grouped Aggregate **************************
+def grouped_aggregate(agg_type, group_ids, values, group_count):
+    """
+        This function computes an aggregate for every group with a vectorized grouped reduction.
+        Parameters:
+            type of the aggregate (sum, max, min, count or avg, the sketch aggregates are computed by sketched_aggregate)
+            group id of every row satisfying the such that condition
+            aggregated value of every row satisfying the such that condition
+            number of groups
+        Output:
+            The aggregate of every group, and the number of rows of every group
+    """
+    counts = np.bincount(group_ids, minlength=group_count)
+    if agg_type == "count":
+        return counts, counts
+    sums = np.zeros(group_count, dtype=values.dtype)
+    np.add.at(sums, group_ids, values)
+    if agg_type in ["sum", "avg"]:
+        return sums, counts
+    if agg_type == "max":
+        result = np.full(group_count, np.iinfo(values.dtype).min if values.dtype.kind == "i" else -np.inf, dtype=values.dtype)
+        np.maximum.at(result, group_ids, values)
+        return result, counts
+    if agg_type == "min":
+        result = np.full(group_count, np.iinfo(values.dtype).max if values.dtype.kind == "i" else np.inf, dtype=values.dtype)
+        np.minimum.at(result, group_ids, values)
+        return result, counts
+    raise ValueError(f"Aggregate {agg_type} is not supported by the columnar engine")
+
+# ************************* Sketched Aggregate **************************
+def sketched_aggregate(agg, group_ids, values, mf_table):
+    """
+        This function computes a sketch aggregate (see sketches.py) for every group. The rows are sorted by group, so the values of
+        every group are added to its sketch at once, in table order.
+        Parameters:
+            aggregate of the F-VECT
+            group id of every row satisfying the such that condition
+            aggregated value of every row satisfying the such that condition
+            mf_table that is updated
+    """
+    order = np.argsort(group_ids, kind="stable")
+    sorted_ids = group_ids[order]
+    boundaries = np.flatnonzero(np.diff(sorted_ids)) + 1
+    for group_values, pos in zip(np.split(values[order], boundaries), sorted_ids[np.r_[0, boundaries]].tolist() if len(order) else []):
+        sketch = new_sketch(agg)
+        sketch.extend(group_values.tolist())
+        mf_table[pos][f"{agg['name']}_sketch"] = sketch
+
+# ************************* Run Columnar **************************
+def run_columnar(phi, table_rows, columns):
+    """
+        This function evaluates a query with the columnar engine.
+        Parameters:
+            Phi Arguments of the query
+            rows of the Sales table (a list of tuples, a SalesStream or a SalesDataset, whose arrays, group ids and condition masks
+            are shared with the other queries over the dataset)
+            columns of the Sales table
+        Output:
+            The mf_table as a list of MF records (see mf_record), and the mf_index of its groups
+    """
+    group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+    variables = grouping_variables(phi)
+    aggregated = [aggregated_attribute(agg) for agg in phi["F-VECT"]]
+    needed = list(dict.fromkeys(group_attributes + [variable["attribute"] for variable in variables] + aggregated + ["quant"]))
+    shared = hasattr(table_rows, "groups")
+    arrays = table_rows.arrays(needed) if shared else load_columns(table_rows, columns, needed)
+
+    mf_record = record_type(mf_fields(phi))
+    mf_table = []
+    mf_index = {}
+    if len(arrays["quant"]) == 0:
+        return mf_table, mf_index
+
+    if shared:
+        group_ids, first_rows = table_rows.groups(group_attributes)
+    else:
+        group_ids, first_rows = factorize([arrays[attribute] for attribute in group_attributes])
+    group_values = [arrays[attribute][first_rows].tolist() for attribute in group_attributes]
+    for key in zip(*group_values):
+        mf_index[key] = len(mf_table)
+        mf_table.append(mf_record(zip(group_attributes, key)))
+
+    quant = arrays["quant"]
+    for variable in variables:
+        mask = table_rows.mask(variable["attribute"], variable["value"]) if shared else arrays[variable["attribute"]] == variable["value"]
+        variable_group_ids = group_ids[mask]
+        variable_quant = quant[mask]
+        for agg in variable["aggregates"]:
+            agg_name = agg["name"]
+            agg_type = agg["agg"]
+            if is_sketch(agg_type):
+                sketched_aggregate(agg, variable_group_ids, arrays[aggregated_attribute(agg)][mask], mf_table)
+                continue
+            result, counts = grouped_aggregate(agg_type, variable_group_ids, variable_quant, len(mf_table))
+            matched = np.flatnonzero(counts).tolist()
+            result = result.tolist()
+            counts = counts.tolist()
+            for pos in matched:
+                if agg_type == "avg":
+                    mf_table[pos][f"{agg_name}_sum"] = result[pos]
+                    mf_table[pos][f"{agg_name}_count"] = counts[pos]
+                    mf_table[pos][agg_name] = result[pos] / counts[pos]
+                else:
+                    mf_table[pos][agg_name] = result[pos]
+    return mf_table, mf_index
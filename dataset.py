@@ -0,0 +1,143 @@
+"""
+Description:
+    The dataset file keeps the Sales table in memory in columnar form, so that many queries can be evaluated against a single
+    load of the table instead of each reading it from the database again. The table is read once through a server side cursor
+    into one array per column (integer columns as compact machine integers), and a SalesDataset can be handed to any number of
+    QueryProcessors as their source, in sequence or from several threads.
+    The dataset also caches the work that queries over the same table share with the columnar engine: the NumPy arrays of the
+    columns, the group ids of every combination of grouping attributes and the row masks of every such that condition. Queries
+    grouping by the same attributes, or filtering on the same condition, then compute them only once.
+"""
+
+import threading
+from array import array
+from loader import sales_table_columns, SalesStream
+
+# ************************* Sales Dataset **************************
+class SalesDataset:
+    """
+        Columnar in-memory copy of the Sales table. Iterating the dataset yields its rows as tuples in table order, like the list
+        returned by fetch_table_rows, so every engine can scan it; batches splits it into partitions for the parallel scan.
+    """
+
+    def __init__(self, columns, column_names=sales_table_columns):
+        self.column_names = list(column_names)
+        self.columns = columns #column name -> values of the column
+        self.length = len(columns[self.column_names[0]]) if self.column_names else 0
+        self.lock = threading.Lock()
+        self.array_cache = {} #column name -> NumPy array
+        self.group_cache = {} #tuple of grouping attributes -> (group ids, first row of every group)
+        self.mask_cache = {} #(attribute, value) -> boolean NumPy array
+
+    @classmethod
+    def from_rows(cls, table_rows, column_names=sales_table_columns):
+        """
+            This function builds a dataset from rows of the Sales table.
+            Parameters:
+                rows of the Sales table (a list of tuples, or any iterable of rows such as a SalesStream)
+                columns of the Sales table
+            Output:
+                The dataset
+        """
+        values = [[] for column in column_names]
+        appends = [column.append for column in values]
+        for row in table_rows:
+            for append, value in zip(appends, row):
+                append(value)
+        return cls({column: compact_column(column_values) for column, column_values in zip(column_names, values)}, column_names)
+
+    @classmethod
+    def from_database(cls, connection_params, query="select * from sales;", params=None, itersize=10000):
+        """
+            This function reads the Sales table from the database into a dataset through a server side cursor, so the table is
+            never held in memory as rows.
+            Parameters:
+                connection parameters of the database
+                select statement returning the columns of the Sales table, and its parameters
+                number of rows fetched per round trip
+            Output:
+                The dataset
+        """
+        return cls.from_rows(SalesStream(connection_params, query, params=params, itersize=itersize))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return zip(*[self.columns[column] for column in self.column_names])
+
+    def batches(self, size=50000):
+        """
+            This function splits the rows of the dataset into partitions.
+            Parameters:
+                number of rows per partition
+            Output:
+                Lists of rows, in table order
+        """
+        for start in range(0, self.length, size):
+            yield list(zip(*[self.columns[column][start:start + size] for column in self.column_names]))
+
+    def arrays(self, names):
+        """
+            This function returns the NumPy arrays of columns of the dataset, converting every column only once.
+            Parameters:
+                names of the columns
+            Output:
+                Dictionary of column name -> NumPy array
+        """
+        import numpy as np # NumPy is only needed by the columnar engine
+        with self.lock:
+            for name in names:
+                if name not in self.array_cache:
+                    self.array_cache[name] = np.array(self.columns[name])
+            return {name: self.array_cache[name] for name in names}
+
+    def groups(self, attributes):
+        """
+            This function returns the group id of every row for a combination of grouping attributes (see columnar.factorize),
+            computing it only once per combination.
+            Parameters:
+                names of the grouping attributes
+            Output:
+                The group id of every row, and the position of the first row of every group
+        """
+        from columnar import factorize
+        arrays = self.arrays(attributes)
+        key = tuple(attributes)
+        with self.lock:
+            if key not in self.group_cache:
+                self.group_cache[key] = factorize([arrays[attribute] for attribute in attributes])
+            return self.group_cache[key]
+
+    def mask(self, attribute, value):
+        """
+            This function returns the rows satisfying the such that condition attribute = value as a boolean NumPy array,
+            computing it only once per condition.
+            Parameters:
+                attribute and value of the condition
+            Output:
+                The boolean array
+        """
+        column = self.arrays([attribute])[attribute]
+        key = (attribute, value)
+        with self.lock:
+            if key not in self.mask_cache:
+                self.mask_cache[key] = column == value
+            return self.mask_cache[key]
+
+# ************************* Compact Column **************************
+def compact_column(values):
+    """
+        This function stores a column of integers as an array of machine integers instead of a list of Python objects.
+        Columns of any other type, or with NULL values, are kept as lists.
+        Parameters:
+            values of the column
+        Output:
+            The values as an array or a list
+    """
+    if values and all(type(value) is int for value in values):
+        try:
+            return array("q", values)
+        except OverflowError:
+            pass
+    return values
@@ -0,0 +1,122 @@
+"""
+Description:
+    The incremental file keeps the mf_table of a query between runs, together with a watermark over a column of the Sales table
+    that only grows as rows are appended (e.g. date or a serial id). On the following runs only the rows from the watermark on
+    are read, and they update the stored groups and add the new ones with the single table scan of the processors.
+    The column does not have to be unique: rows can still be appended with the value of the watermark (more sales on the same
+    date) after a run. The rows at the watermark that were scanned are kept with the state, and the next run reads the rows at
+    the watermark again and skips the ones it already counted (see skip_counted).
+    The hidden sum and count of avg aggregates are part of the stored MF rows, so every aggregate the single table scan supports
+    can be updated incrementally.
+"""
+
+import os
+import pickle
+from collections import Counter
+import psycopg2
+from codegen import query_hash
+
+# ************************* State Path **************************
+def state_path(phi, columns, state_dir, watermark_column):
+    """
+        This function returns the file where the incremental state of a query is stored, one per watermark column.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+            directory of the incremental states
+            column of the Sales table used as watermark
+        Output:
+            The path of the state file
+    """
+    return os.path.join(state_dir, f"{query_hash(phi, columns)}_{watermark_column}.pickle")
+
+# ************************* Load State **************************
+def load_state(path):
+    """
+        This function loads the incremental state of a query.
+        Parameters:
+            path of the state file
+        Output:
+            Dictionary with the "watermark", "watermark_column", "boundary_rows" and "mf_table" of the previous run, or None when
+            the query has no state yet or its state file cannot be read, and the query is evaluated from scratch
+    """
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError, IndexError):
+        return None
+
+# ************************* Save State **************************
+def save_state(path, state):
+    """
+        This function stores the incremental state of a query. The state is written to a temporary file first, so a run that is
+        interrupted never leaves a partial state behind.
+        Parameters:
+            path of the state file
+            Dictionary with the "watermark", "watermark_column", "boundary_rows" and "mf_table" of the run
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "wb") as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+
+# ************************* Current Watermark **************************
+def current_watermark(connection_params, watermark_column):
+    """
+        This function reads the current watermark of the Sales table. It is read before the new rows, so rows appended while a run
+        is reading are left for the next run instead of being missed.
+        Parameters:
+            connection parameters of the database
+            column of the Sales table used as watermark
+        Output:
+            The largest value of the watermark column, or None when the table is empty
+    """
+    connection = psycopg2.connect(**connection_params)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"select max({watermark_column}) from sales;")
+        watermark = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        connection.close()
+    return watermark
+
+# ************************* New Rows Query **************************
+def new_rows_query(watermark_column, previous_watermark, watermark):
+    """
+        This function builds the select statement of the rows appended between two runs.
+        Parameters:
+            column of the Sales table used as watermark
+            watermark of the previous run, or None on the first run
+            current watermark
+        Output:
+            The select statement and its parameters. The rows at the previous watermark are read again, since rows can be appended
+            with the same value after the previous run
+    """
+    if previous_watermark is None:
+        return f"select * from sales where {watermark_column} <= %s;", [watermark]
+    return f"select * from sales where {watermark_column} >= %s and {watermark_column} <= %s;", [previous_watermark, watermark]
+
+# ************************* Skip Counted Rows **************************
+def skip_counted(table_rows, watermark_index, previous_watermark, boundary_rows, watermark, new_boundary_rows):
+    """
+        This function filters the rows read by new_rows_query, skipping the rows at the previous watermark that the previous run
+        already counted. Rows of the Sales table have no key, so identical rows are told apart by how many of them were counted.
+        Parameters:
+            rows read by new_rows_query
+            index of the watermark column in the rows
+            watermark of the previous run, and the rows at that watermark it counted
+            current watermark
+            list collecting the rows at the current watermark, to be stored with the state
+        Output:
+            The rows that were not counted yet, as a generator
+    """
+    counted = Counter(boundary_rows)
+    for row in table_rows:
+        value = row[watermark_index]
+        if value == watermark:
+            new_boundary_rows.append(row)
+        if value == previous_watermark and counted[row] > 0:
+            counted[row] -= 1
+            continue
+        yield row
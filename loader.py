@@ -0,0 +1,241 @@
+"""
+Description:
+    The loader file is where the Sales table is retrieved from the database and fed into the query processors.
+    fetch_table_rows retrieves the whole table at once with a client side cursor, while SalesStream reads the table in batches
+    through a named (server side) cursor so that the memory used by the processors stays flat no matter how large the table grows.
+    PartitionedSales splits the table into ranges of blocks or buckets of a hash of the grouping attributes (see partition_methods),
+    which are read concurrently over a pool of connections.
+"""
+
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from psycopg2 import pool
+
+sales_table_schema = {
+    "cust": ["char", 20],
+    "prod": ["char", 20],
+    "day": "int",
+    "month": "int",
+    "year": "int",
+    "state": ["char", 2],
+    "quant": "int",
+    "date": "date"
+}
+sales_table_columns = ["cust", "prod", "day", "month", "year", "state", "quant", "date"]
+stream_counter = itertools.count(1) #Used to give every server side cursor a unique name
+partition_methods = ["ctid", "hash"] #Ways PartitionedSales splits the Sales table: ranges of blocks or buckets of a hash of the grouping attributes
+
+# ************************* Fetch Sales Table **************************
+def fetch_table_rows(connection_params, query="select * from sales;", params=None):
+    """
+        This function connects to the database and retrieves all of the rows of the Sales table at once.
+        Parameters:
+            connection parameters of the database as a dictionary
+            select statement used to retrieve the table
+            parameters of the select statement
+        Output:
+            The rows of the Sales table as a list of tuples, or an empty list if the table could not be retrieved
+    """
+    table_rows = []
+    try:
+        connection = psycopg2.connect(**connection_params)
+        print("Connection successful!")
+    except Exception as e:
+        print("Error connecting to the database: ", e)
+        return table_rows
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        table_rows = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        print("Error retrieving data: ", e)
+    finally:
+        connection.close()
+    return table_rows
+
+# ************************* Sales Table Stream **************************
+class SalesStream:
+    """
+        Re-iterable stream over the Sales table. Every iteration opens a new named (server side) cursor and fetches itersize rows
+        per round trip, so each table scan of the MF algorithm re-reads the table from the database instead of holding it in memory.
+        Because the table scans following the first one of an EMF query only need a few of the columns, the stream can instead cache
+        the rows of its first iteration keeping only those columns (see cache), and replay the cache on the following iterations.
+    """
+
+    def __init__(self, connection_params, query="select * from sales;", params=None, itersize=2000):
+        self.connection_params = connection_params
+        self.query = query
+        self.params = params
+        self.itersize = itersize
+        self.cache_columns = None
+        self.cached_rows = None
+
+    def cache(self, columns):
+        """
+            This function makes the stream cache the rows of its next full iteration, keeping only the given columns.
+            Parameters:
+                indeces of the columns needed by the following table scans
+        """
+        self.cache_columns = set(columns)
+        self.cached_rows = None
+
+    def batches(self):
+        """
+            This function reads the table from the database through a server side cursor.
+            Output:
+                Lists of at most itersize rows
+        """
+        connection = psycopg2.connect(**self.connection_params)
+        try:
+            cursor = connection.cursor(name=f"sales_stream_{next(stream_counter)}")
+            cursor.itersize = self.itersize
+            cursor.execute(self.query, self.params)
+            while True:
+                batch = cursor.fetchmany(self.itersize)
+                if not batch:
+                    break
+                yield batch
+            cursor.close()
+        finally:
+            connection.close()
+
+    def __iter__(self):
+        if self.cached_rows is not None:
+            yield from self.cached_rows
+            return
+
+        if self.cache_columns is None:
+            for batch in self.batches():
+                yield from batch
+            return
+
+        cached_rows = []
+        for batch in self.batches():
+            for row in batch:
+                cached_rows.append(tuple(value if index in self.cache_columns else None for index, value in enumerate(row)))
+                yield row
+        self.cached_rows = cached_rows
+
+# ************************* Partitioned Sales Table **************************
+class PartitionedSales:
+    """
+        Re-iterable reader of the Sales table split into partitions that are read concurrently over a pool of connections.
+        Partitions are either ranges of the physical blocks of the table ("ctid", served by a TID range scan on PostgreSQL 14 and
+        later) or the buckets of a hash of the grouping attributes ("hash", so that every group belongs to a single partition).
+        At most one partition per connection is fetched ahead of the consumer, and the partitions are returned in order, so
+        the parallel aggregate scan can hand every partition straight to a worker as soon as it is read. The pool of connections
+        is opened by every read of the table and closed once the read is finished or abandoned.
+    """
+
+    def __init__(self, connection_params, query="select * from sales;", params=None, partitions=4, connections=4, method="ctid", attributes=None):
+        if method not in partition_methods:
+            raise ValueError(f"Unknown partition method {method}, expected one of {', '.join(partition_methods)}")
+        if method == "hash" and not attributes:
+            raise ValueError("Hash partitioning needs the grouping attributes")
+        self.connection_params = connection_params
+        self.query = query.strip().rstrip(";")
+        self.params = params
+        self.partitions = partitions
+        self.connections = connections
+        self.method = method
+        self.attributes = attributes
+        self.connection_pool = None
+
+    def get_pool(self):
+        """
+            This function opens the pool of connections of a read of the table.
+            Output:
+                The ThreadedConnectionPool of the reader
+        """
+        if self.connection_pool is None:
+            self.connection_pool = pool.ThreadedConnectionPool(1, self.connections, **self.connection_params)
+        return self.connection_pool
+
+    def close(self):
+        """
+            This function closes the pool of connections.
+        """
+        if self.connection_pool is not None:
+            self.connection_pool.closeall()
+            self.connection_pool = None
+
+    def partition_conditions(self):
+        """
+            This function builds the condition selecting the rows of every partition.
+            Output:
+                List of (condition, parameters) pairs, one per partition
+        """
+        if self.method == "hash":
+            # NULL attributes hash like empty text, and the hash is shifted to be positive (abs overflows on -2147483648)
+            key = " || '|' || ".join(f"coalesce({attribute}::text, '')" for attribute in self.attributes)
+            return [(f"mod(hashtext({key})::bigint + 2147483648, %s) = %s", [self.partitions, partition]) for partition in range(self.partitions)]
+
+        connection = self.get_pool().getconn()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("select pg_relation_size('sales') / current_setting('block_size')::int;")
+            blocks = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            self.get_pool().putconn(connection)
+
+        size = max(1, -(-blocks // self.partitions))
+        conditions = []
+        for start in range(0, max(blocks, 1), size):
+            if start + size >= blocks:
+                # The last range is left open so that rows appended after counting the blocks are read too
+                conditions.append(("ctid >= %s::tid", [f"({start},0)"]))
+            else:
+                conditions.append(("ctid >= %s::tid and ctid < %s::tid", [f"({start},0)", f"({start + size},0)"]))
+        return conditions
+
+    def fetch_partition(self, condition, condition_params):
+        """
+            This function reads the rows of one partition over a connection of the pool.
+            Parameters:
+                condition selecting the rows of the partition and its parameters
+            Output:
+                The rows of the partition as a list of tuples
+        """
+        select, where, query_condition = self.query.partition(" where ")
+        if where:
+            query = f"{select} where ({query_condition}) and ({condition});"
+        else:
+            query = f"{select} where {condition};"
+        connection = self.get_pool().getconn()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, list(self.params or []) + condition_params)
+            rows = cursor.fetchall()
+            cursor.close()
+            connection.rollback()
+        finally:
+            self.get_pool().putconn(connection)
+        return rows
+
+    def batches(self):
+        """
+            This function reads the partitions of the table concurrently, and closes the pool of connections once they are read.
+            Output:
+                The rows of every partition as a list, in partition order
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections) as executor:
+                pending = deque()
+                for condition, condition_params in self.partition_conditions():
+                    pending.append(executor.submit(self.fetch_partition, condition, condition_params))
+                    if len(pending) >= self.connections:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        finally:
+            # The partitions still being fetched are finished by the executor before the pool is closed
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
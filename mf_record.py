@@ -0,0 +1,127 @@
+"""
+Description:
+    The mf_record file generates a compact record type for the rows of the mf_table of a query. Instead of a dictionary per group,
+    every MF row is an object with one __slot__ per column of the MF structure (the grouping attributes, the aggregates, the
+    hidden sum and count of avg aggregates and the hidden sketches of holistic aggregates), so a group costs a few machine words
+    per aggregate.
+    Records keep the dictionary interface used by the processors (row[name], row.get(name), name in row), so print_table_rows and
+    every other reader of the mf_table work on them unchanged. A column that was never set holds the private _UNSET marker and reads
+    as missing, while a column set to None (a NULL grouping attribute) is present like any other value.
+"""
+
+import threading
+from collections import OrderedDict
+from sketches import is_sketch
+
+record_types = OrderedDict() #tuple of fields -> generated record type, least recently used first
+record_types_size = 256 #Number of record types kept in record_types
+record_types_lock = threading.Lock() #Guards record_types, shared by the threads of a process
+_UNSET = object() #Value of the columns of a record that were never set
+
+# ************************* MF Fields **************************
+def mf_fields(phi):
+    """
+        This function lists the columns of the MF structure of a query.
+        Parameters:
+            Phi Arguments of the query
+        Output:
+            The grouping attributes, the aggregates, the hidden sum and count of every avg aggregate and the hidden sketch of every
+            holistic aggregate (see sketches.py), as a tuple of names
+    """
+    fields = [obj["name"] for column, obj in phi["V"].items()]
+    for agg in phi["F-VECT"]:
+        fields.append(agg["name"])
+        if agg["agg"] == "avg":
+            fields.extend([f"{agg['name']}_sum", f"{agg['name']}_count"])
+        elif is_sketch(agg["agg"]):
+            fields.append(f"{agg['name']}_sketch")
+    return tuple(dict.fromkeys(fields))
+
+# ************************* MF Record **************************
+class MFRecord:
+    """
+        Base class of the generated record types. The fields class attribute lists the columns of the record, and slots maps every
+        column to the name of its slot (f0, f1, ...), since column names are not always valid attribute names.
+    """
+    __slots__ = ()
+    fields = ()
+    slots = {}
+
+    def __init__(self, values=None):
+        for slot in self.__slots__:
+            setattr(self, slot, _UNSET)
+        if values is not None:
+            for name, value in (values.items() if hasattr(values, "items") else values):
+                self[name] = value
+
+    def __getitem__(self, name):
+        value = getattr(self, self.slots[name])
+        if value is _UNSET:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        setattr(self, self.slots[name], value)
+
+    def __contains__(self, name):
+        return name in self.slots and getattr(self, self.slots[name]) is not _UNSET
+
+    def get(self, name, default=None):
+        value = getattr(self, self.slots[name]) if name in self.slots else _UNSET
+        return default if value is _UNSET else value
+
+    def keys(self):
+        return [name for name in self.fields if name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        return dict(self.items()) == (dict(other.items()) if hasattr(other, "items") else other)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __reduce__(self):
+        # Generated types cannot be pickled by reference, so records are rebuilt from their fields (used by the worker processes and
+        # the stored mf_tables of the incremental mode and the result cache), with only the columns that were set
+        return (rebuild_record, (self.fields, dict(self.items())))
+
+# ************************* Record Type **************************
+def record_type(fields):
+    """
+        This function generates (or reuses) the record type of the given columns. Only the record_types_size most recently used
+        types are kept: a type generated again for the same columns has the same slots, so its records read and compare the same.
+        Parameters:
+            columns of the MF structure (see mf_fields)
+        Output:
+            The record type, a subclass of MFRecord
+    """
+    fields = tuple(fields)
+    with record_types_lock:
+        if fields in record_types:
+            record_types.move_to_end(fields)
+            return record_types[fields]
+        slots = {name: f"f{position}" for position, name in enumerate(fields)}
+        record_types[fields] = type("MFRow", (MFRecord,), {"__slots__": tuple(slots.values()), "fields": fields, "slots": slots})
+        while len(record_types) > record_types_size:
+            record_types.popitem(last=False)
+        return record_types[fields]
+
+# ************************* Rebuild Record **************************
+def rebuild_record(fields, values):
+    """
+        This function rebuilds a pickled record.
+        Parameters:
+            columns of the record
+            values of the columns that were set, by name
+        Output:
+            The record
+    """
+    return record_type(fields)(values)
@@ -0,0 +1,96 @@
+"""
+Description:
+    The multiquery file evaluates several queries over the same grouping attributes in one table scan. Their Phi Arguments are
+    merged into the Phi Arguments of a single combined query, whose MF structure holds the aggregates of every query:
+        - every distinct such that condition becomes one grouping variable, so a condition shared by several queries is tested
+          once per row
+        - every distinct aggregate of a condition becomes one aggregate, so an aggregate shared by several queries is computed once
+      (aggregates over another attribute or with other sketch options are distinct)
+    The combined query is evaluated like any other query, by any engine, and its mf_table is then split into the mf_table of every
+    query. The groups of queries over the same grouping attributes are the same, in the same order, so the split tables keep the
+    group order of evaluating every query on its own.
+"""
+
+from mf_record import mf_fields, record_type
+from planner import aggregated_attribute
+from sketches import is_sketch, sketch_options
+
+# ************************* Grouping Key **************************
+def grouping_key(phi):
+    """
+        This function lists the grouping attributes of a query, which must be the same for the queries merged into one scan.
+        Parameters:
+            Phi Arguments of the query
+        Output:
+            The grouping attributes as a tuple of names
+    """
+    return tuple(obj["name"] for column, obj in phi["V"].items())
+
+# ************************* Merge Queries **************************
+def merge_queries(queries):
+    """
+        This function merges queries over the same grouping attributes into one combined query.
+        Parameters:
+            list of Phi Arguments of the queries
+        Output:
+            The Phi Arguments of the combined query, and for every query a dictionary mapping the name of each of its aggregates
+            to the name of the aggregate of the combined query that computes it
+    """
+    key = grouping_key(queries[0])
+    for phi in queries[1:]:
+        if grouping_key(phi) != key:
+            raise ValueError(f"Only queries over the same grouping attributes can be merged, not {list(key)} and {list(grouping_key(phi))}")
+
+    combined = {"S": list(key), "n": 0, "V": dict(queries[0]["V"]), "F-VECT": [], "PRED-LIST": {}}
+    group_vars = {} #(attribute, value) -> grouping variable of the combined query
+    aggregates = {} #(attribute, value, aggregate, aggregated attribute, sketch options) -> aggregate name of the combined query
+    mappings = []
+    for phi in queries:
+        mapping = {}
+        for n, agg in enumerate(phi["F-VECT"]):
+            predicate = phi["PRED-LIST"][f"var{n + 1}"]
+            condition = (predicate["attribute"], predicate["value"])
+            if condition not in group_vars:
+                group_vars[condition] = f"V{len(group_vars) + 1}"
+            options = sketch_options(agg) if is_sketch(agg["agg"]) else None
+            aggregate = condition + (agg["agg"], aggregated_attribute(agg), options)
+            if aggregate not in aggregates:
+                agg_name = f"{agg['agg']}_{group_vars[condition]}_{aggregated_attribute(agg)}"
+                if agg_name in aggregates.values():
+                    agg_name = f"{agg_name}_{len(aggregates) + 1}" # Same aggregate with other sketch options
+                aggregates[aggregate] = agg_name
+                combined_agg = {key: value for key, value in agg.items() if key not in ["name", "group_var"]}
+                combined_agg.update({"name": agg_name, "group_var": group_vars[condition]})
+                combined["S"].append(agg_name)
+                combined["F-VECT"].append(combined_agg)
+                combined["PRED-LIST"][f"var{len(combined['F-VECT'])}"] = {"name": agg_name, "group_var": group_vars[condition],
+                                                                          "attribute": condition[0], "value": condition[1]}
+            mapping[agg["name"]] = aggregates[aggregate]
+        mappings.append(mapping)
+    combined["n"] = len(group_vars)
+    return combined, mappings
+
+# ************************* Split MF Table **************************
+def split_table(mf_table, queries, mappings):
+    """
+        This function splits the mf_table of a combined query into the mf_table of every merged query.
+        Parameters:
+            mf_table of the combined query
+            list of Phi Arguments of the merged queries
+            mappings of their aggregates to the aggregates of the combined query (see merge_queries)
+        Output:
+            The mf_table of every query, as lists of MF records
+    """
+    tables = []
+    for phi, mapping in zip(queries, mappings):
+        columns = [(name, name) for name in grouping_key(phi)] #column of the query -> column of the combined query
+        for agg in phi["F-VECT"]:
+            columns.append((agg["name"], mapping[agg["name"]]))
+            if agg["agg"] == "avg":
+                columns.append((f"{agg['name']}_sum", f"{mapping[agg['name']]}_sum"))
+                columns.append((f"{agg['name']}_count", f"{mapping[agg['name']]}_count"))
+            elif is_sketch(agg["agg"]):
+                columns.append((f"{agg['name']}_sketch", f"{mapping[agg['name']]}_sketch"))
+        mf_record = record_type(mf_fields(phi))
+        tables.append([mf_record([(name, row[combined_name]) for name, combined_name in columns if combined_name in row]) for row in mf_table])
+    return tables
@@ -6,9 +6,9 @@
         This program is a simple solution to ad-hoc OLAP complex queries using the newly introduced Phi operator. Instead of conducting multiple joins which leads to multiple scans of the underlying table, this programs aims to reduce the number of joins and number of scans by computing aggregates functions of subsets of the group by attributes using just a few table scans.
 """
 
-import psycopg2
 from tabulate import tabulate
 from queries import esqlQuery
+from loader import fetch_table_rows
 
 #Global Variables
 connection_params = {
@@ -31,26 +31,8 @@ sales_table_columns = ["cust", "prod", "day", "month", "year", "state", "quant",
 mf_struct_header = []
 mf_table = [] #Store the Output of the result
 
-# The set of below operations attempt to connect to Database and retrieve Sales Table
-try: 
-    connection = psycopg2.connect(**connection_params)
-    print("Connection successful!")
-except Exception as e:
-    print("Error connecting to the database: ", e)
-
-try:
-    cursor = connection.cursor()
-    # table rows
-    cursor.execute("select * from sales;")
-    global table_rows
-    table_rows = cursor.fetchall()
-
-except Exception as e:
-    print("Error retrieving data: ", e)
-
-finally:
-    cursor.close()
-    connection.close()
+# Retrieve the Sales Table
+table_rows = fetch_table_rows(connection_params)
 
 # ************************* Print Table Rows Test Function **************************
 def print_table_rows():
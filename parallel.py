@@ -0,0 +1,144 @@
+"""
+Description:
+    The parallel file runs the aggregate scan of the MF algorithm on a pool of worker processes. The rows of the Sales table are
+    split into partitions, every worker builds a partial mf_table for its partition with the function generated for the query,
+    and the partial tables are merged with the combine rule of every aggregate:
+        sum + sum, min of mins, max of maxes, count + count, avg from the merged hidden sum and count, and the merged sketches of
+        the holistic aggregates (see sketches.py), whose values are read once the scan is finished.
+    Partitions are merged in table order, so the groups of the merged mf_table appear in the same order as in the serial scan,
+    with the same values, except for the sketch aggregates of groups with more than exact_limit values: their merged sketches are
+    estimates within the error bounds of the sketch, which can differ from the estimate of the serial scan (see sketches.py).
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from codegen import compile_phi
+from planner import single_pass_eligible
+from sketches import is_sketch
+
+# ************************* Row Partitions **************************
+def row_partitions(table_rows, partition_size):
+    """
+        This function splits the rows of the Sales table into partitions.
+        Parameters:
+            rows of the Sales table (a list of tuples, a SalesStream, whose batches are used as partitions, or any other iterable)
+            number of rows per partition of a list or an iterable
+        Output:
+            Lists of rows, in table order
+    """
+    if hasattr(table_rows, "batches"):
+        yield from table_rows.batches()
+        return
+    if not hasattr(table_rows, "__len__"):
+        table_rows = iter(table_rows)
+        while True:
+            partition = list(islice(table_rows, partition_size))
+            if not partition:
+                return
+            yield partition
+    for start in range(0, len(table_rows), partition_size):
+        yield table_rows[start:start + partition_size]
+
+# ************************* Partial Scan **************************
+def partial_scan(phi, columns, rows):
+    """
+        This function builds the partial mf_table of a partition. It runs in the worker processes.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+            rows of the partition
+        Output:
+            The partial mf_table as a list of MF records
+    """
+    phi_scan = compile_phi(phi, columns)
+    mf_table = []
+    phi_scan(rows, mf_table, {}, True)
+    return mf_table
+
+# ************************* Merge Rows **************************
+def merge_row(aggregates, mf_row, partial_row):
+    """
+        This function merges the aggregates of a partial MF row into an MF row of the same group.
+        Parameters:
+            F-VECT of the query
+            MF row that is updated
+            partial MF row of the same group
+    """
+    for agg in aggregates:
+        agg_name = agg["name"]
+        agg_type = agg["agg"]
+        if is_sketch(agg_type):
+            sketch_key = f"{agg_name}_sketch"
+            if sketch_key not in partial_row:
+                continue
+            if sketch_key not in mf_row:
+                mf_row[sketch_key] = partial_row[sketch_key]
+            else:
+                mf_row[sketch_key].merge(partial_row[sketch_key])
+            continue
+        if agg_name not in partial_row:
+            continue
+        if agg_name not in mf_row:
+            mf_row[agg_name] = partial_row[agg_name]
+            if agg_type == "avg":
+                mf_row[f"{agg_name}_sum"] = partial_row[f"{agg_name}_sum"]
+                mf_row[f"{agg_name}_count"] = partial_row[f"{agg_name}_count"]
+        elif agg_type == "sum" or agg_type == "count":
+            mf_row[agg_name] = mf_row[agg_name] + partial_row[agg_name]
+        elif agg_type == "max":
+            mf_row[agg_name] = max(mf_row[agg_name], partial_row[agg_name])
+        elif agg_type == "min":
+            mf_row[agg_name] = min(mf_row[agg_name], partial_row[agg_name])
+        elif agg_type == "avg":
+            sum_key = f"{agg_name}_sum"
+            count_key = f"{agg_name}_count"
+            mf_row[sum_key] = mf_row[sum_key] + partial_row[sum_key]
+            mf_row[count_key] = mf_row[count_key] + partial_row[count_key]
+            mf_row[agg_name] = mf_row[sum_key] / mf_row[count_key]
+
+# ************************* Merge Partial Table **************************
+def merge_partial(phi, mf_table, mf_index, partial_table, add_groups):
+    """
+        This function merges a partial mf_table into the mf_table.
+        Parameters:
+            Phi Arguments of the query
+            mf_table and mf_index that are updated
+            partial mf_table of a partition
+            True to add the groups that are not in the mf_table yet, False to skip them
+    """
+    group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+    for partial_row in partial_table:
+        key = tuple(partial_row[attribute] for attribute in group_attributes)
+        pos = mf_index.get(key)
+        if pos is not None:
+            merge_row(phi["F-VECT"], mf_table[pos], partial_row)
+        elif add_groups:
+            mf_index[key] = len(mf_table)
+            mf_table.append(partial_row)
+
+# ************************* Run Parallel **************************
+def run_parallel(phi, columns, table_rows, mf_table, mf_index, add_groups, workers, partition_size=50000):
+    """
+        This function runs the aggregate scan of a query on a pool of worker processes. At most two partitions per worker are in
+        flight at a time, so a streamed table is never held in memory at once.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+            rows of the Sales table (a list of tuples or a SalesStream)
+            mf_table and mf_index that are updated
+            True to add groups on first sight (single pass mode), False when the first table scan already populated the mf_table
+            number of worker processes
+            number of rows per partition of a list
+    """
+    if not single_pass_eligible(phi, columns):
+        raise ValueError("Only queries whose aggregates can be merged (sum, count, min, max, avg and sketches) can be scanned in parallel")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for rows in row_partitions(table_rows, partition_size):
+            pending.append(executor.submit(partial_scan, phi, columns, rows))
+            if len(pending) >= 2 * workers:
+                merge_partial(phi, mf_table, mf_index, pending.popleft().result(), add_groups)
+        while pending:
+            merge_partial(phi, mf_table, mf_index, pending.popleft().result(), add_groups)
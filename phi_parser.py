@@ -0,0 +1,307 @@
+"""
+Description:
+    The phi_parser file turns the textual form of a query (see phi_a and phi_b in queries.py)
+
+        select cust, prod, Y.sum(quant), J.sum(quant)
+        from sales
+        group by cust, prod : Y, J
+        such that Y.state = 'NY' and J.state = 'NJ'
+
+    into the Phi Arguments used by the query processors, so the esql_ dictionaries no longer have to be written by hand.
+    Parsed queries are kept in a cache of the query_cache_size most recently used queries, keyed by the normalized query text and
+    the schema of the table, so a repeated query is not parsed again (see get_query).
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from loader import sales_table_schema
+from planner import comparisons
+
+token_pattern = re.compile(r"\s*(?:('(?:[^']|'')*')|(\d+(?:\.\d+)?)|(\w+)|(<=|>=|<>|!=|[=<>().,:;*]))")
+query_cache = OrderedDict() #(normalized query text, schema) -> Phi Arguments, least recently used first
+query_cache_size = 256 #Number of parsed queries kept in the query_cache
+query_cache_lock = threading.Lock() #Guards the query_cache, shared by the threads of a process
+
+# ************************* Tokenize **************************
+def tokenize(text):
+    """
+        This function splits the text of a query into tokens.
+        Parameters:
+            text of the query
+        Output:
+            List of (kind, value) tuples, where kind is "string", "number", "word" or "symbol"
+    """
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = token_pattern.match(text, position)
+        if match is None and text[position:].lstrip().startswith("'"):
+            raise ValueError(f"Unterminated string constant at position {position} of the query")
+        if match is None or match.end() == position:
+            raise ValueError(f"Unexpected character {text[position:].strip()[:1]!r} at position {position} of the query")
+        string, number, word, symbol = match.groups()
+        if string is not None:
+            tokens.append(("string", string[1:-1].replace("''", "'")))
+        elif number is not None:
+            tokens.append(("number", float(number) if "." in number else int(number)))
+        elif word is not None:
+            tokens.append(("word", word))
+        else:
+            tokens.append(("symbol", symbol))
+        position = match.end()
+    return tokens
+
+# ************************* Token Reader **************************
+class TokenReader:
+    """
+        Cursor over the tokens of a query used by the parsing functions.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, offset=0):
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset]
+        return (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def at_keyword(self, *keywords):
+        return all(self.peek(offset)[0] == "word" and self.peek(offset)[1].lower() == keyword for offset, keyword in enumerate(keywords))
+
+    def expect_keyword(self, *keywords):
+        if not self.at_keyword(*keywords):
+            raise ValueError(f"Expected '{' '.join(keywords)}' but found {self.peek()[1]!r}")
+        self.position += len(keywords)
+
+    def expect_symbol(self, symbol):
+        if self.peek() != ("symbol", symbol):
+            raise ValueError(f"Expected '{symbol}' but found {self.peek()[1]!r}")
+        self.position += 1
+
+    def expect_word(self, what):
+        kind, value = self.next()
+        if kind != "word":
+            raise ValueError(f"Expected {what} but found {value!r}")
+        return value
+
+# ************************* Parse Select List **************************
+def parse_select_item(reader):
+    """
+        This function parses one item of the select list: a grouping attribute (cust) or an aggregate of a grouping variable
+        (Y.sum(quant)).
+        Parameters:
+            token reader positioned at the item
+        Output:
+            ("attribute", name) or ("aggregate", grouping variable, aggregate, attribute)
+    """
+    name = reader.expect_word("a grouping attribute or grouping variable")
+    if reader.peek() != ("symbol", "."):
+        return ("attribute", name)
+    reader.expect_symbol(".")
+    agg = reader.expect_word("an aggregate function").lower()
+    reader.expect_symbol("(")
+    attribute = reader.expect_word("the aggregated attribute")
+    reader.expect_symbol(")")
+    return ("aggregate", name, agg, attribute)
+
+# ************************* Parse Condition **************************
+def parse_condition(reader):
+    """
+        This function parses one such that condition of the form Y.attribute <operator> operand, where the operand is a constant
+        ('NY', 10), a grouping attribute (cust) or an aggregate of a grouping variable (X.avg(quant)).
+        Parameters:
+            token reader positioned at the condition
+        Output:
+            The grouping variable, the attribute and the operator of the condition, and its operand as ("value", constant),
+            ("ref", grouping attribute) or ("aggregate", grouping variable, aggregate, attribute)
+    """
+    group_var = reader.expect_word("a grouping variable")
+    reader.expect_symbol(".")
+    attribute = reader.expect_word("an attribute")
+    kind, op = reader.next()
+    if kind != "symbol" or op not in comparisons:
+        raise ValueError(f"Expected a comparison in the condition of {group_var} but found {op!r}")
+    kind, value = reader.next()
+    if kind in ["string", "number"]:
+        return group_var, attribute, op, ("value", value)
+    if kind != "word":
+        raise ValueError(f"Expected a constant, a grouping attribute or an aggregate in the condition of {group_var} but found {value!r}")
+    if reader.peek() != ("symbol", "."):
+        return group_var, attribute, op, ("ref", value)
+    reader.expect_symbol(".")
+    agg = reader.expect_word("an aggregate function").lower()
+    reader.expect_symbol("(")
+    agg_attribute = reader.expect_word("the aggregated attribute")
+    reader.expect_symbol(")")
+    return group_var, attribute, op, ("aggregate", value, agg, agg_attribute)
+
+# ************************* Parse Phi **************************
+def parse_phi(text, schema=sales_table_schema):
+    """
+        This function parses the text of a query into its Phi Arguments.
+        The aggregates of the select list become the F-VECT, named <aggregate>_<grouping variable>_<attribute>, and the such that
+        condition of the grouping variable of the n-th aggregate becomes the entry var<n> of the PRED-LIST. Grouping variables with
+        a single condition attribute = constant get the attribute and value of the MF queries; any other conditions become the
+        "conditions" list of an EMF query (see planner.emf_variables), and the aggregates they reference are added to the F-VECT.
+        Parameters:
+            text of the query
+            schema of the Sales table
+        Output:
+            The Phi Arguments as a nested dictionary, in the format of the esql_ queries
+    """
+    reader = TokenReader(tokenize(text))
+
+    reader.expect_keyword("select")
+    items = [parse_select_item(reader)]
+    while reader.peek() == ("symbol", ","):
+        reader.next()
+        items.append(parse_select_item(reader))
+
+    reader.expect_keyword("from")
+    table = reader.expect_word("the table name")
+    if table.lower() != "sales":
+        raise ValueError(f"Queries can only read the sales table, not {table}")
+
+    reader.expect_keyword("group", "by")
+    group_attributes = [reader.expect_word("a grouping attribute")]
+    while reader.peek() == ("symbol", ","):
+        reader.next()
+        group_attributes.append(reader.expect_word("a grouping attribute"))
+
+    group_vars = []
+    if reader.peek() == ("symbol", ":"):
+        reader.next()
+        group_vars.append(reader.expect_word("a grouping variable"))
+        while reader.peek() == ("symbol", ","):
+            reader.next()
+            group_vars.append(reader.expect_word("a grouping variable"))
+
+    conditions = {}
+    if reader.at_keyword("such", "that"):
+        reader.expect_keyword("such", "that")
+        while True:
+            group_var, attribute, op, operand = parse_condition(reader)
+            if group_var not in group_vars:
+                raise ValueError(f"Grouping variable {group_var} of the such that clause is not declared after the group by attributes")
+            if attribute not in schema:
+                raise ValueError(f"Unknown attribute {attribute} in the condition of {group_var}")
+            conditions.setdefault(group_var, []).append((attribute, op, operand))
+            if not reader.at_keyword("and"):
+                break
+            reader.next()
+
+    if reader.peek() == ("symbol", ";"):
+        reader.next()
+    if reader.peek()[0] is not None:
+        raise ValueError(f"Unexpected {reader.peek()[1]!r} at the end of the query")
+
+    phi = {"S": [], "n": len(group_vars), "V": {}, "F-VECT": [], "PRED-LIST": {}}
+    for attribute in group_attributes:
+        if attribute not in schema:
+            raise ValueError(f"Unknown grouping attribute {attribute}")
+        column_type = schema[attribute]
+        col_type, col_size = column_type if isinstance(column_type, list) else [column_type, 1]
+        phi["V"][f"col{len(phi['V']) + 1}"] = {"name": attribute, "type": col_type, "size": col_size}
+
+    # A condition comparing with a grouping attribute or an aggregate makes the query an EMF query, whose conditions are taken
+    # literally. Otherwise every grouping variable ranges over the rows of the group of the MF row, as in the MF algorithm.
+    emf = any(operand[0] != "value" for group_conditions in conditions.values() for attribute, op, operand in group_conditions)
+    mf = not emf and all(len(group_conditions) == 1 and group_conditions[0][1] == "=" for group_conditions in conditions.values())
+
+    # Aggregates referenced by the conditions are computed even when they are not selected
+    aggregates = [item[1:] for item in items if item[0] == "aggregate"]
+    for group_conditions in conditions.values():
+        for attribute, op, operand in group_conditions:
+            if operand[0] == "aggregate" and operand[1:] not in aggregates:
+                aggregates.append(operand[1:])
+
+    for item in items:
+        if item[0] == "attribute":
+            if item[1] not in group_attributes:
+                raise ValueError(f"{item[1]} is selected but is not a grouping attribute")
+            phi["S"].append(item[1])
+        else:
+            phi["S"].append(f"{item[2]}_{item[1]}_{item[3]}")
+
+    for group_var, agg, attribute in aggregates:
+        if group_var not in group_vars:
+            raise ValueError(f"Grouping variable {group_var} of {group_var}.{agg}({attribute}) is not declared")
+        if attribute != "quant" and agg != "count_distinct":
+            raise ValueError(f"Only quant can be aggregated, not {attribute}, except by count_distinct")
+        if attribute not in schema:
+            raise ValueError(f"Unknown attribute {attribute} in {group_var}.{agg}({attribute})")
+        if group_var not in conditions:
+            raise ValueError(f"Grouping variable {group_var} has no such that condition")
+        agg_name = f"{agg}_{group_var}_{attribute}"
+        phi["F-VECT"].append({"name": agg_name, "group_var": group_var, "agg": agg})
+        if attribute != "quant":
+            phi["F-VECT"][-1]["attribute"] = attribute
+        predicate = {"name": agg_name, "group_var": group_var}
+        if mf:
+            condition_attribute, op, (kind, value) = conditions[group_var][0]
+            predicate.update({"attribute": condition_attribute, "value": value})
+        else:
+            predicate["conditions"] = [] if emf else [{"attribute": name, "op": "=", "ref": name} for name in group_attributes]
+            for condition_attribute, op, operand in conditions[group_var]:
+                if operand[0] == "value":
+                    predicate["conditions"].append({"attribute": condition_attribute, "op": op, "value": operand[1]})
+                elif operand[0] == "ref":
+                    if operand[1] not in group_attributes:
+                        raise ValueError(f"{operand[1]} in the condition of {group_var} is not a grouping attribute")
+                    predicate["conditions"].append({"attribute": condition_attribute, "op": op, "ref": operand[1]})
+                else:
+                    predicate["conditions"].append({"attribute": condition_attribute, "op": op, "ref": f"{operand[2]}_{operand[1]}_{operand[3]}"})
+        phi["PRED-LIST"][f"var{len(phi['F-VECT'])}"] = predicate
+    return phi
+
+# ************************* Normalize Query Text **************************
+def normalize(text):
+    """
+        This function normalizes the text of a query so that the same query written with different whitespace, keyword case or a
+        trailing semicolon is parsed once. String constants are kept as written.
+        Parameters:
+            text of the query
+        Output:
+            The normalized text
+    """
+    parts = []
+    for kind, value in tokenize(text):
+        if kind == "string":
+            parts.append("'" + value.replace("'", "''") + "'")
+        elif kind == "word" and value.lower() in ["select", "from", "group", "by", "such", "that", "and"]:
+            parts.append(value.lower())
+        elif (kind, value) != ("symbol", ";"):
+            parts.append(str(value))
+    return " ".join(parts)
+
+# ************************* Get Query **************************
+def get_query(text, schema=sales_table_schema):
+    """
+        This function returns the Phi Arguments of a query, parsing it only the first time the query is seen. The planner decisions
+        are cheap and made by the processors on every run, and the compiled scan functions are cached by codegen.compile_phi.
+        Parameters:
+            text of the query
+            schema of the Sales table
+        Output:
+            The Phi Arguments of the query, shared by every caller, which must not change them
+    """
+    key = (normalize(text), json.dumps(schema, sort_keys=True))
+    with query_cache_lock:
+        if key in query_cache:
+            query_cache.move_to_end(key)
+            return query_cache[key]
+    phi = parse_phi(text, schema)
+    with query_cache_lock:
+        query_cache[key] = phi
+        while len(query_cache) > query_cache_size:
+            query_cache.popitem(last=False)
+    return phi
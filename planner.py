@@ -0,0 +1,207 @@
+"""
+Description:
+    The planner file inspects the Phi Arguments of a query before it is evaluated and decides how the query processors
+    should scan the Sales table.
+"""
+
+import json
+import operator
+from sketches import is_sketch
+
+distributive_aggregates = ["sum", "count", "min", "max", "avg"] #Aggregates that can be updated one row at a time
+comparisons = {"=": operator.eq, "<>": operator.ne, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge} #Operators of the conditions of EMF grouping variables
+
+# ************************* Single Pass Eligibility **************************
+def single_pass_eligible(phi, columns):
+    """
+        This function checks whether a query can be evaluated in a single table scan. The first table scan of the MF algorithm only
+        discovers the distinct values of the grouping attributes, so when every aggregate can be updated one row at a time and every
+        such that condition only references the current row, the group can instead be added to the mf_table the first time it is seen
+        and its aggregates updated in the same scan.
+        Parameters:
+            Phi Arguments of the query as a nested dictionary
+            columns of the Sales table
+        Output:
+            True if the query can be evaluated in one table scan, False otherwise
+    """
+    for agg in phi["F-VECT"]:
+        # Sketches are updated one row at a time as well (see sketches.py)
+        if agg["agg"] not in distributive_aggregates and not is_sketch(agg["agg"]):
+            return False
+    for predicate in phi["PRED-LIST"].values():
+        if "attribute" not in predicate or "value" not in predicate:
+            return False
+        if predicate["attribute"] not in columns:
+            return False
+    return True
+
+# ************************* Aggregated Attribute **************************
+def aggregated_attribute(agg):
+    """
+        This function returns the attribute an aggregate of the F-VECT is computed over: the "attribute" of its entry, which only
+        count_distinct reads (see sketches.py), and quant otherwise.
+        Parameters:
+            aggregate of the F-VECT
+        Output:
+            The name of the attribute
+    """
+    return agg.get("attribute", "quant")
+
+# ************************* Grouping Variables **************************
+def grouping_variables(phi):
+    """
+        This function groups the aggregates of the F-VECT by the grouping variable whose such that condition defines them, so the
+        condition of every grouping variable is evaluated once per row and all of its aggregates are updated together.
+        The such that condition of the n-th aggregate of the F-VECT is the entry var<n> of the PRED-LIST.
+        Parameters:
+            Phi Arguments of the query
+        Output:
+            List of grouping variables in order of first appearance in the F-VECT, each one a dictionary with the name of the
+            grouping variable, the attribute and value of its such that condition and the list of its aggregates
+    """
+    variables = {}
+    for n in range(len(phi["F-VECT"])):
+        agg = phi["F-VECT"][n]
+        predicate = phi["PRED-LIST"][f"var{n + 1}"]
+        key = (predicate["group_var"], predicate["attribute"], predicate["value"])
+        if key not in variables:
+            variables[key] = {
+                "group_var": predicate["group_var"],
+                "attribute": predicate["attribute"],
+                "value": predicate["value"],
+                "aggregates": []
+            }
+        variables[key]["aggregates"].append(agg)
+    return list(variables.values())
+
+# ************************* Fetch Plan **************************
+def fetch_plan(phi, columns, shared_scan):
+    """
+        This function derives narrower select statements for the table scans of a query, pushing the such that conditions of the
+        grouping variables down into the database. Columns that are not used by the query are selected as null, so the rows keep
+        the layout of the Sales table while fewer bytes are transferred.
+        The rows used to calculate the aggregates only need to satisfy the condition of some grouping variable, but the groups of
+        the mf_table are the distinct values of the grouping attributes over all of the rows. So the groups are read by a separate
+        statement selecting only the grouping attributes, and when the groups have to be discovered in the same scan as the
+        aggregates (shared_scan) the plan falls back to a full scan of the needed columns.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+            True if the groups are discovered by the same scan that calculates the aggregates
+        Output:
+            Dictionary with the statement of the group scan ("group_query", None when there is no separate group scan) and the
+            statement and parameters of the aggregate scan ("scan_query" and "params")
+    """
+    group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+    variables = grouping_variables(phi)
+    needed = group_attributes + [variable["attribute"] for variable in variables] + [aggregated_attribute(agg) for agg in phi["F-VECT"]] + ["quant"]
+    projection = ", ".join(column if column in needed else f"null as {column}" for column in columns)
+
+    if shared_scan or len(variables) == 0:
+        return {"group_query": None, "scan_query": f"select {projection} from sales;", "params": None}
+
+    # Disjunction of the such that conditions, one IN list per attribute
+    values = {}
+    for variable in variables:
+        if variable["value"] not in values.setdefault(variable["attribute"], []):
+            values[variable["attribute"]].append(variable["value"])
+    conditions = []
+    params = []
+    for attribute, attribute_values in values.items():
+        conditions.append(f"{attribute} in ({', '.join(['%s'] * len(attribute_values))})")
+        params.extend(attribute_values)
+
+    group_projection = ", ".join(column if column in group_attributes else f"null as {column}" for column in columns)
+    return {
+        "group_query": f"select {group_projection} from sales;",
+        "scan_query": f"select {projection} from sales where {' or '.join(conditions)};",
+        "params": params
+    }
+
+# ************************* EMF Conditions **************************
+def has_conditions(phi):
+    """
+        This function checks whether a query is an EMF query, whose such that conditions are given as a "conditions" list in its
+        PRED-LIST entries instead of a single attribute and value.
+        Parameters:
+            Phi Arguments of the query
+        Output:
+            True if any grouping variable of the query has a conditions list
+    """
+    return any("conditions" in predicate for predicate in phi["PRED-LIST"].values())
+
+def emf_variables(phi, columns):
+    """
+        This function lists the grouping variables of an EMF query with their conditions and the grouping variables they depend on.
+        A condition compares an attribute of the current row with a constant ({"attribute": "state", "op": "=", "value": "NY"}),
+        with a grouping attribute of the MF row ({"attribute": "cust", "op": "=", "ref": "cust"}) or with an aggregate of another
+        grouping variable of the MF row ({"attribute": "quant", "op": ">", "ref": "avg_X_quant"}), which the grouping variable then
+        depends on. The entries of the PRED-LIST with an attribute and a value keep their MF meaning: the row belongs to the group
+        of the MF row, and its attribute equals the value.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+        Output:
+            List of grouping variables in order of first appearance in the F-VECT, each one a dictionary with the name of the
+            grouping variable, its list of conditions, its list of aggregates and the set of aggregates it references ("depends")
+    """
+    group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+    aggregates = [agg["name"] for agg in phi["F-VECT"]]
+    variables = {}
+    for n in range(len(phi["F-VECT"])):
+        agg = phi["F-VECT"][n]
+        predicate = phi["PRED-LIST"][f"var{n + 1}"]
+        if "conditions" in predicate:
+            conditions = predicate["conditions"]
+        else:
+            conditions = [{"attribute": attribute, "op": "=", "ref": attribute} for attribute in group_attributes]
+            conditions.append({"attribute": predicate["attribute"], "op": "=", "value": predicate["value"]})
+
+        for condition in conditions:
+            if condition["attribute"] not in columns:
+                raise ValueError(f"Unknown attribute {condition['attribute']} in a condition of {predicate['group_var']}")
+            if condition["op"] not in comparisons:
+                raise ValueError(f"Unknown operator {condition['op']} in a condition of {predicate['group_var']}")
+            if ("value" in condition) == ("ref" in condition):
+                raise ValueError(f"Every condition of {predicate['group_var']} compares with either a value or a ref")
+            if "ref" in condition and condition["ref"] not in group_attributes and condition["ref"] not in aggregates:
+                raise ValueError(f"{condition['ref']} referenced by {predicate['group_var']} is neither a grouping attribute nor an aggregate")
+
+        key = (predicate["group_var"], json.dumps(conditions, sort_keys=True, default=str))
+        if key not in variables:
+            variables[key] = {
+                "group_var": predicate["group_var"],
+                "conditions": conditions,
+                "aggregates": [],
+                "depends": set(condition["ref"] for condition in conditions if condition.get("ref") in aggregates)
+            }
+        variables[key]["aggregates"].append(agg)
+    return list(variables.values())
+
+# ************************* EMF Scan Levels **************************
+def scan_levels(variables):
+    """
+        This function assigns the grouping variables of an EMF query to table scans. A grouping variable is computed in the first
+        scan after the scans of every aggregate it references, so grouping variables that do not depend on each other share a scan
+        and the query takes as many scans as the longest chain of references.
+        Parameters:
+            grouping variables of the query (see emf_variables)
+        Output:
+            List of table scans, each one the list of grouping variables it computes
+    """
+    scans = {} #aggregate name -> table scan computing it
+    levels = []
+    remaining = list(variables)
+    while remaining:
+        ready = [variable for variable in remaining if all(agg_name in scans for agg_name in variable["depends"])]
+        if not ready:
+            raise ValueError(f"The conditions of grouping variables {', '.join(variable['group_var'] for variable in remaining)} reference each other's aggregates")
+        for variable in ready:
+            level = max([scans[agg_name] + 1 for agg_name in variable["depends"]], default=0)
+            while len(levels) <= level:
+                levels.append([])
+            levels[level].append(variable)
+            for agg in variable["aggregates"]:
+                scans[agg["name"]] = level
+        remaining = [variable for variable in remaining if all(variable is not other for other in ready)]
+    return levels
@@ -0,0 +1,644 @@
+"""
+Description:
+    The processor file is the importable form of the MF query processor. A QueryProcessor is built from the Phi Arguments of a
+    query (or its textual form) and a source of Sales rows, and owns everything a run needs: the MF structure, the mf_table, its
+    hash index and the statistics of the run. Nothing is read from the database when the file is imported or the processor is
+    built, so one long-lived process can load the Sales table once and answer many queries against it, in sequence or from
+    several threads with one processor per query:
+
+        sales = fetch_table_rows(connection_params)
+        for phi in [esql_a, esql_b]:
+            print(QueryProcessor(phi, sales).run_table())
+
+    queryProcessorMF.py and queryProcessorEMF.py are the command line front ends of this class.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from loader import sales_table_columns, partition_methods, fetch_table_rows, SalesStream, PartitionedSales
+from planner import single_pass_eligible, grouping_variables, fetch_plan, has_conditions, emf_variables, scan_levels, comparisons, aggregated_attribute
+from sketches import is_sketch, new_sketch, finish_sketches, sketch_options
+from codegen import compile_phi
+from parallel import run_parallel
+from cache import result_cache, result_key, canonical_query, table_version
+from mf_record import mf_fields, record_type
+from phi_parser import get_query
+from incremental import state_path, load_state, save_state, current_watermark, new_rows_query, skip_counted
+from profiling import RunStats
+from multiquery import grouping_key, merge_queries, split_table
+from spill import spilled_scan
+from sortgroup import sorted_query, external_sort, sorted_scan
+
+engines = ["compiled", "interpreted", "numpy"] #Execution engines of the aggregate scan
+
+# ************************* Get Indeces of Grouping Attributes **************************
+def get_indeces(attribute, columns=sales_table_columns):
+    """
+        This function gets the index of an attribute in the rows of the Sales table, which the database returns as tuples.
+        Parameters:
+            attribute
+            columns of the Sales table
+        Output:
+            the index of the attribute
+    """
+    index = 0
+    for column in columns:
+        if(attribute == column):
+            return index
+        else:
+            index += 1
+
+# ************************* Query Processor **************************
+class QueryProcessor:
+    """
+        Evaluates one query with the MF algorithm. The source is either the rows of the Sales table (a list of tuples, a SalesDataset,
+        a SalesStream or a PartitionedSales, which are read again on every run) or None to read the table from the database on
+        every run.
+        The options are the modes of the command line processors: the execution engine and its number of worker processes, the
+        way the table is read (streaming, fetch_partitions and partition_method, pushdown), the incremental and result cache modes, which need the
+        database and therefore no source, and max_groups, which bounds the groups held in memory by spilling them to disk
+        (see spill.py, the partitions are always scanned by the compiled engine), or sort_groups, which evaluates the query one group
+        at a time over the table sorted by the grouping attributes (see sortgroup.py, also with the compiled engine).
+        A processor can be run many times, every run starting from an empty mf_table; different processors share nothing but the
+        source and the caches of compiled scans and results, and can run concurrently.
+    """
+    conditions_supported = False #Whether queries with EMF conditions (see planner.emf_variables) can be evaluated
+
+    def __init__(self, phi, source=None, connection_params=None, engine="compiled", workers=1, streaming=False, stream_itersize=2000,
+                 stream_cache=False, fetch_partitions=1, fetch_connections=4, partition_method="ctid", pushdown=False, incremental=False,
+                 incremental_dir=".mf_state", watermark_column="date", cache_results=False, max_groups=None, spill_dir=None, sort_groups=False,
+                 stats=None):
+        if engine not in engines:
+            raise ValueError(f"Unknown engine {engine}, expected one of {', '.join(engines)}")
+        if source is not None and (pushdown or incremental or cache_results):
+            raise ValueError("The pushdown, incremental and result cache modes read the Sales table from the database and cannot be used with a source")
+        if max_groups is not None and (pushdown or incremental or cache_results):
+            raise ValueError("Spilling to disk cannot be combined with the pushdown, incremental or result cache modes")
+        if sort_groups and (pushdown or incremental or max_groups is not None):
+            raise ValueError("The sorted evaluation cannot be combined with the pushdown, incremental or spilling modes")
+        if partition_method not in partition_methods:
+            raise ValueError(f"Unknown partition method {partition_method}, expected one of {', '.join(partition_methods)}")
+        if source is None and connection_params is None:
+            raise ValueError("Either a source of Sales rows or the connection parameters of the database are needed")
+
+        # The textual form of a query is parsed once per distinct text, see phi_parser.get_query
+        self.phi = get_query(phi) if isinstance(phi, str) else phi
+        if has_conditions(self.phi) and not self.conditions_supported:
+            raise ValueError("The query has EMF conditions, which are evaluated by the EMFQueryProcessor")
+        for agg in self.phi["F-VECT"]:
+            if is_sketch(agg["agg"]):
+                sketch_options(agg) # Invalid sketch options are reported before any row is read
+        self.source = source
+        self.connection_params = connection_params
+        self.engine = engine
+        self.workers = workers
+        self.streaming = streaming
+        self.stream_itersize = stream_itersize
+        self.stream_cache = stream_cache
+        self.fetch_partitions = fetch_partitions
+        self.fetch_connections = fetch_connections
+        self.partition_method = partition_method
+        self.pushdown = pushdown
+        self.incremental = incremental
+        self.incremental_dir = incremental_dir
+        self.watermark_column = watermark_column
+        self.cache_results = cache_results
+        self.max_groups = max_groups
+        self.spill_dir = spill_dir
+        self.sort_groups = sort_groups
+        self.stats = stats if stats is not None else RunStats()
+
+        self.mf_struct_header = [obj["name"] for column, obj in self.phi["V"].items()] + [agg["name"] for agg in self.phi["F-VECT"]]
+        self.mf_record = record_type(mf_fields(self.phi)) #Compact record type of the rows of the mf_table
+        self.indeces = [get_indeces(obj["name"]) for column, obj in self.phi["V"].items()]
+        self.quant_index = get_indeces("quant")
+        self.mf_table = [] #Result of the last run
+        self.mf_index = {} #Hash index over mf_table: tuple of grouping attribute values -> position in mf_table
+
+    # ************************* MF Structure **************************
+    def mf_structure(self):
+        """
+            This function writes out the MF Structure of the query
+            Output:
+                The MF structure as text
+        """
+        lines = ["struct {"]
+        for column, obj in self.phi["V"].items():
+            lines.append(f"       {obj['type']}    {obj['name']} [{obj['size']}];")
+        for agg in self.phi["F-VECT"]:
+            lines.append(f"       int    {agg['name']};")
+        lines.append("} mf_struct [500]")
+        return "\n".join(lines)
+
+    # ************************* Retrieve Table Rows **************************
+    def retrieve_rows(self, query="select * from sales;", params=None):
+        """
+            This function retrieves the rows of a select statement over the Sales table, either all at once or as a stream that is
+            re-read on every table scan. When the table is partitioned, the partitions are read concurrently, and when streaming
+            they are handed to the scans one at a time.
+            Parameters:
+                select statement and its parameters
+            Output:
+                The rows as a list of tuples, a SalesStream or a PartitionedSales
+        """
+        if self.fetch_partitions > 1:
+            # Hash partitions split the table on the grouping attributes of the query, so every group is read by a single partition
+            partitioned = PartitionedSales(self.connection_params, query, params=params, partitions=self.fetch_partitions,
+                                           connections=self.fetch_connections, method=self.partition_method,
+                                           attributes=[obj["name"] for column, obj in self.phi["V"].items()])
+            if self.streaming:
+                return partitioned
+            table_rows = list(partitioned)
+            partitioned.close()
+            return table_rows
+        elif self.streaming:
+            return SalesStream(self.connection_params, query, params=params, itersize=self.stream_itersize)
+        else:
+            return fetch_table_rows(self.connection_params, query, params)
+
+    # ************************* Retrieve Sorted Rows **************************
+    def sorted_rows(self):
+        """
+            This function retrieves the rows of the Sales table sorted by the grouping attributes: the rows of the source through an
+            external sort, and otherwise a stream of the table sorted by the database, which is never held in memory.
+            Output:
+                The sorted rows, as a generator or a SalesStream
+        """
+        if self.source is not None:
+            return external_sort(self.source, self.indeces, self.spill_dir)
+        return SalesStream(self.connection_params, sorted_query(self.phi, sales_table_columns), itersize=self.stream_itersize)
+
+    # ************************* Lookup Current Row against MF Struct **************************
+    def lookup(self, row):
+        """
+            This function looks up the current row in the mf_table. The grouping attribute values of the row are used as the key of
+            the mf_index hash index, which returns the position of the group in constant time.
+            Parameters:
+                current row as "row"
+            Output:
+                A positive value and the position of the group in the mf_table if a match is found
+                A negative value is no match was found
+        """
+        self.stats.lookups += 1
+        mf_row = self.mf_index.get(tuple(row[index] for index in self.indeces), -1)
+        if(mf_row == -1):
+            return [-1, -1]
+        else:
+            return [len(self.indeces), mf_row]
+
+    # ************************* Add Current Row **************************
+    def add_row(self, row):
+        """
+            This function adds a row to the mf_table and registers its grouping attribute values in the mf_index
+            Parameters:
+                Current row of the underlying table as "row"
+        """
+        header_index = 0
+        new_row = self.mf_record()
+        for index in self.indeces:
+            new_row[self.mf_struct_header[header_index]] = row[index]
+            header_index += 1
+        self.mf_table.append(new_row)
+        self.mf_index[tuple(row[index] for index in self.indeces)] = len(self.mf_table) - 1
+
+    # ************************* Restore MF Table **************************
+    def restore_table(self, rows):
+        """
+            This function fills the mf_table with the rows of a previously computed mf_table and registers their groups in the mf_index
+            Parameters:
+                rows of the previously computed mf_table
+        """
+        for row in rows:
+            self.mf_index[tuple(row[header] for header in self.mf_struct_header[:len(self.indeces)])] = len(self.mf_table)
+            self.mf_table.append(row)
+
+    # ************************* Update Aggregates **************************
+    def update_aggregates(self, variables, row, pos):
+        """
+            This function updates the aggregates of a group of the mf_table with the current row. The such that condition of every
+            grouping variable is evaluated once, and all of the aggregates of the grouping variable are updated when it holds.
+            Parameters:
+                Grouping variables of the query (see planner.grouping_variables)
+                Current row of the underlying table as "row"
+                Position of the group of the current row in the mf_table
+        """
+        mf_row = self.mf_table[pos]
+        for variable in variables:
+            attr_index = get_indeces(variable["attribute"])
+            if row[attr_index] != variable["value"]:
+                continue
+
+            for agg in variable["aggregates"]:
+                self.update_aggregate(mf_row, agg, row[get_indeces(aggregated_attribute(agg))])
+
+    def update_aggregate(self, mf_row, agg, value):
+        """
+            This function updates one aggregate of an MF row with a value.
+            Parameters:
+                MF row that is updated
+                aggregate of the F-VECT
+                aggregated value of the current row
+        """
+        agg_name = agg["name"]
+        agg_type = agg["agg"]
+        current_value = mf_row.get(agg_name, None)
+        if is_sketch(agg_type):
+            # The value of a sketch aggregate is set from its sketch once the scan is finished, see sketches.finish_sketches
+            sketch_key = f"{agg_name}_sketch"
+            if sketch_key not in mf_row:
+                mf_row[sketch_key] = new_sketch(agg)
+            mf_row[sketch_key].add(value)
+        elif agg_type == "sum":
+            mf_row[agg_name] = value if current_value is None else current_value + value
+        elif agg_type == "max":
+            mf_row[agg_name] = value if current_value is None else max(current_value, value)
+        elif agg_type == "min":
+            mf_row[agg_name] = value if current_value is None else min(current_value, value)
+        elif agg_type == "count":
+            mf_row[agg_name] = 1 if current_value is None else current_value + 1
+        elif agg_type == "avg":
+            sum_key = f"{agg_name}_sum"
+            count_key = f"{agg_name}_count"
+            mf_row[sum_key] = mf_row.get(sum_key, 0) + value
+            mf_row[count_key] = mf_row.get(count_key, 0) + 1
+            mf_row[agg_name] = mf_row[sum_key] / mf_row[count_key]
+
+    # ************************* Aggregate Table Scan **************************
+    def scan_aggregates(self, scan_rows, single_pass):
+        """
+            This function runs the table scan that calculates the aggregates of the mf_table with the selected engine
+            Parameters:
+                rows of the Sales table
+                True to add each group to the mf_table on first sight, False when the first table scan already populated the mf_table
+        """
+        stats = self.stats
+        if self.engine == "compiled" and self.workers > 1:
+            # Parallel Aggregate Table Scan: Every worker builds a partial mf_table for a partition of the rows, merged in table order
+            # Only lists and datasets are counted, streams are handed to the workers in batches
+            run_parallel(self.phi, sales_table_columns, stats.count_rows(scan_rows) if hasattr(scan_rows, "__len__") else scan_rows,
+                         self.mf_table, self.mf_index, single_pass, self.workers)
+        elif self.engine == "compiled":
+            # Aggregate Table Scan through the function generated for the query, adding groups on first sight in single pass mode
+            phi_scan = compile_phi(self.phi, sales_table_columns)
+            rows_before = stats.rows
+            phi_scan(stats.count_rows(scan_rows), self.mf_table, self.mf_index, single_pass)
+            stats.lookups += stats.rows - rows_before # The generated function probes the mf_index once per row
+        elif single_pass:
+            variables = grouping_variables(self.phi)
+
+            # Single Table Scan: Add each group on first sight and calculate its aggregates in the same scan
+            for row in stats.count_rows(scan_rows):
+                match = self.lookup(row)
+                if match[0] == -1:
+                    self.add_row(row)
+                    match = self.lookup(row)
+                self.update_aggregates(variables, row, match[1])
+        else:
+            variables = grouping_variables(self.phi)
+
+            # Second Table Scan: Calculate aggregates within one table scan
+            for row in stats.count_rows(scan_rows):
+                match = self.lookup(row)
+                if match[0] > -1:
+                    self.update_aggregates(variables, row, match[1])
+
+    # ************************* Incremental Evaluation **************************
+    def run_incremental(self):
+        """
+            This function evaluates the query incrementally. The mf_table stored by the previous run is loaded, and only the rows
+            appended since then are scanned, updating the aggregates of the existing groups and adding the new groups on first sight.
+            The rows at the previous watermark are read again, and the ones the previous run counted are skipped.
+        """
+        if not single_pass_eligible(self.phi, sales_table_columns):
+            raise ValueError("Only queries that can be evaluated in a single table scan can be evaluated incrementally")
+
+        path = state_path(self.phi, sales_table_columns, self.incremental_dir, self.watermark_column)
+        state = load_state(path)
+        previous_watermark = None
+        boundary_rows = []
+        if state is not None:
+            previous_watermark = state["watermark"]
+            boundary_rows = state["boundary_rows"]
+            self.restore_table(state["mf_table"])
+
+        watermark = current_watermark(self.connection_params, self.watermark_column)
+        new_boundary_rows = []
+        if watermark is not None:
+            new_rows = self.retrieve_rows(*new_rows_query(self.watermark_column, previous_watermark, watermark))
+            self.scan_aggregates(skip_counted(new_rows, get_indeces(self.watermark_column), previous_watermark, boundary_rows, watermark,
+                                              new_boundary_rows), True)
+
+        save_state(path, {"watermark": watermark, "watermark_column": self.watermark_column, "boundary_rows": new_boundary_rows,
+                          "mf_table": self.mf_table})
+
+    # ************************* Evaluate Query **************************
+    def evaluate(self):
+        """
+            This function fills the mf_table with the result of the query, choosing the table scans from the selected modes
+        """
+        stats = self.stats
+        if self.sort_groups:
+            # Sorted Evaluation: Read the table sorted by the grouping attributes and compute the aggregates one group at a time
+            with stats.phase("sorted scan", self.mf_table):
+                for mf_row in sorted_scan(self.phi, sales_table_columns, stats.count_rows(self.sorted_rows())):
+                    self.mf_index[tuple(mf_row[header] for header in self.mf_struct_header[:len(self.indeces)])] = len(self.mf_table)
+                    self.mf_table.append(mf_row)
+            return
+
+        if self.incremental:
+            # Incremental Evaluation: Update the mf_table of the previous run with the rows appended since then
+            with stats.phase("incremental scan", self.mf_table):
+                self.run_incremental()
+            return
+
+        single_pass = single_pass_eligible(self.phi, sales_table_columns)
+        with stats.phase("fetch"):
+            if self.pushdown:
+                # Push the such that conditions down into the database. The groups are read by a narrow scan of the grouping
+                # attributes, unless the engine discovers them in the same scan as the aggregates, which then has to read every row.
+                plan = fetch_plan(self.phi, sales_table_columns, self.engine == "numpy")
+                scan_rows = self.retrieve_rows(plan["scan_query"], plan["params"])
+                if plan["group_query"] is None:
+                    group_rows = scan_rows
+                else:
+                    group_rows = self.retrieve_rows(plan["group_query"])
+                    single_pass = False
+            else:
+                scan_rows = self.source if self.source is not None else self.retrieve_rows()
+                group_rows = scan_rows
+            if isinstance(scan_rows, list) and self.source is None:
+                stats.rows = len(scan_rows)
+
+        if self.max_groups is not None:
+            # Spilled Evaluation: Hash-partition the groups into spill files when there are more than max_groups of them
+            with stats.phase("spilled scan", self.mf_table):
+                self.mf_table.extend(spilled_scan(self.phi, sales_table_columns, scan_rows, self.max_groups, self.spill_dir))
+            return
+
+        if self.engine == "numpy":
+            # Columnar Evaluation: Factorize the grouping attributes and compute every aggregate with grouped reductions
+            from columnar import run_columnar # NumPy is only needed by this engine
+            with stats.phase("scan 1+2", self.mf_table):
+                columnar_table, columnar_index = run_columnar(self.phi, stats.count_rows(scan_rows), sales_table_columns)
+                self.mf_table.extend(columnar_table)
+                self.mf_index.update(columnar_index)
+            return
+
+        if not single_pass:
+            # First Table Scan: Populate the mf_table with distinct values of grouping attributes
+            with stats.phase("scan 1", self.mf_table):
+                for row in stats.count_rows(group_rows):
+                    match = self.lookup(row)
+                    if match[0] == -1:
+                        self.add_row(row)
+
+        with stats.phase("scan 1+2" if single_pass else "scan 2", self.mf_table):
+            self.scan_aggregates(scan_rows, single_pass)
+
+    # ************************* Run Query **************************
+    def run(self):
+        """
+            This function evaluates the query, answering it from the result cache when neither the query nor the Sales table changed
+            since it was computed. The whole mf_table is held in memory even with max_groups or sort_groups, which only bound the
+            memory of the evaluation: results that do not fit in memory are read with stream() instead.
+            Output:
+                The mf_table, a list of MF rows
+        """
+        self.mf_table = []
+        self.mf_index = {}
+        self.stats.reset()
+
+        if self.cache_results:
+            key = result_key(canonical_query(self.phi), table_version(self.connection_params))
+            with self.stats.phase("cache", self.mf_table):
+                cached_table = result_cache.get(key)
+                if cached_table is not None:
+                    self.restore_table(cached_table)
+            if cached_table is not None:
+                return self.mf_table
+
+        self.evaluate()
+        finish_sketches(self.phi["F-VECT"], self.mf_table)
+        if self.cache_results:
+            result_cache.put(key, list(self.mf_table))
+        return self.mf_table
+
+    # ************************* Stream Query **************************
+    def stream(self):
+        """
+            This function evaluates the query and yields its MF rows one at a time. With max_groups, the rows are merged from the
+            spill files as they are yielded, and with sort_groups every group is yielded as soon as its last row is read, so the
+            mf_table is never held in memory; any other query is run first.
+            Output:
+                The MF rows, as a generator
+        """
+        if self.max_groups is None and not self.sort_groups:
+            yield from self.run()
+            return
+
+        self.mf_table = []
+        self.mf_index = {}
+        self.stats.reset()
+        if self.sort_groups:
+            with self.stats.phase("sorted scan"):
+                yield from sorted_scan(self.phi, sales_table_columns, self.stats.count_rows(self.sorted_rows()))
+            return
+
+        with self.stats.phase("fetch"):
+            scan_rows = self.source if self.source is not None else self.retrieve_rows()
+        with self.stats.phase("spilled scan"):
+            yield from spilled_scan(self.phi, sales_table_columns, scan_rows, self.max_groups, self.spill_dir)
+
+    # ************************* Result Rows **************************
+    def result_rows(self):
+        """
+            This function lists the rows of the mf_table in the order of the headers, with 'NULL' for the aggregates of groups that
+            no row of their grouping variable satisfied
+            Output:
+                List of lists of values
+        """
+        return [[row[header] if header in row else 'NULL' for header in self.mf_struct_header] for row in self.mf_table]
+
+    def run_table(self):
+        """
+            This function runs the query and renders the mf_table as a grid
+            Output:
+                The grid as text
+        """
+        self.run()
+        with self.stats.phase("output", self.mf_table):
+            return tabulate(self.result_rows(), headers=self.mf_struct_header, tablefmt="grid")
+
+# ************************* EMF Query Processor **************************
+class EMFQueryProcessor(QueryProcessor):
+    """
+        Evaluates EMF queries, whose grouping variables have conditions comparing the current row with constants, with the grouping
+        attributes of the MF row and with the aggregates of other grouping variables of the MF row (see planner.emf_variables).
+        After the first table scan populates the mf_table, the grouping variables are computed by as few table scans as their
+        references allow (see planner.scan_levels). Within a scan, the MF rows matching a row are found through a secondary index
+        on the grouping attributes its conditions compare for equality, and only those MF rows are tested against the remaining
+        conditions. With streaming and stream_cache, the first scan keeps the columns read by the following scans, which replay them
+        instead of reading the stream again. Queries without conditions are evaluated like MF queries.
+    """
+    conditions_supported = True
+
+    def __init__(self, phi, source=None, *args, **options):
+        super().__init__(phi, source, *args, **options)
+        if has_conditions(self.phi) and (self.pushdown or self.incremental or self.max_groups is not None or self.sort_groups):
+            raise ValueError("Queries with EMF conditions cannot be evaluated in the pushdown, incremental, spilling or sorted modes")
+
+    # ************************* Condition Plan **************************
+    def condition_plan(self, variable, secondary_indexes):
+        """
+            This function prepares the conditions of a grouping variable for a table scan.
+            Parameters:
+                grouping variable (see planner.emf_variables)
+                secondary indexes of the scan, grouping attributes -> index, shared by the grouping variables of the scan
+            Output:
+                Dictionary with the tests of the row alone ("row_tests"), the indeces of the row attributes looked up in the
+                secondary index ("key_indeces"), the secondary index ("index", None when every MF row is a candidate) and the
+                tests against the candidate MF rows ("group_tests")
+        """
+        group_attributes = self.mf_struct_header[:len(self.indeces)]
+        row_tests = []
+        key_attributes = []
+        key_indeces = []
+        group_tests = []
+        for condition in variable["conditions"]:
+            attr_index = get_indeces(condition["attribute"])
+            compare = comparisons[condition["op"]]
+            if "value" in condition:
+                row_tests.append((attr_index, compare, condition["value"]))
+            elif condition["op"] == "=" and condition["ref"] in group_attributes and condition["ref"] not in key_attributes:
+                key_attributes.append(condition["ref"])
+                key_indeces.append(attr_index)
+            else:
+                group_tests.append((attr_index, compare, condition["ref"]))
+
+        index = None
+        if key_attributes:
+            key = tuple(key_attributes)
+            if key not in secondary_indexes:
+                secondary_indexes[key] = {}
+                for pos, mf_row in enumerate(self.mf_table):
+                    group_key = tuple(mf_row[attribute] for attribute in key)
+                    # Groups with a NULL grouping attribute are left out, since NULL satisfies no comparison (see scan_conditions)
+                    if None not in group_key:
+                        secondary_indexes[key].setdefault(group_key, []).append(pos)
+            index = secondary_indexes[key]
+        return {"row_tests": row_tests, "key_indeces": key_indeces, "index": index, "group_tests": group_tests}
+
+    # ************************* Conditions Table Scan **************************
+    def scan_conditions(self, variables, scan_rows):
+        """
+            This function runs a table scan computing the aggregates of grouping variables with conditions
+            Parameters:
+                grouping variables computed by the scan
+                rows of the Sales table
+        """
+        secondary_indexes = {}
+        plans = [(variable["aggregates"], self.condition_plan(variable, secondary_indexes)) for variable in variables]
+        all_groups = range(len(self.mf_table))
+        for row in self.stats.count_rows(scan_rows):
+            for aggregates, plan in plans:
+                # NULL values of the row satisfy no comparison, like in SQL
+                if not all(row[attr_index] is not None and compare(row[attr_index], value) for attr_index, compare, value in plan["row_tests"]):
+                    continue
+                if plan["index"] is None:
+                    candidates = all_groups
+                else:
+                    self.stats.lookups += 1
+                    # A row with a NULL looked up attribute matches no group, like the group_tests below
+                    candidates = plan["index"].get(tuple(row[index] for index in plan["key_indeces"]), ())
+                for pos in candidates:
+                    mf_row = self.mf_table[pos]
+                    # A reference to an aggregate the MF row does not have or to a NULL grouping attribute satisfies no comparison
+                    if all(row[attr_index] is not None and mf_row.get(ref) is not None and compare(row[attr_index], mf_row[ref])
+                           for attr_index, compare, ref in plan["group_tests"]):
+                        for agg in aggregates:
+                            self.update_aggregate(mf_row, agg, row[get_indeces(aggregated_attribute(agg))])
+
+    # ************************* Evaluate Query **************************
+    def evaluate(self):
+        """
+            This function fills the mf_table with the result of the query: the first table scan populates the mf_table with the
+            distinct values of the grouping attributes, and every following scan computes the grouping variables of one level
+        """
+        if not has_conditions(self.phi):
+            super().evaluate()
+            return
+
+        stats = self.stats
+        variables = emf_variables(self.phi, sales_table_columns)
+        with stats.phase("fetch"):
+            scan_rows = self.source if self.source is not None else self.retrieve_rows()
+            if isinstance(scan_rows, list) and self.source is None:
+                stats.rows = len(scan_rows)
+
+        if isinstance(scan_rows, SalesStream) and self.stream_cache:
+            # Keep the columns the condition scans read during the first scan, instead of reading the stream again for every level
+            condition_indeces = [get_indeces(condition["attribute"]) for variable in variables for condition in variable["conditions"]]
+            aggregate_indeces = [get_indeces(aggregated_attribute(agg)) for agg in self.phi["F-VECT"]]
+            scan_rows.cache(self.indeces + condition_indeces + aggregate_indeces + [self.quant_index])
+
+        # First Table Scan: Populate the mf_table with distinct values of grouping attributes
+        with stats.phase("scan 1", self.mf_table):
+            for row in stats.count_rows(scan_rows):
+                match = self.lookup(row)
+                if match[0] == -1:
+                    self.add_row(row)
+
+        for level, level_variables in enumerate(scan_levels(variables)):
+            with stats.phase(f"scan {level + 2}", self.mf_table):
+                self.scan_conditions(level_variables, scan_rows)
+                # The sketch aggregates of the level are referenced by the conditions of the following levels
+                finish_sketches([agg for variable in level_variables for agg in variable["aggregates"]], self.mf_table)
+
+# ************************* Run Batch **************************
+def run_batch(queries, source, concurrency=1, shared_scan=False, **options):
+    """
+        This function evaluates a list of queries against one load of the Sales table. With a SalesDataset as the source and the
+        numpy engine, queries grouping by the same attributes share the group ids of one scan of the grouping attributes, and
+        queries with the same such that condition share its row mask (see dataset.py). With shared_scan, queries grouping by the
+        same attributes are merged into one combined query, evaluated in one scan by any engine and split again (see multiquery.py).
+        Queries with EMF conditions are evaluated by an EMFQueryProcessor on their own.
+        Parameters:
+            list of queries, as Phi Arguments or in their textual form
+            source of the Sales rows shared by the queries, usually a SalesDataset
+            number of queries (or combined queries) evaluated at the same time by a pool of threads
+            True to merge the queries over the same grouping attributes into one scan
+            options of the QueryProcessors (engine, workers, ...)
+        Output:
+            The QueryProcessor of every query, in the order of the queries, holding its mf_table and run statistics
+    """
+    processors = [EMFQueryProcessor(phi, source, **options) for phi in queries]
+
+    units = [[processor] for processor in processors] #processors evaluated together by one scan
+    if shared_scan:
+        groups = {}
+        for processor in processors:
+            if has_conditions(processor.phi):
+                groups[id(processor)] = [processor] # Queries with EMF conditions are not merged
+            else:
+                groups.setdefault(grouping_key(processor.phi), []).append(processor)
+        units = list(groups.values())
+
+    def run_unit(unit):
+        if len(unit) == 1:
+            unit[0].run()
+            return
+        combined_phi, mappings = merge_queries([processor.phi for processor in unit])
+        combined = QueryProcessor(combined_phi, source, **options)
+        combined.run()
+        for processor, mf_table in zip(unit, split_table(combined.mf_table, [processor.phi for processor in unit], mappings)):
+            processor.mf_table = mf_table
+            processor.mf_index = combined.mf_index
+            processor.stats = combined.stats
+
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(run_unit, units))
+    else:
+        for unit in units:
+            run_unit(unit)
+    return processors
@@ -0,0 +1,116 @@
+"""
+Description:
+    The profiling file records where the time of a query goes. The processors wrap every phase of a run (fetch, scan 1, scan 2
+    and output) in RunStats.phase, which records its wall time, CPU time, rows, group count and peak memory, and the lookups into
+    the mf_table are counted as they happen. The statistics are exposed as a dictionary or JSON document.
+    Phases can also be run under cProfile, and their peak memory traced with tracemalloc, which both slow the phase down and are
+    therefore only enabled on request.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# ************************* Run Statistics **************************
+class RunStats:
+    """
+        Statistics of the phases of a run. Every phase is a dictionary with its name, wall and CPU time in seconds, the number of
+        rows it read, the number of lookups into the mf_table it made, the number of groups of the mf_table after it ran and the
+        peak memory of the process; with trace_memory the peak memory allocated by the phase itself is traced with tracemalloc,
+        and phases listed in profile_phases carry the top functions of their cProfile report.
+    """
+
+    def __init__(self, profile_phases=(), trace_memory=False):
+        self.profile_phases = list(profile_phases)
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.lookups = 0
+        self.rows = 0
+
+    def reset(self):
+        self.phases = []
+        self.lookups = 0
+        self.rows = 0
+
+    @contextmanager
+    def phase(self, name, mf_table=None):
+        """
+            This function measures the phase run inside the with block.
+            Parameters:
+                name of the phase
+                mf_table whose groups are counted at the end of the phase
+        """
+        self.lookups = 0
+        self.rows = 0
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        profiler = cProfile.Profile() if name in self.profile_phases else None
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield self
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            phase = {
+                "phase": name,
+                "wall_s": time.perf_counter() - start_wall,
+                "cpu_s": time.process_time() - start_cpu,
+                "rows": self.rows,
+                "lookups": self.lookups,
+                "groups": len(mf_table) if mf_table is not None else None,
+                "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            }
+            if self.trace_memory:
+                phase["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1] - start_memory
+            if profiler is not None:
+                report = io.StringIO()
+                pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(25)
+                phase["profile"] = report.getvalue()
+            self.phases.append(phase)
+
+    def count_rows(self, table_rows):
+        """
+            This function counts the rows a phase reads. The length of a list or a SalesDataset is counted at once, while a stream
+            is counted as it is iterated.
+            Parameters:
+                rows of the Sales table
+            Output:
+                The same rows
+        """
+        if hasattr(table_rows, "__len__"):
+            self.rows += len(table_rows)
+            return table_rows
+        return self.counted(table_rows)
+
+    def counted(self, table_rows):
+        for row in table_rows:
+            self.rows += 1
+            yield row
+
+    def to_dict(self):
+        return {"phases": self.phases, "total_wall_s": sum(phase["wall_s"] for phase in self.phases)}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+    def write(self, path):
+        """
+            This function writes the statistics as JSON to a file, or to standard error when the path is "-".
+        """
+        if path == "-":
+            print(self.to_json(), file=sys.stderr)
+        else:
+            with open(path, "w") as file:
+                file.write(self.to_json())
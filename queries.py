@@ -3,7 +3,15 @@ Description:
     The queries file is where the sql and esql queries are stored and fed into the program. 
     Variables with sql_ prefix are the sql equivalent of the esql queries that we can test against our custom query processor
     Variables with esql_ prefix are the esql queries we feed into our custom query processor.
-    Each variable can be returned in the respective function: sqlQuery or esqlQuery
+    Variables with phi_ prefix are the textual form of the esql queries, which phi_parser turns into the esql_ structure.
+    esql_e and phi_e are EMF queries: for every customer and product, the average quantity the customer bought of any product and
+    the number of sales of the product to the customer above that average. Their grouping variables are defined by a "conditions"
+    list, evaluated by the EMFQueryProcessor (see planner.emf_variables).
+    esql_f and phi_f use the holistic aggregates median, p95 and count_distinct, which are computed with sketches (see sketches.py):
+    count_distinct reads the attribute given by the "attribute" key of its F-VECT entry, and "k" (median and percentiles),
+    "precision" (count_distinct) and "exact_limit" tune the sketch of an aggregate (with an exact_limit of 0, count_distinct is
+    always estimated with HyperLogLog).
+    Each variable can be returned in the respective function: sqlQuery, esqlQuery or phiQuery
 """
 
 sql_a = """
@@ -49,7 +57,7 @@ phi_a = """
 select cust, prod, Y.sum(quant), J.sum(quant)
 from sales
 group by cust, prod : Y, J
-such that Y.state = 'NY' and J.state = 'NJ
+such that Y.state = 'NY' and J.state = 'NJ'
 """
 
 sql_b = """
@@ -209,9 +217,68 @@ esql_z = {
     }
 }
 
+esql_e = {
+    "S": ["cust", "prod", "avg_X_quant", "count_Y_quant"],
+    "n": 2,
+    "V": {
+        "col1": {"name": "cust", "type": "char", "size": 20},
+        "col2": {"name": "prod", "type": "char", "size": 20}
+    },
+    "F-VECT": [
+        {"name": "avg_X_quant", "group_var": "X", "agg": "avg"},
+        {"name": "count_Y_quant", "group_var": "Y", "agg": "count"}
+    ],
+    "PRED-LIST": {
+        "var1": {"name": "avg_X_quant", "group_var": "X", "conditions": [
+            {"attribute": "cust", "op": "=", "ref": "cust"}
+        ]},
+        "var2": {"name": "count_Y_quant", "group_var": "Y", "conditions": [
+            {"attribute": "cust", "op": "=", "ref": "cust"},
+            {"attribute": "prod", "op": "=", "ref": "prod"},
+            {"attribute": "quant", "op": ">", "ref": "avg_X_quant"}
+        ]}
+    }
+}
+phi_e = """
+select cust, prod, X.avg(quant), Y.count(quant)
+from sales
+group by cust, prod : X, Y
+such that X.cust = cust and
+          Y.cust = cust and Y.prod = prod and Y.quant > X.avg(quant)
+"""
+
+esql_f = {
+    "S": ["prod", "median_NY_quant", "p95_NY_quant", "count_distinct_NY_cust", "count_distinct_NJ_cust"],
+    "n": 2,
+    "V": {
+        "col1": {"name": "prod", "type": "char", "size": 20}
+    },
+    "F-VECT": [
+        {"name": "median_NY_quant", "group_var": "NY", "agg": "median"},
+        {"name": "p95_NY_quant", "group_var": "NY", "agg": "p95", "k": 400},
+        {"name": "count_distinct_NY_cust", "group_var": "NY", "agg": "count_distinct", "attribute": "cust"},
+        {"name": "count_distinct_NJ_cust", "group_var": "NJ", "agg": "count_distinct", "attribute": "cust", "exact_limit": 0}
+    ],
+    "PRED-LIST": {
+        "var1": {"name": "median_NY_quant", "group_var": "NY", "attribute": "state", "value": "NY"},
+        "var2": {"name": "p95_NY_quant", "group_var": "NY", "attribute": "state", "value": "NY"},
+        "var3": {"name": "count_distinct_NY_cust", "group_var": "NY", "attribute": "state", "value": "NY"},
+        "var4": {"name": "count_distinct_NJ_cust", "group_var": "NJ", "attribute": "state", "value": "NJ"}
+    }
+}
+phi_f = """
+select prod, NY.median(quant), NY.p95(quant), NY.count_distinct(cust), NJ.count_distinct(cust)
+from sales
+group by prod : NY, NJ
+such that NY.state = 'NY' and NJ.state = 'NJ'
+"""
+
 
 def sqlQuery():
     return sql_b
 
 def esqlQuery():
-    return esql_b
\ No newline at end of file
+    return esql_b
+
+def phiQuery():
+    return phi_b
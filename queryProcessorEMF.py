@@ -4,11 +4,21 @@
     Date: Fall Semester 2024
     Description:
         This program is a simple solution to ad-hoc OLAP complex queries using the newly introduced Phi operator. Instead of conducting multiple joins which leads to multiple scans of the underlying table, this programs aims to reduce the number of joins and number of scans by computing aggregates functions of subsets of the group by attributes using just a few table scans.
+        The EMF processor also evaluates grouping variables whose such that conditions compare the rows with the grouping attributes and with the aggregates of other grouping variables, in as few table scans as their references allow (see EMFQueryProcessor in processor.py).
 """
 
-import psycopg2
+import argparse
+import contextlib
+import sys
 from tabulate import tabulate
+import queries
 from queries import esqlQuery
+from processor import EMFQueryProcessor, engines, run_batch
+from dataset import SalesDataset
+from snapshot import refresh_snapshot
+from loader import partition_methods
+from profiling import RunStats
+from sinks import sink_formats, export
 
 #Global Variables
 connection_params = {
@@ -17,40 +27,38 @@ connection_params = {
     'port': '5432'
     
 }
-sales_table_schema = {
-    "cust": ["char", 20],
-    "prod": ["char", 20],
-    "day": "int",
-    "month": "int",
-    "year": "int",
-    "state": ["char", 2],
-    "quant": "int",
-    "date": "date"
-}
-sales_table_columns = ["cust", "prod", "day", "month", "year", "state", "quant", "date"]
 mf_struct_header = []
 mf_table = [] #Store the Output of the result
 
-# The set of below operations attempt to connect to Database and retrieve Sales Table
-try: 
-    connection = psycopg2.connect(**connection_params)
-    print("Connection successful!")
-except Exception as e:
-    print("Error connecting to the database: ", e)
-
-try:
-    cursor = connection.cursor()
-    # table rows
-    cursor.execute("select * from sales;")
-    global table_rows
-    table_rows = cursor.fetchall()
-
-except Exception as e:
-    print("Error retrieving data: ", e)
-
-finally:
-    cursor.close()
-    connection.close()
+streaming = False #Read the Sales table through a server side cursor instead of fetching it at once
+stream_itersize = 2000 #Number of rows fetched per round trip when streaming
+stream_cache = False #Cache the columns needed by the scans of the conditions of an EMF query during the first scan instead of re-reading the stream
+engine = "compiled" #Execution engine of the aggregate scan: "compiled" runs a function generated for the query, "interpreted" reads the query for every row, "numpy" computes the aggregates over NumPy columns
+workers = 1 #Number of worker processes of the compiled aggregate scan, more than one runs it in parallel
+fetch_partitions = 1 #Number of ranges of the Sales table read concurrently, more than one reads them over a pool of connections
+fetch_connections = 4 #Size of the connection pool of the partitioned read
+partition_method = "ctid" #Split of the partitioned read: ranges of blocks (ctid) or buckets of a hash of the grouping attributes (hash)
+incremental = False #Keep the mf_table between runs and only scan the rows appended since the previous run
+incremental_dir = ".mf_state" #Directory of the stored mf_tables of the incremental mode
+watermark_column = "date" #Column of the Sales table that only grows as rows are appended, used by the incremental mode
+cache_results = False #Answer repeated queries over an unchanged Sales table from the result cache
+phi_text = None #Textual form of the query to evaluate, parsed by phi_parser, instead of the esql_ structure returned by esqlQuery()
+pushdown = False #Fetch only the columns and rows the query needs instead of retrieving the whole Sales table
+stats = RunStats() #Wall time, CPU time, rows, lookups, groups and peak memory of every phase of the run (see profiling.py)
+stats_file = None #Write the statistics of the run as JSON to this file after main(), "-" for standard error
+batch_queries = [] #Names of esql_ queries of queries.py evaluated together against one in-memory load of the Sales table, instead of esqlQuery()
+batch_concurrency = 1 #Number of the batch queries evaluated at the same time
+max_groups = None #Maximum number of groups held in memory, beyond which they are spilled to disk in hash partitions
+spill_dir = None #Directory of the spill files, the temporary directory of the system by default
+sort_groups = False #Read the Sales table sorted by the grouping attributes and compute the groups one at a time, holding a single group in memory
+shared_scan = False #Merge the batch queries over the same grouping attributes into one combined query evaluated in a single scan
+output_format = None #Stream the result to output_path as csv, jsonl, arrow or parquet instead of printing the grid (see sinks.py), csv by default with max_groups or sort_groups
+output_path = "-" #File the result is streamed to, "-" for standard output
+preview_rows = 20 #Number of rows of the result printed as a grid when it is streamed to a sink
+
+table_rows = None #Rows of the Sales table to evaluate the query on, None to read the table from the database in main()
+snapshot_path = None #Directory of a local snapshot of the Sales table read instead of the database, rewritten when the table changed
+processor = None #EMFQueryProcessor of the last run
 
 # ************************* Print Table Rows Test Function **************************
 def print_table_rows():
@@ -81,150 +89,162 @@ def print_table_rows():
 
 
 # ************************* Get MF Structure  **************************
-def get_mf_structure(phi):
+def get_mf_structure(processor):
     """
         This function prints out the MF Structure of the input query
         Parameters:
-            The single parameters is the Phi Arguments written as a nested dictionary containing all of the information of the phi arguments.
+            The QueryProcessor of the query, built from its Phi Arguments
         Output:
             The output is the MF structure of the resulting table, as well as the headers of the table.
     """
     print("\n\n******************** \n    MF Structure \n********************")
-    print("struct {")
-    for column, obj in phi["V"].items():
-        col_name = obj["name"]
-        col_type = obj["type"]
-        col_size = obj["size"]
-        print(f"       {col_type}    {col_name} [{col_size}];")
-        mf_struct_header.append(col_name)
-    for agg in phi["F-VECT"]:
-        col_name = agg["name"]
-        col_type = "int"
-        print(f"       {col_type}    {col_name};")
-        mf_struct_header.append(col_name)
-    print("} mf_struct [500]\n\n")
+    print(processor.mf_structure() + "\n\n")
 
     print("Output Table Headers:")
-    col_widths = [max(len(str(row[i])) for row in [mf_struct_header]) for i in range(len(mf_struct_header))]
-    print(f" | ".join(f"{str(item).ljust(col_widths[i])}" for i, item in enumerate(mf_struct_header)))
+    header = processor.mf_struct_header
+    col_widths = [max(len(str(row[i])) for row in [header]) for i in range(len(header))]
+    print(f" | ".join(f"{str(item).ljust(col_widths[i])}" for i, item in enumerate(header)))
     print("\n")
 
-# ************************* Get Indeces of Grouping Attributes **************************
-def get_indeces(attribute):
-    """
-        This function retrieves the group by attributes from the Sales table as indeces. Because the database returns the table rows as python lists with indexed values, this function gets the index of the group-by attributes using the hard coded sales table headers list.
-        Parameters:
-            group by attribute
-        Output:
-            the index of the group by attribute
-    """
-    index = 0
-    for column in sales_table_columns:
-        if(attribute == column):
-            return index
-        else:
-            index += 1
-
-# ************************* Lookup Current Row against MF Struct **************************
-def lookup(row, indeces):
-    """
-        This function compares the current row with the rows in the mf_table (ultimately the output table).
-        Parameters:
-            current row as "row"
-            indeces of the group by attributes as a list of indeces
-        Output:
-            A positive value if a match is found
-            A negative value is no match was found
-    """
-    #Find the index attribute from the grouping attribute(s) in the table_schema
-    if(len(mf_table) == 0):
-        return [-1, -1]
-    else:
-        match = 0
-        mf_index = 0
-        for mf_row in range(len(mf_table)):
-            for index in indeces:
-                if(mf_table[mf_row][mf_struct_header[mf_index]] == row[index]):
-                    match += 1
-                    mf_index += 1
-            if(match == len(indeces)):
-                return [match, mf_row]
-            else:
-                mf_index = 0
-                match = 0
-        return [-1, -1]
-
-# ************************* Add Current Row **************************
-def add_row(row, indeces):
-    """
-        This function adds a row to the mf_table (output table)
-        Parameters:
-            Current row of the underlying table as "row"
-            List of indeces of the group by attributes
-    """
-    mf_index = 0
-    new_row = {}
-    for index in indeces:
-        new_row[mf_struct_header[mf_index]] = row[index]
-        mf_index += 1
-    mf_table.append(new_row)
-
 # ************************* Main Function **************************
 def main():
     """
         Main function that runs all of the functions and loops to output the result of the submitted (input) query. 
     """
-# ************************* Main Function **************************
-    query = esqlQuery()
-    
+    global processor, mf_table, mf_struct_header
+
+    if batch_queries:
+        run_batch_queries()
+        return
+
+    # The textual query is parsed by the QueryProcessor, which reuses its Phi Arguments when the same query was already parsed
+    query = phi_text if phi_text is not None else esqlQuery()
+    source = table_rows
+    if source is None and snapshot_path is not None:
+        source = refresh_snapshot(connection_params, snapshot_path)
+    processor = EMFQueryProcessor(query, source, connection_params, engine=engine, workers=workers, streaming=streaming,
+                                  stream_itersize=stream_itersize, stream_cache=stream_cache, fetch_partitions=fetch_partitions,
+                                  fetch_connections=fetch_connections, partition_method=partition_method, pushdown=pushdown, incremental=incremental,
+                                  incremental_dir=incremental_dir, watermark_column=watermark_column, cache_results=cache_results,
+                                  max_groups=max_groups, spill_dir=spill_dir, sort_groups=sort_groups, stats=stats)
+
+    # The grid needs the whole mf_table, which the spilled and sorted evaluations never hold in memory, so their result is
+    # streamed as csv unless another format is given
+    sink_format = output_format
+    if sink_format is None and (max_groups is not None or sort_groups):
+        sink_format = "csv"
+    if sink_format is not None:
+        # Stream the result into the sink, keeping standard output for the result when it is written there
+        report = sys.stderr if output_path == "-" else sys.stdout
+        with contextlib.redirect_stdout(report):
+            get_mf_structure(processor)
+        preview, count = export(processor, sink_format, output_path, preview_rows=preview_rows)
+        mf_struct_header = processor.mf_struct_header
+        print(preview, file=report)
+        print(f"{count} rows written as {sink_format}" + (f" to {output_path}" if output_path != "-" else ""), file=report)
+        write_stats()
+        return
+
     # Get MF structure and print
-    get_mf_structure(query)
-    
-    # Get indices of grouping attributes
-    indeces = [get_indeces(obj["name"]) for column, obj in query["V"].items()]
-
-    # First Table Scan: Populate the mf_table with distinct values of grouping attributes
-    for row in table_rows:
-        match = lookup(row, indeces)
-        if match[0] == -1:
-            add_row(row, indeces)
-
-    # Second Table Scan: Calculate aggregates within one table scan
-    for row in table_rows:
-        for n in range(len(query["F-VECT"])):
-            agg = query["F-VECT"][n]
-            agg_name = agg["name"]
-            group_var = agg["group_var"]
-            agg_type = agg["agg"]
-
-            predicate = query["PRED-LIST"][f"var{n + 1}"]
-            match = lookup(row, indeces)
-            if match[0] > -1:
-                pos = match[1]
-                attr_index = get_indeces(predicate["attribute"])
-                
-                if row[attr_index] == predicate["value"]:
-                    quant_index = get_indeces("quant")
-                    current_value = mf_table[pos].get(agg_name, None)
-                    if agg_type == "sum":
-                        mf_table[pos][agg_name] = current_value + row[quant_index] if current_value else row[quant_index]
-                    elif agg_type == "max":
-                        mf_table[pos][agg_name] = max(current_value, row[quant_index]) if current_value else row[quant_index]
-                    elif agg_type == "min":
-                        mf_table[pos][agg_name] = min(current_value, row[quant_index]) if current_value else row[quant_index]
-                    elif agg_type == "count":
-                        mf_table[pos][agg_name] = current_value + 1 if current_value else 1
-                    elif agg_type == "avg":
-                        sum_key = f"{agg_name}_sum"
-                        count_key = f"{agg_name}_count"
-                        mf_table[pos][sum_key] = mf_table[pos].get(sum_key, 0) + row[quant_index]
-                        mf_table[pos][count_key] = mf_table[pos].get(count_key, 0) + 1
-                        mf_table[pos][agg_name] = mf_table[pos][sum_key] / mf_table[pos][count_key]
+    get_mf_structure(processor)
 
+    mf_table = processor.run()
+    mf_struct_header = processor.mf_struct_header
 
     # Print the final result (MF table)
-    print_table_rows()
+    with stats.phase("output", mf_table):
+        print_table_rows()
+    write_stats()
+
+# ************************* Run Batch of Queries **************************
+def run_batch_queries():
+    """
+        This function loads the Sales table once into a SalesDataset, evaluates every query of batch_queries against it and prints
+        the MF structure and table of every query.
+    """
+    global processor, mf_table, mf_struct_header
+
+    with stats.phase("fetch"):
+        if table_rows is not None:
+            dataset = SalesDataset.from_rows(table_rows)
+        elif snapshot_path is not None:
+            dataset = refresh_snapshot(connection_params, snapshot_path)
+        else:
+            dataset = SalesDataset.from_database(connection_params)
+        stats.rows = len(dataset)
+    processors = run_batch([getattr(queries, name) for name in batch_queries], dataset, batch_concurrency, shared_scan, engine=engine, workers=workers)
+    reported = set() #Statistics already reported, queries merged into one scan share theirs
+    for name, processor in zip(batch_queries, processors):
+        print(f"\n\n******************** \n    {name} \n********************")
+        get_mf_structure(processor)
+        mf_table = processor.mf_table
+        mf_struct_header = processor.mf_struct_header
+        print_table_rows()
+        if id(processor.stats) not in reported:
+            reported.add(id(processor.stats))
+            stats.phases.extend(dict(phase, query=name) for phase in processor.stats.phases)
+    write_stats()
+
+# ************************* Write Run Statistics **************************
+def write_stats():
+    """
+        This function writes the statistics of the phases of the run as JSON when a stats file is set
+    """
+    if stats_file is not None:
+        stats.write(stats_file)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the query returned by esqlQuery() or given with --phi")
+    parser.add_argument("--engine", choices=engines, default=engine, help="execution engine of the aggregate scan")
+    parser.add_argument("--workers", type=int, default=workers, help="number of worker processes of the compiled aggregate scan")
+    parser.add_argument("--stream", action="store_true", default=streaming, help="read the Sales table through a server side cursor instead of fetching it at once")
+    parser.add_argument("--itersize", type=int, default=stream_itersize, help="number of rows fetched per round trip when streaming")
+    parser.add_argument("--stream-cache", action="store_true", default=stream_cache, help="cache the columns the scans of the EMF conditions read instead of re-reading the stream")
+    parser.add_argument("--partitions", type=int, default=fetch_partitions, help="number of ranges of the Sales table read concurrently")
+    parser.add_argument("--connections", type=int, default=fetch_connections, help="size of the connection pool of the partitioned read")
+    parser.add_argument("--partition-method", choices=partition_methods, default=partition_method, help="split the partitioned read into ranges of blocks (ctid) or buckets of a hash of the grouping attributes (hash)")
+    parser.add_argument("--pushdown", action="store_true", default=pushdown, help="fetch only the columns and rows the query needs")
+    parser.add_argument("--incremental", action="store_true", default=incremental, help="only scan the rows appended since the previous run")
+    parser.add_argument("--cache", action="store_true", default=cache_results, help="answer repeated queries from the result cache")
+    parser.add_argument("--phi", default=phi_text, help="textual form of the query to evaluate instead of esqlQuery()")
+    parser.add_argument("--snapshot", default=snapshot_path, metavar="PATH", help="read the Sales table from a local snapshot, refreshed when the table changed")
+    parser.add_argument("--max-groups", type=int, default=max_groups, help="maximum number of groups held in memory before spilling to disk")
+    parser.add_argument("--spill-dir", default=spill_dir, help="directory of the spill files")
+    parser.add_argument("--sorted", action="store_true", default=sort_groups, help="evaluate the query one group at a time over the table sorted by the grouping attributes")
+    parser.add_argument("--format", choices=sink_formats, default=output_format, help="stream the result in this format instead of printing the grid (csv by default with --max-groups or --sorted)")
+    parser.add_argument("--output", default=output_path, help="file the result is streamed to, - for standard output")
+    parser.add_argument("--preview", type=int, default=preview_rows, help="number of rows of a streamed result printed as a grid")
+    parser.add_argument("--batch", nargs="+", default=batch_queries, metavar="QUERY", help="esql_ queries of queries.py to evaluate against one load of the table")
+    parser.add_argument("--concurrency", type=int, default=batch_concurrency, help="number of the batch queries evaluated at the same time")
+    parser.add_argument("--shared-scan", action="store_true", default=shared_scan, help="evaluate the batch queries over the same grouping attributes in one scan")
+    parser.add_argument("--stats", default=stats_file, help="write the statistics of every phase as JSON to this file, - for standard error")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="PHASE", help="run these phases (fetch, scan 1, scan 2, scan 1+2, output) under cProfile")
+    parser.add_argument("--trace-memory", action="store_true", help="trace the peak memory allocated by every phase with tracemalloc")
+    args = parser.parse_args()
+    engine = args.engine
+    workers = args.workers
+    streaming = args.stream
+    stream_itersize = args.itersize
+    stream_cache = args.stream_cache
+    fetch_partitions = args.partitions
+    fetch_connections = args.connections
+    partition_method = args.partition_method
+    pushdown = args.pushdown
+    incremental = args.incremental
+    cache_results = args.cache
+    phi_text = args.phi
+    stats_file = args.stats
+    batch_queries = args.batch
+    snapshot_path = args.snapshot
+    max_groups = args.max_groups
+    spill_dir = args.spill_dir
+    sort_groups = args.sorted
+    output_format = args.format
+    output_path = args.output
+    preview_rows = args.preview
+    batch_concurrency = args.concurrency
+    shared_scan = args.shared_scan
+    stats.profile_phases = args.profile
+    stats.trace_memory = args.trace_memory
     main()
@@ -0,0 +1,261 @@
+"""
+Description:
+    The service file keeps the query processor running as a local HTTP service, so queries no longer pay for starting Python,
+    connecting and fetching the Sales table every time. The table is loaded once into a SalesDataset (or mapped from a snapshot)
+    when the service starts, the parsed queries and compiled scans stay cached between requests, and every query is only
+    evaluated:
+        POST /query    evaluates the query of the JSON body {"query": <esql_ dictionary or textual query>, "options": {...}}
+                       and answers {"headers": [...], "rows": [[...], ...], "stats": [...]}, with null for missing aggregates
+        GET /status    answers the number of rows of the dataset and the number of queued and running queries
+        POST /reload   reloads the Sales table, e.g. after rows were appended
+    Queries are evaluated by an executor, threads sharing the dataset or worker processes each holding their own copy (or mapping
+    of the snapshot), at most concurrency at a time. Up to queue_size more queries wait in a queue, and further requests are
+    answered 503 until the queue drains: at most concurrency + queue_size queries are admitted at any time, even when a burst
+    of requests arrives before any of them is taken from the queue. The service listens on a TCP port of localhost, or on a unix socket:
+
+        python service.py --port 8080 --snapshot .sales_snapshot
+        curl --data @query.json localhost:8080/query
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataset import SalesDataset
+from snapshot import Snapshot, refresh_snapshot
+from processor import EMFQueryProcessor, engines
+from profiling import RunStats
+
+#Global Variables
+connection_params = {
+    'dbname': 'carmengvargas',
+    'host': 'localhost',
+    'port': '5432'
+}
+query_options = ["engine", "sort_groups"] #Options of the QueryProcessor a request can set
+worker_dataset = None #Dataset of a worker process, loaded once by init_worker
+
+# ************************* Worker Process **************************
+def init_worker(snapshot_path, table_rows):
+    """
+        This function loads the dataset of a worker process when it starts.
+        Parameters:
+            directory of the snapshot of the Sales table, mapped by every worker without copying it
+            rows of the Sales table, used when there is no snapshot
+    """
+    global worker_dataset
+    worker_dataset = Snapshot(snapshot_path) if snapshot_path is not None else SalesDataset.from_rows(table_rows)
+
+def evaluate_query(query, options, dataset=None):
+    """
+        This function evaluates a query against the dataset. It runs in the threads or worker processes of the executor.
+        Parameters:
+            esql_ dictionary or textual form of the query
+            options of the QueryProcessor
+            dataset of the Sales table, the dataset of the worker process by default
+        Output:
+            Dictionary with the "headers", the "rows" and the "stats" of the phases of the query
+    """
+    processor = EMFQueryProcessor(query, dataset if dataset is not None else worker_dataset, stats=RunStats(), **options)
+    # The answer is built from the streamed MF rows, so a sorted evaluation never holds its mf_table besides the answer
+    headers = processor.mf_struct_header
+    rows = [[mf_row[header] if header in mf_row else None for header in headers] for mf_row in processor.stream()]
+    return {"headers": headers, "rows": rows, "stats": processor.stats.phases}
+
+# ************************* Query Service **************************
+class QueryService:
+    """
+        Evaluates the queries of the requests against a dataset of the Sales table loaded once. The service is started with
+        serve(), and the requests are answered by handle_request.
+    """
+
+    def __init__(self, table_rows=None, snapshot_path=None, processes=False, concurrency=2, queue_size=100):
+        self.table_rows = table_rows
+        self.snapshot_path = snapshot_path
+        self.processes = processes
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.dataset = None
+        self.executor = None
+        self.queue = None #Queries waiting for the executor
+        self.running = 0 #Number of queries evaluated by the executor
+        self.admitted = 0 #Number of queries queued or running, at most concurrency + queue_size
+
+    # ************************* Load Dataset **************************
+    def load(self):
+        """
+            This function loads the Sales table (from the rows given to the service, the snapshot or the database) and starts the
+            executor evaluating the queries against it. The executor of a previous load finishes its queries in the background.
+        """
+        if self.table_rows is not None:
+            dataset = SalesDataset.from_rows(self.table_rows)
+        elif self.snapshot_path is not None:
+            dataset = refresh_snapshot(connection_params, self.snapshot_path)
+        else:
+            dataset = SalesDataset.from_database(connection_params)
+
+        previous_executor = self.executor
+        if self.processes:
+            # Every worker maps the snapshot, or receives a copy of the rows once when it starts. Workers are started on demand, and
+            # forked from the forkserver instead of the service, so they never inherit the sockets of the open connections
+            rows = None if self.snapshot_path is not None else list(dataset)
+            self.executor = ProcessPoolExecutor(max_workers=self.concurrency, mp_context=multiprocessing.get_context("forkserver"),
+                                                initializer=init_worker, initargs=(self.snapshot_path, rows))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.dataset = dataset
+        if previous_executor is not None:
+            previous_executor.shutdown(wait=False)
+
+    # ************************* Evaluate Queued Queries **************************
+    async def run_queries(self):
+        """
+            This function takes the queued queries one at a time and evaluates them with the executor, resolving the future of the
+            request with the result or the error. concurrency of these tasks run at the same time.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            query, options, future = await self.queue.get()
+            self.running += 1
+            try:
+                if self.processes:
+                    result = await loop.run_in_executor(self.executor, evaluate_query, query, options)
+                else:
+                    result = await loop.run_in_executor(self.executor, evaluate_query, query, options, self.dataset)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+
+    # ************************* Handle Request **************************
+    async def handle_request(self, method, path, body):
+        """
+            This function answers one request.
+            Parameters:
+                method and path of the request
+                body of the request
+            Output:
+                The HTTP status and the JSON answer
+        """
+        if method == "GET" and path == "/status":
+            return 200, {"rows": len(self.dataset), "queued": self.queue.qsize(), "running": self.running}
+        if method == "POST" and path == "/reload":
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.load)
+            except Exception as error:
+                # The queries keep being answered from the dataset loaded before
+                return 500, {"error": f"The Sales table could not be reloaded: {type(error).__name__}: {error}"}
+            return 200, {"rows": len(self.dataset)}
+        if method != "POST" or path != "/query":
+            return 404, {"error": f"Unknown request {method} {path}"}
+
+        try:
+            request = json.loads(body or b"null")
+        except ValueError as error:
+            return 400, {"error": f"The body is not JSON: {error}"}
+        if not isinstance(request, dict) or not isinstance(request.get("query"), (dict, str)):
+            return 400, {"error": "The body needs a query, as an esql_ dictionary or a textual query"}
+        options = request.get("options", {})
+        if not isinstance(options, dict) or any(option not in query_options for option in options):
+            return 400, {"error": f"The options of a query can only be {', '.join(query_options)}"}
+        if options.get("engine", "compiled") not in engines:
+            return 400, {"error": f"Unknown engine {options['engine']}, expected one of {', '.join(engines)}"}
+
+        # The admitted queries are counted rather than bounded by the queue, whose queries are only taken by the evaluating tasks
+        # once the requests of a burst have all been handled
+        if self.admitted >= self.concurrency + self.queue_size:
+            return 503, {"error": f"{self.queue_size} queries are already waiting, try again later"}
+        future = asyncio.get_running_loop().create_future()
+        self.admitted += 1
+        try:
+            self.queue.put_nowait((request["query"], options, future))
+            return 200, await future
+        except (ValueError, KeyError, TypeError) as error:
+            # Invalid queries are reported to the client
+            return 400, {"error": f"{type(error).__name__}: {error}"}
+        except Exception as error:
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        finally:
+            self.admitted -= 1
+
+    # ************************* HTTP Connection **************************
+    async def handle_connection(self, reader, writer):
+        """
+            This function reads one HTTP request from a connection, answers it and closes the connection.
+            Parameters:
+                stream reader and writer of the connection
+        """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, separator, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            if len(request_line) < 2:
+                status, answer = 400, {"error": "Malformed request"}
+            else:
+                status, answer = await self.handle_request(request_line[0].upper(), request_line[1], body)
+        except (asyncio.IncompleteReadError, ValueError):
+            status, answer = 400, {"error": "Malformed request"}
+
+        content = json.dumps(answer, default=str).encode()
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error", 503: "Service Unavailable"}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(content)}\r\n"
+                     "Connection: close\r\n\r\n".encode() + content)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # ************************* Serve **************************
+    async def serve(self, host="127.0.0.1", port=8080, socket_path=None, ready=None):
+        """
+            This function loads the dataset and answers requests until the service is cancelled.
+            Parameters:
+                host and port the service listens on
+                path of a unix socket to listen on instead
+                event set once the service accepts requests
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.load)
+        self.queue = asyncio.Queue()
+        tasks = [asyncio.create_task(self.run_queries()) for task in range(self.concurrency)]
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        try:
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer queries against the Sales table loaded once, over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address the service listens on")
+    parser.add_argument("--port", type=int, default=8080, help="port the service listens on")
+    parser.add_argument("--socket", default=None, metavar="PATH", help="listen on a unix socket instead of a port")
+    parser.add_argument("--snapshot", default=None, metavar="PATH", help="map the Sales table from a local snapshot, refreshed when the table changed")
+    parser.add_argument("--processes", action="store_true", help="evaluate the queries in worker processes instead of threads")
+    parser.add_argument("--concurrency", type=int, default=2, help="number of queries evaluated at the same time")
+    parser.add_argument("--queue", type=int, default=100, help="number of queries waiting for evaluation before requests are refused")
+    args = parser.parse_args()
+
+    service = QueryService(snapshot_path=args.snapshot, processes=args.processes, concurrency=args.concurrency, queue_size=args.queue)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
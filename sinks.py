@@ -0,0 +1,190 @@
+"""
+Description:
+    The sinks file writes the result of a query to standard output or a file as it is produced, instead of rendering the whole
+    mf_table as a grid. The MF rows are taken from QueryProcessor.stream() and written in chunks of chunk_size rows, so with the
+    spilling or sorted modes the result is never held in memory, and no formatted copy of the table is ever built:
+        - csv: a header line and one line per MF row, with an empty field for the aggregates of groups that no row satisfied
+        - jsonl: one JSON object per MF row, with null for those aggregates
+        - arrow and parquet: one record batch (or row group) per chunk, typed from the Phi Arguments of the query; these formats
+          need pyarrow, which is only imported when they are used
+    tabulate is only used for a preview of the first rows of the result (see export).
+"""
+
+import csv
+import json
+import sys
+from tabulate import tabulate
+
+sink_formats = ["csv", "jsonl", "arrow", "parquet"] #Formats of the output sinks
+binary_formats = ["arrow", "parquet"] #Formats written as bytes
+
+# ************************* Open Output **************************
+def open_output(path, binary):
+    """
+        This function opens the file a sink writes to.
+        Parameters:
+            path of the file, "-" for standard output
+            True for the binary formats
+        Output:
+            The file, and whether the sink has to close it
+    """
+    if path == "-":
+        return (sys.stdout.buffer if binary else sys.stdout), False
+    return open(path, "wb" if binary else "w", newline=None if binary else ""), True
+
+# ************************* CSV Sink **************************
+class CSVSink:
+    """
+        Writes MF rows as comma separated values.
+    """
+
+    def __init__(self, file, headers):
+        self.file = file
+        self.writer = csv.writer(file)
+        self.writer.writerow(headers)
+
+    def write(self, rows):
+        self.writer.writerows(["" if value is None else value for value in row] for row in rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+
+# ************************* JSON Lines Sink **************************
+class JSONLSink:
+    """
+        Writes MF rows as JSON objects, one per line. Values that are not JSON types (dates) are written as text.
+    """
+
+    def __init__(self, file, headers):
+        self.file = file
+        self.headers = headers
+
+    def write(self, rows):
+        self.file.write("".join(json.dumps(dict(zip(self.headers, row)), default=str) + "\n" for row in rows))
+        self.file.flush()
+
+    def close(self):
+        self.file.flush()
+
+# ************************* Arrow Sink **************************
+class ArrowSink:
+    """
+        Writes MF rows as an Arrow IPC stream or a Parquet file, one record batch or row group per chunk.
+    """
+
+    def __init__(self, file, headers, phi, parquet=False):
+        pyarrow = import_pyarrow()
+        self.pyarrow = pyarrow
+        self.headers = headers
+        self.schema = arrow_schema(pyarrow, phi, headers)
+        if parquet:
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(file, self.schema)
+        else:
+            import pyarrow.ipc
+            self.writer = pyarrow.ipc.new_stream(file, self.schema)
+
+    def write(self, rows):
+        columns = [self.pyarrow.array([row[position] for row in rows], type=field.type) for position, field in enumerate(self.schema)]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def import_pyarrow():
+    """
+        This function imports pyarrow, which is only needed by the arrow and parquet sinks.
+        Output:
+            The pyarrow module
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError("The arrow and parquet output formats need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+def arrow_schema(pyarrow, phi, headers):
+    """
+        This function types the columns of the result of a query: the grouping attributes by their type in the Phi Arguments, the
+        counts as integers, sum, min and max as integers like quant, and the averages and quantiles as floating point numbers.
+        Parameters:
+            pyarrow module
+            Phi Arguments of the query
+            headers of the result
+        Output:
+            The Arrow schema
+    """
+    types = {}
+    for column, obj in phi["V"].items():
+        types[obj["name"]] = {"int": pyarrow.int64(), "date": pyarrow.date32()}.get(obj["type"], pyarrow.string())
+    for agg in phi["F-VECT"]:
+        types[agg["name"]] = pyarrow.int64() if agg["agg"] in ["sum", "count", "min", "max", "count_distinct"] else pyarrow.float64()
+    return pyarrow.schema([(header, types[header]) for header in headers])
+
+# ************************* Open Sink **************************
+def open_sink(output_format, path, headers, phi):
+    """
+        This function opens the sink of an output format.
+        Parameters:
+            format of the output (see sink_formats)
+            path of the file, "-" for standard output
+            headers of the result
+            Phi Arguments of the query
+        Output:
+            The sink, and the file to close once the sink is closed (None for standard output)
+    """
+    if output_format not in sink_formats:
+        raise ValueError(f"Unknown output format {output_format}, expected one of {', '.join(sink_formats)}")
+    if output_format in binary_formats:
+        import_pyarrow() # Fail before the file is created
+    file, owned = open_output(path, output_format in binary_formats)
+    try:
+        if output_format == "csv":
+            sink = CSVSink(file, headers)
+        elif output_format == "jsonl":
+            sink = JSONLSink(file, headers)
+        else:
+            sink = ArrowSink(file, headers, phi, parquet=output_format == "parquet")
+    except Exception:
+        if owned:
+            file.close()
+        raise
+    return sink, (file if owned else None)
+
+# ************************* Export **************************
+def export(processor, output_format, path="-", chunk_size=10000, preview_rows=20):
+    """
+        This function streams the result of a query into a sink.
+        Parameters:
+            QueryProcessor of the query, which is run by the export
+            format of the output (see sink_formats)
+            path of the file, "-" for standard output
+            number of MF rows written at a time
+            number of MF rows kept for the preview
+        Output:
+            The preview of the first rows of the result as a grid, and the number of rows written
+    """
+    headers = processor.mf_struct_header
+    sink, file = open_sink(output_format, path, headers, processor.phi)
+    preview = []
+    count = 0
+    chunk = []
+    try:
+        for mf_row in processor.stream():
+            row = [mf_row[header] if header in mf_row else None for header in headers]
+            if len(preview) < preview_rows:
+                preview.append(["NULL" if value is None else value for value in row])
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                sink.write(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            sink.write(chunk)
+            count += len(chunk)
+        sink.close()
+    finally:
+        if file is not None:
+            file.close()
+    return tabulate(preview, headers=headers, tablefmt="grid"), count
@@ -0,0 +1,300 @@
+"""
+Description:
+    The sketches file implements the holistic aggregates of the F-VECT, which cannot be updated from a single running value:
+        - median and the percentiles p1 ... p99 of quant (Y.median(quant), Y.p95(quant))
+        - count_distinct of any attribute (Y.count_distinct(cust)), the only aggregate that reads another attribute than quant,
+          given by the "attribute" key of its F-VECT entry
+    Every group of such an aggregate keeps a sketch in the hidden column <aggregate>_sketch of its MF row. The sketch holds the
+    exact values while the group is small, and past exact_limit values it switches to a summary of bounded size:
+        - a KLL sketch for the quantiles, whose rank error shrinks as its accuracy k grows (about 1.7 / k of the group size)
+        - a HyperLogLog sketch for count_distinct, with 2 ** precision registers and a relative error of about
+          1.04 / sqrt(2 ** precision)
+    Sketches of the same aggregate merge, so the partial mf_tables of the parallel scan and the stored mf_tables of the incremental
+    mode combine like the other aggregates. A merged sketch is exact while the group has at most exact_limit values; beyond, it
+    summarizes the values in another order than the serial scan, so the parallel and incremental results are estimates within the
+    same error bounds but not always equal to the serial ones. The value of the aggregate is read from the sketch once the table scan is finished
+    (see finish_sketches). The options of a sketch are set by keys of its F-VECT entry, and default to the values below:
+        - "k" for median and the percentiles, between min_k and max_k
+        - "precision" for count_distinct, between min_precision and max_precision
+        - "exact_limit" for both, 0 or more
+    Any other option of a sketch aggregate is refused, so a misspelled option never silently falls back to its default.
+"""
+
+import hashlib
+import math
+import re
+
+quantile_accuracy = 200 #Default k of the KLL sketches
+distinct_precision = 12 #Default number of index bits of the HyperLogLog sketches
+exact_limit = 1000 #Default number of values a sketch keeps exactly before it switches to its summary
+min_k, max_k = 8, 65536 #Range of the k of the KLL sketches
+min_precision, max_precision = 4, 18 #Range of the precision of the HyperLogLog sketches
+aggregate_keys = ["name", "group_var", "agg", "attribute"] #Keys of an F-VECT entry that are not options of its sketch
+
+# ************************* Sketch Aggregates **************************
+def is_sketch(agg_type):
+    """
+        This function checks whether an aggregate is computed with a sketch.
+        Parameters:
+            type of the aggregate
+        Output:
+            True for median, p1 ... p99 and count_distinct
+    """
+    return agg_type in ["median", "count_distinct"] or re.fullmatch(r"p[1-9][0-9]?", agg_type) is not None
+
+def sketch_options(agg):
+    """
+        This function reads and checks the options of the sketch of an aggregate.
+        Parameters:
+            aggregate of the F-VECT
+        Output:
+            The k (quantiles) or precision (count_distinct) of the sketch, and its exact_limit
+    """
+    if not is_sketch(agg["agg"]):
+        raise ValueError(f"Aggregate {agg['agg']} of {agg['name']} is not computed with a sketch")
+    if agg["agg"] == "count_distinct":
+        option, default, low, high = "precision", distinct_precision, min_precision, max_precision
+    else:
+        option, default, low, high = "k", quantile_accuracy, min_k, max_k
+    unknown = [key for key in agg if key not in aggregate_keys + [option, "exact_limit"]]
+    if unknown:
+        raise ValueError(f"Aggregate {agg['name']} is a {agg['agg']}, whose sketch is tuned by {option} and exact_limit, not "
+                         f"{', '.join(unknown)}")
+    size = agg.get(option, default)
+    if type(size) is not int or not low <= size <= high:
+        raise ValueError(f"The {option} of {agg['name']} must be an integer between {low} and {high}, not {size!r}")
+    limit = agg.get("exact_limit", exact_limit)
+    if type(limit) is not int or limit < 0:
+        raise ValueError(f"The exact_limit of {agg['name']} must be an integer of 0 or more, not {limit!r}")
+    return size, limit
+
+def new_sketch(agg):
+    """
+        This function creates the empty sketch of an aggregate.
+        Parameters:
+            aggregate of the F-VECT
+        Output:
+            A QuantileSketch or a DistinctSketch
+    """
+    if agg["agg"] == "count_distinct":
+        return DistinctSketch(*sketch_options(agg))
+    return QuantileSketch(*sketch_options(agg))
+
+def sketch_value(agg, sketch):
+    """
+        This function reads the value of an aggregate from its sketch.
+        Parameters:
+            aggregate of the F-VECT
+            sketch of a group
+        Output:
+            The number of distinct values, the median or the percentile
+    """
+    if agg["agg"] == "count_distinct":
+        return sketch.count()
+    if agg["agg"] == "median":
+        return sketch.quantile(0.5)
+    return sketch.quantile(int(agg["agg"][1:]) / 100)
+
+# ************************* Finish Sketches **************************
+def finish_sketches(aggregates, mf_table):
+    """
+        This function sets the value of every sketch aggregate of the mf_table from its sketch, once the table scan computing it
+        is finished.
+        Parameters:
+            aggregates of the F-VECT
+            mf_table that is updated
+    """
+    for agg in aggregates:
+        if not is_sketch(agg["agg"]):
+            continue
+        agg_name = agg["name"]
+        sketch_key = f"{agg_name}_sketch"
+        for mf_row in mf_table:
+            sketch = mf_row.get(sketch_key)
+            if sketch is not None:
+                mf_row[agg_name] = sketch_value(agg, sketch)
+
+# ************************* Quantile Sketch **************************
+class QuantileSketch:
+    """
+        Quantiles of the values of a group: the sorted values themselves up to exact_limit values, and a KLL sketch beyond. The KLL
+        sketch keeps a stack of compactors, where every value of compactor h stands for 2 ** h values of the group; a full compactor
+        is sorted and every other value is promoted to the compactor above. The compactors are randomly offset by a linear
+        congruential generator with a fixed seed, so the same values in the same order always give the same sketch, and the state
+        of the generator is a single integer.
+    """
+
+    def __init__(self, k=quantile_accuracy, exact_limit=exact_limit):
+        self.k = k
+        self.exact_limit = exact_limit
+        self.values = [] #Values of the group while it is exact
+        self.compactors = None #Compactors of the KLL sketch, None while the group is exact
+        self.seed = 0 #State of the generator of the compaction offsets
+
+    def add(self, value):
+        if value is None:
+            return # NULL values are ignored, like in the quantiles of SQL
+        if self.compactors is None:
+            self.values.append(value)
+            if len(self.values) > self.exact_limit:
+                self.summarize()
+            return
+        self.compactors[0].append(value)
+        if len(self.compactors[0]) >= self.capacity(0):
+            self.compress()
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    def summarize(self):
+        """
+            This function switches the sketch from the exact values to the compactors of the KLL sketch.
+        """
+        self.compactors = [[]]
+        values = self.values
+        self.values = []
+        for value in values:
+            self.add(value)
+
+    def capacity(self, height):
+        # Compactors shrink by 2/3 per level below the top one, so the sketch holds at most about 3k values whatever the size of the group
+        return int(math.ceil(self.k * (2 / 3) ** (len(self.compactors) - height - 1))) + 1
+
+    def compress(self):
+        for height in range(len(self.compactors)):
+            if len(self.compactors[height]) >= self.capacity(height):
+                if height + 1 == len(self.compactors):
+                    self.compactors.append([])
+                compactor = sorted(self.compactors[height])
+                self.compactors[height] = []
+                self.compactors[height + 1].extend(compactor[self.offset()::2])
+
+    def offset(self):
+        # Step of the 64 bit generator of Knuth's MMIX, whose top bit (the most random one) is the offset of a compaction
+        self.seed = (self.seed * 6364136223846793005 + 1442695040888963407) & 0xFFFFFFFFFFFFFFFF
+        return self.seed >> 63
+
+    def merge(self, other):
+        """
+            This function merges the sketch of the same aggregate over other values into the sketch.
+            Parameters:
+                other QuantileSketch
+        """
+        if other.compactors is None:
+            self.extend(other.values)
+            return
+        if self.compactors is None:
+            self.summarize()
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for height, compactor in enumerate(other.compactors):
+            self.compactors[height].extend(compactor)
+        while any(len(compactor) >= self.capacity(height) for height, compactor in enumerate(self.compactors)):
+            self.compress()
+
+    def quantile(self, q):
+        """
+            This function estimates a quantile of the values.
+            Parameters:
+                quantile between 0 and 1
+            Output:
+                The quantile, interpolated between the two closest values like percentile_cont while the sketch is exact, and the
+                value of the sketch at the rank of the quantile otherwise
+        """
+        if self.compactors is None:
+            if not self.values:
+                return None
+            values = sorted(self.values)
+            position = q * (len(values) - 1)
+            lower = int(math.floor(position))
+            upper = min(lower + 1, len(values) - 1)
+            if position == lower:
+                return values[lower]
+            return values[lower] + (values[upper] - values[lower]) * (position - lower)
+        weighted = sorted((value, 2 ** height) for height, compactor in enumerate(self.compactors) for value in compactor)
+        total = sum(weight for value, weight in weighted)
+        rank = 0
+        for value, weight in weighted:
+            rank += weight
+            if rank >= q * total:
+                return value
+        return weighted[-1][0]
+
+# ************************* Distinct Sketch **************************
+class DistinctSketch:
+    """
+        Number of distinct values of a group: the set of values itself up to exact_limit values, and a HyperLogLog sketch beyond.
+        Values are hashed with a stable hash, so the sketches built by the worker processes of the parallel scan can be merged.
+    """
+
+    def __init__(self, precision=distinct_precision, exact_limit=exact_limit):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.values = set() #Values of the group while it is exact
+        self.registers = None #Registers of the HyperLogLog sketch, None while the group is exact
+
+    def add(self, value):
+        if value is None:
+            return # NULL values are not counted, like in count(distinct ...) of SQL
+        if self.registers is None:
+            self.values.add(value)
+            if len(self.values) > self.exact_limit:
+                self.summarize()
+            return
+        self.add_hash(stable_hash(value))
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    def summarize(self):
+        """
+            This function switches the sketch from the exact values to the registers of the HyperLogLog sketch.
+        """
+        self.registers = bytearray(2 ** self.precision)
+        for value in self.values:
+            self.add_hash(stable_hash(value))
+        self.values = set()
+
+    def add_hash(self, hashed):
+        # The low bits of the hash select the register, which keeps the longest run of leading zeros of the remaining bits
+        register = hashed & (len(self.registers) - 1)
+        rank = 64 - self.precision - (hashed >> self.precision).bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def merge(self, other):
+        """
+            This function merges the sketch of the same aggregate over other values into the sketch.
+            Parameters:
+                other DistinctSketch
+        """
+        if other.registers is None:
+            self.extend(other.values)
+            return
+        if self.registers is None:
+            self.summarize()
+        self.registers = bytearray(max(pair) for pair in zip(self.registers, other.registers))
+
+    def count(self):
+        """
+            This function estimates the number of distinct values.
+            Output:
+                The exact count while the sketch is exact, and the HyperLogLog estimate otherwise, with the linear counting
+                correction for small counts
+        """
+        if self.registers is None:
+            return len(self.values)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+def stable_hash(value):
+    """
+        This function hashes a value to 64 bits, identically in every process (unlike hash, which is salted per process for text).
+    """
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "little")
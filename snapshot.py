@@ -0,0 +1,271 @@
+"""
+Description:
+    The snapshot file keeps a local copy of the Sales table in a binary columnar format, so cold runs read the table from disk
+    instead of pulling it over the database connection. A snapshot is a directory with one file per column and a meta.json:
+        - integer columns (day, month, year, quant) are stored as fixed-width little-endian int32 values
+        - text columns (cust, prod, state) are dictionary-encoded: the distinct values are kept in meta.json and every row stores
+          the int32 code of its value
+        - date columns are stored as int32 day ordinals
+    Opening a snapshot maps its column files into memory, so nothing is parsed or copied up front: the columnar engine computes
+    group ids and such that conditions directly on the mapped codes, and the row engines decode the rows as they scan them.
+    The snapshot records the version of the Sales table it was written from (see cache.table_version), and refresh_snapshot only
+    rewrites it when the table changed. Every write goes to a new version directory inside the snapshot directory, and the
+    current_file naming the current one is replaced atomically once the version is complete. A snapshot therefore always exists
+    while it is rewritten, and the previous version is kept until the next write for the readers that were opening it.
+"""
+
+import datetime
+import json
+import mmap
+import os
+import shutil
+import sys
+import time
+from array import array
+from dataset import SalesDataset
+from loader import sales_table_columns
+from cache import table_version
+
+int32_min = -2 ** 31 #Stored for the NULL values of integer columns
+int32_max = 2 ** 31 - 1
+current_file = "CURRENT" #File of the snapshot directory naming its current version directory
+
+# ************************* Version Directories **************************
+def current_version(path):
+    """
+        This function finds the current version directory of a snapshot.
+        Parameters:
+            directory of the snapshot
+        Output:
+            The path of the version directory, None when no snapshot was written
+    """
+    try:
+        with open(os.path.join(path, current_file)) as file:
+            return os.path.join(path, file.read().strip())
+    except FileNotFoundError:
+        return None
+
+# ************************* Write Snapshot **************************
+def write_snapshot(table_rows, path, version=None, column_names=sales_table_columns):
+    """
+        This function writes rows of the Sales table into a snapshot. The rows are written into a new version directory, which
+        becomes the current version once complete, so an existing snapshot is replaced atomically and can be opened at any time.
+        Versions older than the previous one are removed.
+        Parameters:
+            rows of the Sales table (a list of tuples, a SalesDataset, ...)
+            directory of the snapshot
+            version of the Sales table the rows were read from
+            columns of the Sales table
+    """
+    values = [[] for column in column_names]
+    for row in table_rows:
+        for column_values, value in zip(values, row):
+            column_values.append(value)
+
+    # Version directories are named by their time of writing, so they sort in the order they were written
+    name = f"v{time.time_ns():020d}-{os.getpid()}"
+    temporary_path = os.path.join(path, f"{name}.tmp")
+    os.makedirs(temporary_path)
+    try:
+        meta = {"version": version, "rows": len(values[0]) if values else 0, "columns": {}}
+        for column, column_values in zip(column_names, values):
+            encoding, codes, dictionary = encode_column(column, column_values)
+            codes = array("i", codes)
+            if sys.byteorder != "little":
+                codes.byteswap()
+            with open(os.path.join(temporary_path, f"{column}.bin"), "wb") as file:
+                codes.tofile(file)
+            meta["columns"][column] = {"encoding": encoding, "dictionary": dictionary, "nulls": None in column_values}
+        with open(os.path.join(temporary_path, "meta.json"), "w") as file:
+            json.dump(meta, file)
+        os.replace(temporary_path, os.path.join(path, name))
+    except BaseException:
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        raise
+
+    previous = current_version(path)
+    pointer_path = os.path.join(path, f"{current_file}.{name}.tmp")
+    with open(pointer_path, "w") as file:
+        file.write(name)
+    os.replace(pointer_path, os.path.join(path, current_file))
+
+    # Readers map the files of a version when they open it, so a version can be removed once no reader can still be opening it
+    if previous is not None:
+        previous_name = os.path.basename(previous)
+        for entry in os.listdir(path):
+            if entry.startswith("v") and not entry.endswith(".tmp") and entry < previous_name:
+                shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+def encode_column(column, values):
+    """
+        This function encodes the values of a column as int32 codes.
+        Parameters:
+            name and values of the column
+        Output:
+            The encoding ("int", "date" or "dictionary"), the codes and the dictionary of a dictionary-encoded column
+    """
+    present = [value for value in values if value is not None]
+    if all(type(value) is int for value in present):
+        for value in present:
+            if value <= int32_min or value > int32_max:
+                raise ValueError(f"Value {value} of column {column} does not fit in an int32 column of the snapshot")
+        return "int", [int32_min if value is None else value for value in values], None
+    if all(type(value) is datetime.date for value in present):
+        return "date", [0 if value is None else value.toordinal() for value in values], None
+    dictionary = list(dict.fromkeys(values))
+    codes = {value: code for code, value in enumerate(dictionary)}
+    return "dictionary", [codes[value] for value in values], dictionary
+
+# ************************* Decoded Column **************************
+class DecodedColumn:
+    """
+        Sequence of the decoded values of a column of a snapshot, decoding the mapped codes as they are read.
+    """
+
+    def __init__(self, codes, decode):
+        self.codes = codes
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(map(self.decode, self.codes[index]))
+        return self.decode(self.codes[index])
+
+    def __iter__(self):
+        return map(self.decode, self.codes)
+
+# ************************* Snapshot **************************
+class Snapshot(SalesDataset):
+    """
+        Sales table mapped from a snapshot. It is a SalesDataset, so it can be the source of any QueryProcessor; its NumPy arrays
+        are views of the mapped files, and the group ids and condition masks of dictionary-encoded columns are computed on the codes.
+    """
+
+    def __init__(self, path):
+        directory = current_version(path)
+        if directory is None:
+            raise ValueError(f"No snapshot was written in {path}")
+        with open(os.path.join(directory, "meta.json")) as file:
+            self.meta = json.load(file)
+        self.path = directory #Version directory the snapshot was opened from
+        self.maps = []
+        self.codes = {} #column name -> memoryview of the int32 codes of the column
+        columns = {}
+        for column, column_meta in self.meta["columns"].items():
+            codes = self.map_column(column)
+            self.codes[column] = codes
+            if column_meta["encoding"] == "dictionary":
+                columns[column] = DecodedColumn(codes, column_meta["dictionary"].__getitem__)
+            elif column_meta["encoding"] == "date":
+                columns[column] = DecodedColumn(codes, lambda code: datetime.date.fromordinal(code) if code else None)
+            elif column_meta["nulls"]:
+                columns[column] = DecodedColumn(codes, lambda code: None if code == int32_min else code)
+            else:
+                columns[column] = codes
+        super().__init__(columns, list(self.meta["columns"]))
+
+    def map_column(self, column):
+        """
+            This function maps the file of a column into memory.
+            Output:
+                The int32 codes of the column as a memoryview
+        """
+        if self.meta["rows"] == 0:
+            return memoryview(array("i"))
+        with open(os.path.join(self.path, f"{column}.bin"), "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(mapped)
+        codes = memoryview(mapped).cast("i")
+        if sys.byteorder != "little":
+            # The files are little-endian, big-endian machines decode a swapped copy
+            swapped = array("i", codes)
+            swapped.byteswap()
+            codes.release()
+            return memoryview(swapped)
+        return codes
+
+    @property
+    def version(self):
+        return self.meta["version"]
+
+    def code_arrays(self, names):
+        """
+            This function returns the int32 codes of columns as NumPy arrays viewing the mapped files, without copying them.
+        """
+        import numpy as np # NumPy is only needed by the columnar engine
+        return {name: np.frombuffer(self.codes[name], dtype=np.int32) for name in names}
+
+    def arrays(self, names):
+        import numpy as np # NumPy is only needed by the columnar engine
+        with self.lock:
+            for name in names:
+                if name in self.array_cache:
+                    continue
+                column_meta = self.meta["columns"][name]
+                codes = self.code_arrays([name])[name]
+                if column_meta["encoding"] == "dictionary":
+                    self.array_cache[name] = np.array(column_meta["dictionary"])[codes]
+                elif column_meta["encoding"] == "int" and not column_meta["nulls"]:
+                    self.array_cache[name] = codes
+                else:
+                    self.array_cache[name] = np.array(list(self.columns[name]))
+            return {name: self.array_cache[name] for name in names}
+
+    def groups(self, attributes):
+        from columnar import factorize
+        key = tuple(attributes)
+        with self.lock:
+            if key not in self.group_cache:
+                # The codes of a column identify its values, so the groups are found on the codes without decoding them
+                codes = self.code_arrays(attributes)
+                self.group_cache[key] = factorize([codes[attribute] for attribute in attributes])
+            return self.group_cache[key]
+
+    def mask(self, attribute, value):
+        column_meta = self.meta["columns"][attribute]
+        if column_meta["encoding"] != "dictionary":
+            return super().mask(attribute, value)
+        key = (attribute, value)
+        with self.lock:
+            if key not in self.mask_cache:
+                codes = self.code_arrays([attribute])[attribute]
+                # A value missing from the dictionary has no code, and no row satisfies the condition
+                code = column_meta["dictionary"].index(value) if value in column_meta["dictionary"] else -1
+                self.mask_cache[key] = codes == code
+            return self.mask_cache[key]
+
+    def close(self):
+        self.codes = {}
+        self.columns = {}
+        self.array_cache = {}
+        self.group_cache = {}
+        self.mask_cache = {}
+        for mapped in self.maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass # Still viewed by NumPy arrays handed out by the snapshot, released with them
+        self.maps = []
+
+# ************************* Refresh Snapshot **************************
+def refresh_snapshot(connection_params, path):
+    """
+        This function opens the snapshot of the Sales table, rewriting it first when it is missing or the table changed since it
+        was written.
+        Parameters:
+            connection parameters of the database
+            directory of the snapshot
+        Output:
+            The Snapshot
+    """
+    version = table_version(connection_params)
+    if current_version(path) is not None:
+        snapshot = Snapshot(path)
+        if snapshot.version == version:
+            return snapshot
+        snapshot.close()
+    write_snapshot(SalesDataset.from_database(connection_params), path, version)
+    return Snapshot(path)
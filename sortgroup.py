@@ -0,0 +1,110 @@
+"""
+Description:
+    The sortgroup file evaluates queries on the Sales table sorted by their grouping attributes. The rows of a group are then
+    consecutive, so instead of holding every group in the mf_table until the end of the second table scan:
+        - the table is read once, in the order of the grouping attributes: sorted by the database (order by) or, for the rows of
+          a source, by a local external sort that writes sorted runs to disk and merges them
+        - the aggregates of a group are computed as soon as its rows are read, and its MF row is emitted at the end of the group
+    Only the MF row of the current group is held in memory whatever the number of groups, and the first MF rows are available
+    before the scan is finished. The MF rows come in the order of the grouping attributes instead of their order of first
+    appearance.
+"""
+
+import heapq
+import os
+import shutil
+import tempfile
+from itertools import groupby
+from codegen import compile_phi
+from planner import has_conditions, aggregated_attribute
+from sketches import finish_sketches
+from spill import SpillFile
+
+# ************************* Sorted Query **************************
+def sorted_query(phi, columns):
+    """
+        This function writes the select statement reading the Sales table sorted by the grouping attributes of a query. Columns
+        that are not used by the query are selected as null, so the rows keep the layout of the Sales table.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+        Output:
+            The select statement
+    """
+    group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+    needed = group_attributes + [predicate["attribute"] for predicate in phi["PRED-LIST"].values()]
+    needed += [aggregated_attribute(agg) for agg in phi["F-VECT"]] + ["quant"]
+    projection = ", ".join(column if column in needed else f"null as {column}" for column in columns)
+    return f"select {projection} from sales order by {', '.join(group_attributes)};"
+
+# ************************* Sort Key **************************
+def sort_key(group_indeces):
+    """
+        This function returns the sort key of the rows on the grouping attributes, which orders NULL values last like the database.
+        Parameters:
+            indeces of the grouping attributes in the rows
+        Output:
+            The key function
+    """
+    return lambda row: tuple((row[index] is None, row[index]) for index in group_indeces)
+
+# ************************* External Sort **************************
+def external_sort(table_rows, group_indeces, spill_dir=None, run_size=200000):
+    """
+        This function sorts rows of the Sales table on their grouping attributes. Rows are sorted in memory in runs of run_size
+        rows; when there is more than one run, the sorted runs are written to disk and merged, so at most one run is in memory.
+        Parameters:
+            rows of the Sales table (any iterable of rows: a list, a SalesStream, a SalesDataset, ...)
+            indeces of the grouping attributes in the rows
+            directory of the sorted runs, the temporary directory of the system by default
+            number of rows sorted in memory at a time
+        Output:
+            The sorted rows, as a generator
+    """
+    key = sort_key(group_indeces)
+    runs = []
+    run_path = None
+    run = []
+    try:
+        for row in table_rows:
+            run.append(row)
+            if len(run) >= run_size:
+                if run_path is None:
+                    run_path = tempfile.mkdtemp(prefix="mf_sort_", dir=spill_dir)
+                run.sort(key=key)
+                sorted_run = SpillFile(os.path.join(run_path, f"run{len(runs)}"))
+                for sorted_row in run:
+                    sorted_run.append(sorted_row)
+                sorted_run.close()
+                runs.append(sorted_run)
+                run = []
+        run.sort(key=key)
+        if not runs:
+            yield from run
+            return
+        yield from heapq.merge(*runs, iter(run), key=key)
+    finally:
+        if run_path is not None:
+            shutil.rmtree(run_path, ignore_errors=True)
+
+# ************************* Sorted Scan **************************
+def sorted_scan(phi, columns, sorted_rows):
+    """
+        This function evaluates a query over rows sorted by its grouping attributes, one group at a time.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+            rows of the Sales table sorted by the grouping attributes of the query (rows of the same group are consecutive)
+        Output:
+            The MF rows of the query, as a generator, in the order of the rows
+    """
+    if has_conditions(phi):
+        raise ValueError("Queries with EMF conditions compare groups with each other and cannot be evaluated one group at a time")
+    group_indeces = [columns.index(obj["name"]) for column, obj in phi["V"].items()]
+    phi_scan = compile_phi(phi, columns)
+    for key, group_rows in groupby(sorted_rows, key=lambda row: tuple(row[index] for index in group_indeces)):
+        # The scan function of the query adds the group on its first row and updates its aggregates with every row
+        mf_table = []
+        phi_scan(group_rows, mf_table, {}, True)
+        finish_sketches(phi["F-VECT"], mf_table)
+        yield mf_table[0]
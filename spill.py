@@ -0,0 +1,157 @@
+"""
+Description:
+    The spill file evaluates queries whose groups do not fit in memory. The MF algorithm keeps every group in the mf_table until
+    the end of the second table scan, so with a budget on the number of groups held in memory:
+        - the first table scan discovers the groups; as long as they fit in the budget, the second scan computes their aggregates
+          in memory as usual
+        - once the budget is exceeded, the table is instead hash-partitioned on the grouping attributes into spill files, so every
+          group belongs to exactly one partition, keeping only the columns the query reads
+        - every partition is then evaluated on its own with the two table scans of the MF algorithm (partitioned again, on other
+          bits of the hash, when it still has too many groups), and its mf_table is written to a result file
+        - the result files are merged on the position of the first row of every group, streaming the MF rows in the same order as
+          the in-memory evaluation
+"""
+
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+from codegen import compile_phi
+from mf_record import mf_fields, record_type
+from planner import aggregated_attribute
+from sketches import finish_sketches
+
+# ************************* Spill File **************************
+class SpillFile:
+    """
+        Append-only file of rows written as pickled batches. Once closed, it can be iterated any number of times, reading one batch
+        at a time, so it can be scanned like the rows of the Sales table.
+    """
+
+    def __init__(self, path, batch_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+        self.file = open(path, "wb")
+
+    def append(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            pickle.dump(self.batch, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.count += len(self.batch)
+            self.batch = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        with open(self.path, "rb") as file:
+            while True:
+                try:
+                    batch = pickle.load(file)
+                except EOFError:
+                    return
+                yield from batch
+
+# ************************* Spilled Evaluation **************************
+def spilled_scan(phi, columns, table_rows, max_groups, spill_dir=None, partitions=16):
+    """
+        This function evaluates a query holding at most max_groups groups in memory at a time.
+        Parameters:
+            Phi Arguments of the query
+            columns of the Sales table
+            rows of the Sales table (any re-iterable source of rows: a list, a SalesStream, a SalesDataset, ...)
+            maximum number of groups held in memory
+            directory of the spill files, the temporary directory of the system by default
+            number of partitions the table is split into when the groups do not fit
+        Output:
+            The MF rows of the query, as a generator, in order of first appearance of their group
+    """
+    spill_path = tempfile.mkdtemp(prefix="mf_spill_", dir=spill_dir)
+    try:
+        for first_row, mf_row in evaluate_partition(phi, columns, table_rows, max_groups, spill_path, partitions, 0, False):
+            yield mf_row
+    finally:
+        shutil.rmtree(spill_path, ignore_errors=True)
+
+def evaluate_partition(phi, columns, table_rows, max_groups, spill_path, partitions, depth, numbered):
+    """
+        This function evaluates a query over the rows of a partition, partitioning them further when their groups do not fit.
+        Parameters:
+            Phi Arguments of the query and columns of the Sales table
+            rows of the partition
+            maximum number of groups held in memory
+            directory of the spill files
+            number of partitions
+            depth of the partition, which selects the digit of the hash of the grouping attributes used to split its groups, so
+            every level splits them on different bits of the hash
+            True when the last element of every row is its position in the Sales table (the rows of a spill file)
+        Output:
+            Tuples (position of the first row of the group, MF row), in order of first appearance of their group
+    """
+    group_indeces = [columns.index(obj["name"]) for column, obj in phi["V"].items()]
+
+    # First Table Scan: Discover the groups while they fit in memory
+    first_rows = {} #tuple of grouping attribute values -> position of the first row of the group
+    fits = True
+    for row_number, row in enumerate(table_rows):
+        key = tuple(row[index] for index in group_indeces)
+        if key not in first_rows:
+            if len(first_rows) >= max_groups:
+                fits = False
+                break
+            first_rows[key] = row[-1] if numbered else row_number
+
+    if fits:
+        # Second Table Scan: Calculate the aggregates of the groups in memory
+        mf_record = record_type(mf_fields(phi))
+        group_attributes = [obj["name"] for column, obj in phi["V"].items()]
+        mf_table = []
+        mf_index = {}
+        for key in first_rows:
+            mf_index[key] = len(mf_table)
+            mf_table.append(mf_record(zip(group_attributes, key)))
+        compile_phi(phi, columns)(table_rows, mf_table, mf_index, False)
+        finish_sketches(phi["F-VECT"], mf_table)
+        yield from zip(first_rows.values(), mf_table)
+        return
+
+    del first_rows
+    if partitions ** (depth + 1) > 2 ** 64:
+        raise ValueError(f"The groups of the query cannot be split into partitions of at most {max_groups} groups")
+
+    # Partition the rows on a hash of their grouping attributes, keeping only the columns the query reads
+    needed = set(group_indeces + [columns.index(predicate["attribute"]) for predicate in phi["PRED-LIST"].values()] +
+                 [columns.index(aggregated_attribute(agg)) for agg in phi["F-VECT"]] + [columns.index("quant")])
+    level_path = tempfile.mkdtemp(prefix=f"level{depth}_", dir=spill_path)
+    files = [SpillFile(os.path.join(level_path, f"part{partition}")) for partition in range(partitions)]
+    for row_number, row in enumerate(table_rows):
+        key = tuple(row[index] for index in group_indeces)
+        spilled_row = tuple(value if index in needed else None for index, value in enumerate(row[:len(columns)]))
+        files[(hash(key) & 0xFFFFFFFFFFFFFFFF) // partitions ** depth % partitions].append(spilled_row + (row[-1] if numbered else row_number,))
+    for file in files:
+        file.close()
+
+    # Evaluate every partition on its own and keep its mf_table in a result file
+    results = []
+    for partition, file in enumerate(files):
+        result = SpillFile(os.path.join(level_path, f"result{partition}"))
+        for first_row, mf_row in evaluate_partition(phi, columns, file, max_groups, level_path, partitions, depth + 1, True):
+            result.append((first_row, mf_row))
+        result.close()
+        os.remove(file.path)
+        results.append(result)
+
+    # Merge the mf_tables of the partitions back into the order of first appearance of the groups
+    yield from heapq.merge(*results, key=lambda result_row: result_row[0])
+    shutil.rmtree(level_path, ignore_errors=True)
@@ -2,10 +2,14 @@
 This file is used to test equivalent sql queries against our esql queries fed into our custom query processor. 
 """
 
+import argparse
 import psycopg2
 import psycopg2.extras
 import tabulate
 from queries import sqlQuery
+from cache import result_cache, result_key, table_version
+
+cache_results = False #Answer repeated statements over an unchanged sales table from the result cache
 
 
 def query():
@@ -18,12 +22,24 @@ def query():
 
     body = sqlQuery()
 
+    # Repeated statements over an unchanged sales table are answered from the result cache
+    if cache_results:
+        key = result_key(body, table_version(connection_params))
+        rows = result_cache.get(key)
+        if rows is not None:
+            return tabulate.tabulate(rows, headers="keys", tablefmt="psql")
+
     conn = psycopg2.connect(**connection_params,
                             cursor_factory=psycopg2.extras.DictCursor)
     cur = conn.cursor()
     cur.execute(body)
+    rows = [dict(row) for row in cur.fetchall()]
+    conn.close()
+
+    if cache_results:
+        result_cache.put(key, rows)
 
-    return tabulate.tabulate(cur.fetchall(),
+    return tabulate.tabulate(rows,
                              headers="keys", tablefmt="psql")
 
 
@@ -32,4 +48,7 @@ def main():
 
 
 if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Run the sql equivalent of the esql query")
+    parser.add_argument("--cache", action="store_true", default=cache_results, help="answer repeated statements from the result cache")
+    cache_results = parser.parse_args().cache
     main()
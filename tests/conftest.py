@@ -0,0 +1,116 @@
+import itertools
+import os
+import re
+import sqlite3
+import sys
+import threading
+import zlib
+from types import SimpleNamespace
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import generate_sales
+
+
+class FakeCursor:
+    """Cursor of FakeDatabase, translating the psycopg2 placeholders. Results are read at once, under the lock of the database."""
+
+    def __init__(self, database, name=None):
+        self.database = database
+        self.name = name
+        self.itersize = 2000
+        self.rows = iter(())
+        self.description = None
+
+    def execute(self, statement, params=None):
+        self.database.statements.append(statement)
+        self.database.parameters.append(list(params or []))
+        # SQLite only types the result of max(date) through the name of the column, and has no PostgreSQL casts
+        statement = re.sub(r"::(text|bigint|int)\b", "", statement.replace("max(date)", 'max(date) as "max [date]"'))
+        # Physical blocks of rows_per_block consecutive rows, numbered by rowid
+        block = f"((rowid - 1) / {self.database.rows_per_block})"
+        statement = statement.replace("select pg_relation_size('sales') / current_setting('block_size');",
+                                      f"select (count(*) + {self.database.rows_per_block} - 1) / {self.database.rows_per_block} from sales;")
+        statement = re.sub(r"ctid (>=|<) %s::tid", rf"{block} \1 tid_block(%s)", statement)
+        with self.database.lock:
+            cursor = self.database.connection.execute(statement.replace("%s", "?"), params or ())
+            self.description = cursor.description
+            self.rows = iter(cursor.fetchall())
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return next(self.rows, None)
+
+    def fetchmany(self, size=None):
+        return list(itertools.islice(self.rows, size or self.itersize))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+        self.closed = False
+        self.info = SimpleNamespace(transaction_status=0) #Idle, for psycopg2.pool
+        database.opened += 1
+
+    def cursor(self, name=None, **options):
+        return FakeCursor(self.database, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.database.opened -= 1
+
+
+class FakeDatabase:
+    """Sales table in an in-memory SQLite database, served through psycopg2.connect."""
+
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:", check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+        # Signed 32 bit hash, like hashtext of PostgreSQL
+        self.connection.create_function("hashtext", 1, lambda text: zlib.crc32(text.encode()) - (1 << 31), deterministic=True)
+        self.connection.create_function("mod", 2, lambda value, modulus: value % modulus, deterministic=True)
+        self.connection.create_function("tid_block", 1, lambda tid: int(tid.strip("()").split(",")[0]), deterministic=True)
+        self.connection.execute("create table sales (cust varchar(20), prod varchar(20), day int, month int, year int, state char(2), quant int, date date)")
+        self.statements = []
+        self.parameters = [] #Parameters of the statements, in the same order
+        self.opened = 0 #Connections not closed yet
+        self.rows_per_block = 100 #Rows of a physical block, addressed by ctid ranges
+        self.lock = threading.Lock()
+
+    def load(self, rows):
+        with self.lock:
+            self.connection.executemany("insert into sales values (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.commit()
+
+
+@pytest.fixture
+def sales_rows():
+    """Synthetic Sales table, small enough for every engine."""
+    return generate_sales(2000, 15, 8, ["NY", "NJ", "CT", "PA"], seed=1)
+
+
+@pytest.fixture
+def null_sales_rows(sales_rows):
+    """Sales table where some rows have no customer and some no product."""
+    return [(None if position % 7 == 0 else row[0], None if position % 11 == 0 else row[1]) + row[2:]
+            for position, row in enumerate(sales_rows)]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(psycopg2, "connect", lambda **params: FakeConnection(database))
+    return database
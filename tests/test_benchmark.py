@@ -0,0 +1,15 @@
+import json
+import benchmark
+
+
+def test_every_default_processor_runs(monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["benchmark.py", "--rows", "500", "--no-memory", "--json"])
+    benchmark.main()
+    checks = json.loads(capsys.readouterr().out)["checks"]
+    runners = {check["runner"] for check in checks}
+    for name, engines in benchmark.processor_engines.items():
+        for engine in engines:
+            assert (name if engine is None else f"{name} ({engine})") in runners
+    # The sql_ queries are only reported: sql_c of queries.py is not equivalent to esql_c
+    processor_checks = [check for check in checks if not check["runner"].startswith("sql_")]
+    assert all(check["result"] == "equal" for check in processor_checks), processor_checks
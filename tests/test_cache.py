@@ -0,0 +1,32 @@
+import threading
+import queries
+from cache import ResultCache
+from processor import QueryProcessor
+
+
+def test_lookups_return_copies(sales_rows, tmp_path):
+    cache = ResultCache(max_entries=2, cache_dir=str(tmp_path))
+    processor = QueryProcessor(queries.esql_a, sales_rows)
+    processor.run()
+    cache.put("a", processor.mf_table)
+    first = cache.get("a")
+    first[0]["sum_NY_quant"] = -1
+    first.pop()
+    assert cache.get("a") == processor.mf_table
+    assert ResultCache(cache_dir=str(tmp_path)).get("a") == processor.mf_table
+
+
+def test_lru_is_shared_by_threads():
+    cache = ResultCache(max_entries=8, cache_dir=None)
+
+    def use(thread):
+        for step in range(2000):
+            cache.put((thread, step % 12), [thread, step])
+            cache.get((thread, (step + 5) % 12))
+
+    threads = [threading.Thread(target=use, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache.entries) == 8
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("script", ["queryProcessorMF.py", "queryProcessorEMF.py"])
+def test_fetch_modes_have_flags(script):
+    usage = subprocess.run([sys.executable, script, "--help"], cwd=root, capture_output=True, text=True, check=True).stdout
+    for flag in ["--stream", "--itersize", "--partitions", "--connections", "--pushdown"]:
+        assert flag in usage
+    assert ("--stream-cache" in usage) == (script == "queryProcessorEMF.py")
+
+
+@pytest.mark.parametrize("mode", [{"max_groups": 5}, {"sort_groups": True}])
+def test_spilled_and_sorted_results_are_streamed(sales_rows, monkeypatch, capsys, mode):
+    import csv
+    import queries
+    import queryProcessorMF
+    from processor import QueryProcessor
+    expected = QueryProcessor(queries.esql_a, sales_rows)
+    expected.run()
+    monkeypatch.setattr(queryProcessorMF, "table_rows", sales_rows)
+    monkeypatch.setattr(queryProcessorMF, "esqlQuery", lambda: queries.esql_a)
+    for option, value in mode.items():
+        monkeypatch.setattr(queryProcessorMF, option, value)
+    queryProcessorMF.main()
+    rows = list(csv.reader(capsys.readouterr().out.splitlines()))
+    assert rows[0] == expected.mf_struct_header
+    assert len(rows) == len(expected.mf_table) + 1
+    assert queryProcessorMF.processor.mf_table == []
@@ -0,0 +1,36 @@
+import copy
+import linecache
+import codegen
+import mf_record
+import queries
+from loader import sales_table_columns as sales_columns
+
+
+def numbered_queries(count):
+    phis = []
+    for number in range(count):
+        phi = copy.deepcopy(queries.esql_a)
+        phi["PRED-LIST"]["var1"]["value"] = f"S{number}"
+        phis.append(phi)
+    return phis
+
+
+def test_compiled_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(codegen, "compiled_cache", codegen.OrderedDict())
+    monkeypatch.setattr(codegen, "compiled_cache_size", 3)
+    phis = numbered_queries(5)
+    scans = [codegen.compile_phi(phi, sales_columns) for phi in phis]
+    assert len(codegen.compiled_cache) == 3
+    keys = [codegen.query_hash(phi, sales_columns) for phi in phis]
+    assert list(codegen.compiled_cache) == keys[2:]
+    assert [f"<phi_scan {key[:12]}>" in linecache.cache for key in keys] == [False, False, True, True, True]
+    assert codegen.compile_phi(phis[4], sales_columns) is scans[4]
+
+
+def test_record_types_are_bounded(monkeypatch):
+    monkeypatch.setattr(mf_record, "record_types", mf_record.OrderedDict())
+    monkeypatch.setattr(mf_record, "record_types_size", 2)
+    types = [mf_record.record_type(("cust", f"total_{number}")) for number in range(4)]
+    assert list(mf_record.record_types) == [("cust", "total_2"), ("cust", "total_3")]
+    assert mf_record.record_type(("cust", "total_3")) is types[3]
+    assert mf_record.record_type(("cust", "total_0"))({"cust": None}) == types[0]({"cust": None})
@@ -0,0 +1,48 @@
+import pytest
+import queries
+from processor import QueryProcessor
+
+
+def reference(rows):
+    processor = QueryProcessor(queries.esql_a, rows, engine="interpreted")
+    processor.run()
+    return sorted(processor.result_rows(), key=repr)
+
+
+@pytest.mark.parametrize("options", [{"engine": "compiled"}, {"engine": "interpreted"}, {"workers": 2}])
+def test_rows_appended_at_the_watermark_are_counted(sales_rows, database, tmp_path, options):
+    # Every row is a sale of NY or NJ, which both aggregates of esql_a count
+    rows = sorted((row[:5] + (("NY", "NJ")[position % 2],) + row[6:] for position, row in enumerate(sales_rows)), key=lambda row: row[-1])
+    boundary = rows[1000][-1]
+    # Every load ends in the middle of the rows of one date, whose other rows are appended by the next load
+    loads = [rows[:1000], rows[1000:1001], [], rows[1001:1500], rows[1500:]]
+    assert rows[999][-1] == boundary or rows[1001][-1] == boundary
+    options = dict(options, connection_params={}, incremental=True, incremental_dir=str(tmp_path))
+    for load in loads:
+        database.load(load)
+        processor = QueryProcessor(queries.esql_a, **options)
+        processor.run()
+    assert sorted(processor.result_rows(), key=repr) == reference(rows)
+
+
+def test_identical_rows_at_the_watermark_are_counted(sales_rows, database, tmp_path):
+    options = {"connection_params": {}, "incremental": True, "incremental_dir": str(tmp_path)}
+    rows = sorted(sales_rows, key=lambda row: row[-1])
+    last = rows[-1]
+    database.load(rows + [last])
+    QueryProcessor(queries.esql_a, **options).run()
+    database.load([last])
+    processor = QueryProcessor(queries.esql_a, **options)
+    processor.run()
+    assert sorted(processor.result_rows(), key=repr) == reference(rows + [last, last])
+
+
+def test_corrupt_state_is_evaluated_from_scratch(sales_rows, database, tmp_path):
+    options = {"connection_params": {}, "incremental": True, "incremental_dir": str(tmp_path)}
+    database.load(sales_rows)
+    QueryProcessor(queries.esql_a, **options).run()
+    for state_file in tmp_path.iterdir():
+        state_file.write_bytes(state_file.read_bytes()[:100])
+    processor = QueryProcessor(queries.esql_a, **options)
+    processor.run()
+    assert sorted(processor.result_rows(), key=repr) == reference(sales_rows)
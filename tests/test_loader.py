@@ -0,0 +1,76 @@
+from collections import Counter
+import pytest
+from loader import PartitionedSales
+
+
+def test_hash_partitions_read_every_row_once(null_sales_rows, database):
+    database.load(null_sales_rows)
+    partitioned = PartitionedSales({}, partitions=4, connections=2, method="hash", attributes=["cust", "prod"])
+    batches = list(partitioned.batches())
+    assert len(batches) == 4
+    assert Counter(row for batch in batches for row in batch) == Counter(null_sales_rows)
+    groups = [{row[:2] for row in batch} for batch in batches]
+    assert sum(len(batch_groups) for batch_groups in groups) == len(set().union(*groups))
+    assert "abs(" not in database.statements[-1]
+
+
+def test_pool_is_closed_after_a_read(sales_rows, database):
+    database.load(sales_rows)
+    partitioned = PartitionedSales({}, partitions=4, connections=2, method="hash", attributes=["cust"])
+    assert sum(1 for row in partitioned) == len(sales_rows)
+    assert database.opened == 0 and partitioned.connection_pool is None
+
+    reader = iter(partitioned)
+    next(reader)
+    reader.close()
+    assert database.opened == 0 and partitioned.connection_pool is None
+
+
+def test_stream_cache_reads_the_table_once_for_an_emf_query(sales_rows, database):
+    import queries
+    from processor import EMFQueryProcessor
+    database.load(sales_rows)
+    expected = EMFQueryProcessor(queries.phi_e, sales_rows)
+    expected.run()
+    for stream_cache, reads in [(False, 3), (True, 1)]:
+        database.statements.clear()
+        processor = EMFQueryProcessor(queries.phi_e, connection_params={}, streaming=True, stream_cache=stream_cache)
+        processor.run()
+        assert processor.result_rows() == expected.result_rows()
+        assert database.statements.count("select * from sales;") == reads
+
+
+def test_ctid_partitions_cover_the_blocks_with_an_open_last_range(sales_rows, database):
+    database.load(sales_rows[:250])
+    partitioned = PartitionedSales({}, partitions=2, connections=2)
+    conditions = partitioned.partition_conditions()
+    assert conditions == [("ctid >= %s::tid and ctid < %s::tid", ["(0,0)", "(2,0)"]), ("ctid >= %s::tid", ["(2,0)"])]
+    # Rows appended after the blocks were counted are read by the last range
+    database.load(sales_rows[250:400])
+    rows = [row for condition, condition_params in conditions for row in partitioned.fetch_partition(condition, condition_params)]
+    partitioned.close()
+    assert rows == sales_rows[:400]
+
+
+def test_ctid_partitions_keep_the_pushdown_condition(sales_rows, database):
+    database.load(sales_rows)
+    partitioned = PartitionedSales({}, "select * from sales where state = %s or state = %s;", params=["NY", "NJ"], partitions=3, connections=2)
+    assert list(partitioned) == [row for row in sales_rows if row[5] in ["NY", "NJ"]]
+    reads = [statement for statement in database.statements if "ctid" in statement]
+    assert sorted(reads) == ["select * from sales where (state = %s or state = %s) and (ctid >= %s::tid and ctid < %s::tid);"] * 2 + \
+                            ["select * from sales where (state = %s or state = %s) and (ctid >= %s::tid);"]
+
+
+@pytest.mark.parametrize("method", ["ctid", "hash"])
+def test_processor_reads_partitions(sales_rows, database, method):
+    import queries
+    from processor import QueryProcessor
+    database.load(sales_rows)
+    expected = QueryProcessor(queries.esql_a, sales_rows)
+    expected.run()
+    processor = QueryProcessor(queries.esql_a, connection_params={}, fetch_partitions=3, partition_method=method)
+    processor.run()
+    assert sorted(processor.result_rows(), key=repr) == sorted(expected.result_rows(), key=repr)
+    assert ("hashtext(" in database.statements[-1]) == (method == "hash")
+    with pytest.raises(ValueError):
+        QueryProcessor(queries.esql_a, connection_params={}, fetch_partitions=3, partition_method="range")
@@ -0,0 +1,68 @@
+import queries
+from processor import QueryProcessor
+
+
+def reference(rows):
+    processor = QueryProcessor(queries.esql_a, rows, engine="interpreted")
+    processor.run()
+    return processor.result_rows()
+
+
+def test_null_groups_are_kept(null_sales_rows):
+    groups = {tuple(row[:2]) for row in reference(null_sales_rows)}
+    assert any(None in group for group in groups)
+    assert groups == {row[:2] for row in null_sales_rows}
+
+
+def test_parallel_scan_with_null_groups(null_sales_rows):
+    processor = QueryProcessor(queries.esql_a, null_sales_rows, workers=2)
+    processor.run()
+    assert processor.result_rows() == reference(null_sales_rows)
+
+
+def test_sorted_evaluation_with_null_groups(null_sales_rows):
+    processor = QueryProcessor(queries.esql_a, null_sales_rows, sort_groups=True)
+    processor.run()
+    assert sorted(processor.result_rows(), key=repr) == sorted(reference(null_sales_rows), key=repr)
+
+
+def test_incremental_evaluation_with_null_groups(null_sales_rows, database, tmp_path):
+    rows = sorted(null_sales_rows, key=lambda row: row[-1])
+    options = {"connection_params": {}, "incremental": True, "incremental_dir": str(tmp_path)}
+    database.load(rows[:1200])
+    QueryProcessor(queries.esql_a, **options).run()
+    database.load(rows[1200:])
+    processor = QueryProcessor(queries.esql_a, **options)
+    processor.run()
+    assert sorted(processor.result_rows(), key=repr) == sorted(reference(rows), key=repr)
+
+
+def test_columnar_engine_with_null_groups(null_sales_rows):
+    processor = QueryProcessor(queries.esql_a, null_sales_rows, engine="numpy")
+    processor.run()
+    assert processor.result_rows() == reference(null_sales_rows)
+
+
+def test_columnar_engine_with_null_groups_over_a_dataset(null_sales_rows):
+    from dataset import SalesDataset
+    processor = QueryProcessor(queries.esql_a, SalesDataset.from_rows(null_sales_rows), engine="numpy")
+    processor.run()
+    assert processor.result_rows() == reference(null_sales_rows)
+
+
+def test_emf_conditions_ignore_null_groups_on_every_path(null_sales_rows):
+    from processor import EMFQueryProcessor
+    indexed = "select cust, X.sum(quant) from sales group by cust : X such that X.cust = cust"
+    scanned = "select cust, X.sum(quant) from sales group by cust : X such that X.cust >= cust and X.cust <= cust"
+    results = []
+    for phi in [indexed, scanned]:
+        processor = EMFQueryProcessor(phi, null_sales_rows)
+        processor.run()
+        results.append({mf_row["cust"]: mf_row.get("sum_X_quant") for mf_row in processor.mf_table})
+    assert None in results[0] and results[0][None] is None
+    assert results[0] == results[1]
+    totals = {}
+    for row in null_sales_rows:
+        if row[0] is not None:
+            totals[row[0]] = totals.get(row[0], 0) + row[6]
+    assert {cust: total for cust, total in results[0].items() if cust is not None} == totals
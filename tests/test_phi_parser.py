@@ -0,0 +1,23 @@
+import queries
+import phi_parser
+from loader import sales_table_schema
+
+
+def test_parsed_queries_are_reused():
+    first = phi_parser.get_query(queries.phi_a)
+    assert phi_parser.get_query("\n  " + queries.phi_a.replace("select", "SELECT").replace(" ", "   ") + " ;") is first
+
+
+def test_query_cache_is_keyed_by_schema():
+    schema = dict(sales_table_schema, region=["char", 10])
+    assert phi_parser.get_query(queries.phi_a, schema) is not phi_parser.get_query(queries.phi_a)
+
+
+def test_query_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(phi_parser, "query_cache_size", 3)
+    texts = [queries.phi_a.replace("'NY'", f"'S{number}'") for number in range(5)]
+    for text in texts:
+        phi_parser.get_query(text)
+    assert len(phi_parser.query_cache) == 3
+    assert all((phi_parser.normalize(text), phi_parser.json.dumps(sales_table_schema, sort_keys=True)) in phi_parser.query_cache
+               for text in texts[2:])
@@ -0,0 +1,58 @@
+import pytest
+import queries
+from loader import sales_table_columns
+from phi_parser import get_query
+from planner import fetch_plan
+from processor import QueryProcessor
+
+multi_attribute = get_query("""
+select prod, X.sum(quant), Y.max(quant), Z.count(quant), W.min(quant)
+from sales
+group by prod : X, Y, Z, W
+such that X.state = 'NY' and Y.state = 'NJ' and Z.year = 2020 and W.state = 'NY'
+""")
+
+
+def test_pushdown_plan_selects_the_conditions_and_the_groups_separately():
+    plan = fetch_plan(queries.esql_a, sales_table_columns, False)
+    assert plan == {
+        "group_query": "select cust, prod, null as day, null as month, null as year, null as state, null as quant, null as date from sales;",
+        "scan_query": "select cust, prod, null as day, null as month, null as year, state, quant, null as date from sales where state in (%s, %s);",
+        "params": ["NY", "NJ"]
+    }
+
+
+def test_pushdown_plan_ors_one_in_list_per_attribute():
+    plan = fetch_plan(multi_attribute, sales_table_columns, False)
+    assert plan["scan_query"] == ("select null as cust, prod, null as day, null as month, year, state, quant, null as date "
+                                  "from sales where state in (%s, %s) or year in (%s);")
+    assert plan["params"] == ["NY", "NJ", 2020]
+    assert plan["group_query"] == ("select null as cust, prod, null as day, null as month, null as year, null as state, "
+                                   "null as quant, null as date from sales;")
+
+
+def test_shared_scan_plan_reads_every_row():
+    plan = fetch_plan(queries.esql_a, sales_table_columns, True)
+    assert plan == {"group_query": None, "params": None,
+                    "scan_query": "select cust, prod, null as day, null as month, null as year, state, quant, null as date from sales;"}
+
+
+@pytest.mark.parametrize("engine", ["compiled", "interpreted", "numpy"])
+@pytest.mark.parametrize("phi", [queries.esql_a, multi_attribute])
+def test_pushdown_gives_the_full_scan_result(sales_rows, database, engine, phi):
+    database.load(sales_rows)
+    expected = QueryProcessor(phi, connection_params={}, engine=engine)
+    expected.run()
+    database.statements.clear()
+    database.parameters.clear()
+    processor = QueryProcessor(phi, connection_params={}, engine=engine, pushdown=True)
+    processor.run()
+    assert processor.result_rows() == expected.result_rows()
+    plan = fetch_plan(phi, sales_table_columns, engine == "numpy")
+    executed = list(zip(database.statements, database.parameters))
+    assert (plan["scan_query"], plan["params"] or []) in executed
+    if engine == "numpy":
+        # The columnar engine discovers the groups in the aggregate scan, which falls back to a full scan
+        assert plan["group_query"] is None and " where " not in plan["scan_query"] and len(executed) == 1
+    else:
+        assert (plan["group_query"], []) in executed and len(executed) == 2
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import socket
+import threading
+import pytest
+import queries
+import service
+from processor import EMFQueryProcessor
+
+
+@pytest.fixture
+def start_service():
+    """Runs QueryServices on an event loop in a thread, and stops them after the test."""
+    running = []
+
+    def start(query_service):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        ready = threading.Event()
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(query_service.serve(port=port, ready=ready))
+        thread = threading.Thread(target=lambda: loop.run_until_complete(asyncio.wait([task])), daemon=True)
+        thread.start()
+        assert ready.wait(30)
+        running.append((loop, task, thread))
+        return port, loop
+
+    yield start
+    for loop, task, thread in running:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(10)
+
+
+def request(port, method, path, body=None):
+    """Sends one request and reads the answer until the service closes the connection."""
+    content = b"" if body is None else json.dumps(body).encode()
+    with socket.create_connection(("127.0.0.1", port), timeout=20) as connection:
+        connection.sendall(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(content)}\r\n\r\n".encode() + content)
+        answer = b""
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            answer += data
+    head, body = answer.split(b"\r\n\r\n", 1)
+    return int(head.split()[1]), json.loads(body)
+
+
+def expected_rows(query, rows):
+    processor = EMFQueryProcessor(query, rows)
+    processor.run()
+    return json.loads(json.dumps([[None if value == "NULL" else value for value in row] for row in processor.result_rows()], default=str))
+
+
+def test_process_workers_do_not_hold_client_connections(sales_rows, start_service):
+    port, loop = start_service(service.QueryService(table_rows=sales_rows, processes=True, concurrency=2))
+    for path in ["/query", "/reload", "/query"]:
+        status, answer = request(port, "POST", path, {"query": queries.esql_a} if path == "/query" else None)
+        assert status == 200, answer
+    assert answer["rows"] == expected_rows(queries.esql_a, sales_rows)
+
+
+def test_burst_admits_concurrency_plus_queue_size(sales_rows, start_service, monkeypatch):
+    release = threading.Event()
+
+    def blocked_query(query, options, dataset=None):
+        release.wait(30)
+        return {"headers": [], "rows": [], "stats": []}
+
+    monkeypatch.setattr(service, "evaluate_query", blocked_query)
+    query_service = service.QueryService(table_rows=sales_rows, concurrency=2, queue_size=3)
+    port, loop = start_service(query_service)
+
+    async def burst():
+        # Every request of the burst is handled before the evaluating tasks take any query from the queue
+        return await asyncio.gather(*[query_service.handle_request("POST", "/query", json.dumps({"query": queries.esql_a}).encode())
+                                      for request in range(9)])
+
+    answers = asyncio.run_coroutine_threadsafe(burst(), loop)
+    threading.Timer(0.5, release.set).start()
+    statuses = sorted(status for status, answer in answers.result(30))
+    assert statuses == [200] * 5 + [503] * 4
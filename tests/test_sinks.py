@@ -0,0 +1,74 @@
+import csv
+import datetime
+import json
+import sys
+import pytest
+import queries
+import sinks
+from processor import QueryProcessor
+
+day = datetime.date(2020, 1, 1)
+rows = [("Ann", "Milk", 1, 1, 2020, "NY", 5, day), ("Ann", "Milk", 1, 1, 2020, "NJ", 3, day),
+        ("Bob", "Eggs", 1, 1, 2020, "NY", 4, day), ("Cid", "Eggs", 1, 1, 2020, "CT", 9, day),
+        ("Dan", "Milk", 1, 1, 2020, "NJ", 2, day), ("Eve", "Tea", 1, 1, 2020, "NY", 7, day)]
+expected = [["Ann", "Milk", 5, 3], ["Bob", "Eggs", 4, None], ["Cid", "Eggs", None, None], ["Dan", "Milk", None, 2], ["Eve", "Tea", 7, None]]
+headers = ["cust", "prod", "sum_NY_quant", "sum_NJ_quant"]
+
+
+def recorded_writes(monkeypatch, sink_class):
+    sizes = []
+    write = sink_class.write
+    monkeypatch.setattr(sink_class, "write", lambda sink, chunk: (sizes.append(len(chunk)), write(sink, chunk)))
+    return sizes
+
+
+def test_csv_sink_writes_empty_fields_for_missing_aggregates(tmp_path, monkeypatch):
+    sizes = recorded_writes(monkeypatch, sinks.CSVSink)
+    path = tmp_path / "result.csv"
+    preview, count = sinks.export(QueryProcessor(queries.esql_a, rows), "csv", str(path), chunk_size=2, preview_rows=2)
+    assert count == 5 and sizes == [2, 2, 1]
+    with open(path, newline="") as file:
+        assert list(csv.reader(file)) == [headers] + [["" if value is None else str(value) for value in row] for row in expected]
+    assert "Ann" in preview and "Bob" in preview and "Cid" not in preview and "NULL" in preview
+
+
+def test_jsonl_sink_writes_null_for_missing_aggregates(tmp_path, monkeypatch):
+    sizes = recorded_writes(monkeypatch, sinks.JSONLSink)
+    path = tmp_path / "result.jsonl"
+    preview, count = sinks.export(QueryProcessor(queries.esql_a, rows), "jsonl", str(path), chunk_size=3)
+    assert count == 5 and sizes == [3, 2]
+    with open(path) as file:
+        assert [json.loads(line) for line in file] == [dict(zip(headers, row)) for row in expected]
+
+
+@pytest.mark.parametrize("output_format", ["arrow", "parquet"])
+def test_arrow_sinks_round_trip(tmp_path, output_format):
+    pyarrow = pytest.importorskip("pyarrow")
+    path = tmp_path / f"result.{output_format}"
+    preview, count = sinks.export(QueryProcessor(queries.esql_a, rows), output_format, str(path), chunk_size=2)
+    assert count == 5
+    if output_format == "parquet":
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(str(path))
+    else:
+        import pyarrow.ipc
+        with pyarrow.ipc.open_stream(str(path)) as reader:
+            table = reader.read_all()
+    assert table.schema.names == headers
+    assert [str(field.type) for field in table.schema] == ["string", "string", "int64", "int64"]
+    assert [list(row.values()) for row in table.to_pylist()] == expected
+
+
+@pytest.mark.parametrize("output_format", ["arrow", "parquet"])
+def test_missing_pyarrow_is_reported_before_the_file_is_created(tmp_path, monkeypatch, output_format):
+    monkeypatch.setitem(sys.modules, "pyarrow", None) # Makes import pyarrow raise ImportError
+    path = tmp_path / f"result.{output_format}"
+    with pytest.raises(ValueError, match="pyarrow"):
+        sinks.export(QueryProcessor(queries.esql_a, rows), output_format, str(path))
+    assert not path.exists()
+
+
+def test_unknown_format_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        sinks.export(QueryProcessor(queries.esql_a, rows), "xml", str(tmp_path / "result.xml"))
+    assert not (tmp_path / "result.xml").exists()
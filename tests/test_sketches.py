@@ -0,0 +1,57 @@
+import pickle
+import pytest
+import queries
+from multiquery import merge_queries
+from processor import QueryProcessor
+from sketches import QuantileSketch, new_sketch
+
+
+def test_sketch_options_are_checked(sales_rows):
+    for options in [{"agg": "median", "precision": 10}, {"agg": "p90", "k": 4}, {"agg": "p90", "k": 200.0},
+                    {"agg": "count_distinct", "attribute": "cust", "k": 200}, {"agg": "count_distinct", "attribute": "cust", "precision": 30},
+                    {"agg": "median", "exact_limit": -1}, {"agg": "median", "accuracy": 16}]:
+        phi = {"S": ["prod", "x"], "n": 1, "V": {"col1": {"name": "prod", "type": "char", "size": 20}},
+               "F-VECT": [dict(options, name="x", group_var="NY")],
+               "PRED-LIST": {"var1": {"name": "x", "group_var": "NY", "attribute": "state", "value": "NY"}}}
+        with pytest.raises(ValueError):
+            QueryProcessor(phi, sales_rows)
+
+
+def test_sketch_options_set_the_size_of_the_sketch():
+    quantiles = new_sketch({"name": "x", "agg": "p50", "k": 64, "exact_limit": 0})
+    distinct = new_sketch({"name": "y", "agg": "count_distinct", "precision": 6, "exact_limit": 0})
+    quantiles.extend(range(100000))
+    distinct.extend(range(100000))
+    assert sum(len(compactor) for compactor in quantiles.compactors) < 3 * 64 + 20
+    assert len(distinct.registers) == 2 ** 6
+
+
+def test_quantile_sketch_is_small_and_deterministic():
+    first, second = QuantileSketch(k=32, exact_limit=0), QuantileSketch(k=32, exact_limit=0)
+    first.extend(range(10000))
+    second.extend(range(10000))
+    assert first.compactors == second.compactors
+    assert len(pickle.dumps(QuantileSketch())) < 200
+    assert abs(first.quantile(0.5) - 5000) < 10000 * 0.1
+
+
+def test_queries_with_other_sketch_options_are_not_merged():
+    other = dict(queries.esql_f, **{"F-VECT": [dict(agg, k=100) if agg["agg"] == "p95" else agg for agg in queries.esql_f["F-VECT"]]})
+    combined, mappings = merge_queries([queries.esql_f, queries.esql_f, other])
+    assert mappings[0] == mappings[1]
+    assert mappings[0]["p95_NY_quant"] != mappings[2]["p95_NY_quant"]
+    assert len(combined["F-VECT"]) == len(queries.esql_f["F-VECT"]) + 1
+
+
+def test_default_sketch_options_merge_with_explicit_ones():
+    explicit = dict(queries.esql_f, **{"F-VECT": [dict(agg, k=200) if agg["agg"] == "median" else agg for agg in queries.esql_f["F-VECT"]]})
+    combined, mappings = merge_queries([queries.esql_f, explicit])
+    assert mappings[0] == mappings[1]
+
+
+def test_parallel_sketches_are_exact_within_the_exact_limit(sales_rows):
+    serial = QueryProcessor(queries.esql_f, sales_rows)
+    serial.run()
+    parallel = QueryProcessor(queries.esql_f, sales_rows, workers=2)
+    parallel.run()
+    assert parallel.result_rows() == serial.result_rows()
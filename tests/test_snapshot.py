@@ -0,0 +1,56 @@
+import datetime
+import os
+import snapshot
+from snapshot import Snapshot, write_snapshot, refresh_snapshot
+
+
+def test_snapshot_round_trip(tmp_path):
+    rows = [("Ann", "Milk", 1, 2, 2020, "NY", 5, datetime.date(2020, 2, 1)),
+            (None, "Eggs", None, 3, 2021, "NJ", None, None),
+            ("Bob", None, 31, 12, None, None, -7, datetime.date(1999, 12, 31)),
+            ("Ann", "Eggs", 2, 1, 2020, "NY", 2 ** 31 - 1, datetime.date(2020, 1, 2))]
+    path = str(tmp_path / "snapshot")
+    write_snapshot(rows, path, version="v1")
+    mapped = Snapshot(path)
+    assert mapped.version == "v1"
+    assert list(mapped) == rows
+    encodings = {column: column_meta["encoding"] for column, column_meta in mapped.meta["columns"].items()}
+    assert encodings == {"cust": "dictionary", "prod": "dictionary", "day": "int", "month": "int", "year": "int",
+                         "state": "dictionary", "quant": "int", "date": "date"}
+    mapped.close()
+
+
+def test_snapshot_can_be_opened_while_it_is_rewritten(sales_rows, tmp_path, monkeypatch):
+    path = str(tmp_path / "snapshot")
+    write_snapshot(sales_rows[:10], path, version="v1")
+    opened = Snapshot(path)
+    replace = os.replace
+    versions = []
+
+    def checked_replace(source, destination):
+        # Every step of the rewrite leaves a complete snapshot to open
+        reader = Snapshot(path)
+        versions.append(reader.version)
+        reader.close()
+        replace(source, destination)
+
+    monkeypatch.setattr(snapshot.os, "replace", checked_replace)
+    write_snapshot(sales_rows[:20], path, version="v2")
+    monkeypatch.setattr(snapshot.os, "replace", replace)
+    assert versions == ["v1", "v1"]
+    assert Snapshot(path).version == "v2"
+    assert list(opened) == sales_rows[:10]
+    write_snapshot(sales_rows[:30], path, version="v3")
+    assert len([entry for entry in os.listdir(path) if entry.startswith("v")]) == 2
+    assert len(Snapshot(path)) == 30
+
+
+def test_snapshot_is_refreshed_when_the_table_changed(sales_rows, database, tmp_path, monkeypatch):
+    # The version of the table is read from PostgreSQL system columns the SQLite stand-in does not have
+    monkeypatch.setattr(snapshot, "table_version", lambda connection_params: len(database.connection.execute("select * from sales").fetchall()))
+    path = str(tmp_path / "snapshot")
+    database.load(sales_rows[:50])
+    first = refresh_snapshot({}, path)
+    assert refresh_snapshot({}, path).version == first.version
+    database.load(sales_rows[50:60])
+    assert len(refresh_snapshot({}, path)) == 60